@@ -15,6 +15,7 @@
 #ifndef HEADER_25AE844D_6E55_42EB_9E93_56C7CB727F54_INCLUDED
 #define HEADER_25AE844D_6E55_42EB_9E93_56C7CB727F54_INCLUDED
 
+#include <memory>
 #include <string_view>
 #include <string>
 
@@ -28,6 +29,8 @@
 
 namespace genny::actor {
 
+class PythonWorker;
+
 /**
  *
  * Owner: 10gen/query
@@ -50,6 +53,8 @@ private:
 
     /** @private */
     struct PhaseConfig;
+    // Shared by the phases of a Python actor. Declared before _loop, which is constructed with it.
+    std::shared_ptr<PythonWorker> _pythonWorker;
     PhaseLoop<PhaseConfig> _loop;
     std::string _command;
 };
@@ -12,10 +12,29 @@
 // See the License for the specific language governing permissions and
 // limitations under the License.
 
+#include <array>
+#include <cerrno>
+#include <cstring>
+#include <unordered_map>
+#include <unordered_set>
+#include <vector>
+
+#include <fcntl.h>
+#include <pthread.h>
+#include <signal.h>
+#include <spawn.h>
+#include <sys/wait.h>
+#include <unistd.h>
+
+#include <bsoncxx/builder/stream/document.hpp>
+#include <bsoncxx/json.hpp>
+
 #include <boost/assert.hpp>
 #include <boost/filesystem.hpp>
 #include <cast_core/actors/ExternalScriptRunner.hpp>
 
+extern char** environ;
+
 namespace genny::actor {
 
 class TempScriptFile {
@@ -61,6 +80,10 @@ public:
     }
 
 protected:
+    metrics::Operation& scriptOperation() {
+        return _scriptOperation;
+    }
+
     std::string invoke(const std::string& invocation) {
         // Execute the script and read result from stdout
         auto ctx = _scriptOperation.start();
@@ -144,28 +167,413 @@ private:
     std::string _script;
 };
 
+/**
+ * Blocks SIGPIPE in the calling thread while in scope, so that writing to a pipe whose reader
+ * has exited fails with EPIPE instead of killing genny. A SIGPIPE raised meanwhile is consumed
+ * rather than delivered once it's unblocked.
+ */
+class BlockSigpipe {
+public:
+    BlockSigpipe() {
+        sigemptyset(&_sigpipe);
+        sigaddset(&_sigpipe, SIGPIPE);
+        sigset_t pending;
+        sigpending(&pending);
+        _alreadyPending = sigismember(&pending, SIGPIPE) == 1;
+        pthread_sigmask(SIG_BLOCK, &_sigpipe, &_previous);
+    }
+
+    BlockSigpipe(const BlockSigpipe&) = delete;
+
+    ~BlockSigpipe() {
+        sigset_t pending;
+        sigpending(&pending);
+        if (!_alreadyPending && sigismember(&pending, SIGPIPE) == 1) {
+            int received;
+            sigwait(&_sigpipe, &received);
+        }
+        pthread_sigmask(SIG_SETMASK, &_previous, nullptr);
+    }
+
+private:
+    sigset_t _sigpipe;
+    sigset_t _previous;
+    bool _alreadyPending;
+};
+
+/**
+ * A long-lived `python -m genny_python_worker` process that runs python actor endpoints
+ * without starting a new interpreter for each one. See src/cast_python/src/genny_python_worker.py
+ * for the protocol: every message is a 4-byte big-endian length followed by that much JSON.
+ *
+ * Each actor thread has its own worker, started by its first call and shared by all its phases.
+ */
+class PythonWorker {
+public:
+    struct Response {
+        std::string output;
+        int exitCode;
+        // Metrics reported by genny_actor endpoints.
+        std::vector<bsoncxx::document::value> metrics;
+        // Whether this call had to start the worker, the first time or after it died.
+        bool started;
+    };
+
+    PythonWorker() = default;
+    PythonWorker(const PythonWorker&) = delete;
+
+    ~PythonWorker() {
+        stop();
+    }
+
+    bool running() const {
+        return _pid > 0;
+    }
+
+    Response call(const std::string& module,
+                  const std::string& endpoint,
+                  const std::string& workloadPath,
+                  const std::string& actorName,
+                  PhaseNumber phase) {
+        if (running() && waitpid(_pid, nullptr, WNOHANG) == _pid) {
+            // Don't write to a pipe nobody is reading.
+            BOOST_LOG_TRIVIAL(warning) << "Python worker " << _pid << " exited. Restarting it.";
+            _pid = -1;
+            stop();
+        }
+        bool started = !running();
+        if (started) {
+            start();
+        }
+
+        namespace bson_stream = bsoncxx::builder::stream;
+        auto request = bson_stream::document{}
+            << "module" << module << "endpoint" << endpoint << "args" << bson_stream::open_array
+            << workloadPath << bson_stream::close_array << "actor" << actorName << "phase"
+            << static_cast<int64_t>(phase) << bson_stream::finalize;
+        try {
+            writeMessage(bsoncxx::to_json(request.view()));
+            auto response = bsoncxx::from_json(readMessage());
+            Response result{response.view()["output"].get_utf8().value.to_string(),
+                            static_cast<int>(toInt(response.view()["exit_code"], 1)),
+                            {},
+                            started};
+            if (response.view()["metrics"]) {
+                for (auto&& metric : response.view()["metrics"].get_array().value) {
+                    result.metrics.emplace_back(metric.get_document().value);
+                }
+            }
+            return result;
+        } catch (...) {
+            // The worker's state is unknown, start over with a new one next time.
+            stop();
+            throw;
+        }
+    }
+
+    /**
+     * Integer value of a JSON number, which from_json gives us as int32 or int64.
+     */
+    static int64_t toInt(const bsoncxx::document::element& element, int64_t defaultValue) {
+        switch (element ? element.type() : bsoncxx::type::k_null) {
+            case bsoncxx::type::k_int32:
+                return element.get_int32().value;
+            case bsoncxx::type::k_int64:
+                return element.get_int64().value;
+            case bsoncxx::type::k_double:
+                return static_cast<int64_t>(element.get_double().value);
+            default:
+                return defaultValue;
+        }
+    }
+
+private:
+    void start() {
+        int toWorker[2];
+        int fromWorker[2];
+        if (pipe(toWorker) != 0) {
+            throw std::runtime_error("Could not create pipe for python worker: " +
+                                     std::string(std::strerror(errno)));
+        }
+        if (pipe(fromWorker) != 0) {
+            auto error = errno;
+            close(toWorker[0]);
+            close(toWorker[1]);
+            throw std::runtime_error("Could not create pipe for python worker: " +
+                                     std::string(std::strerror(error)));
+        }
+        // Keep the pipes out of other actors' workers, or closing our end wouldn't stop ours.
+        // The worker gets its own ends through dup2, which clears the flag.
+        for (int fd : {toWorker[0], toWorker[1], fromWorker[0], fromWorker[1]}) {
+            fcntl(fd, F_SETFD, FD_CLOEXEC);
+        }
+
+        posix_spawn_file_actions_t actions;
+        posix_spawn_file_actions_init(&actions);
+        posix_spawn_file_actions_adddup2(&actions, toWorker[0], STDIN_FILENO);
+        posix_spawn_file_actions_adddup2(&actions, fromWorker[1], STDOUT_FILENO);
+        std::array<char*, 4> argv{const_cast<char*>("python"),
+                                  const_cast<char*>("-m"),
+                                  const_cast<char*>("genny_python_worker"),
+                                  nullptr};
+        BOOST_LOG_TRIVIAL(info) << "Running command: python -m genny_python_worker";
+        int result = posix_spawnp(&_pid, argv[0], &actions, nullptr, argv.data(), environ);
+        posix_spawn_file_actions_destroy(&actions);
+        close(toWorker[0]);
+        close(fromWorker[1]);
+        if (result != 0) {
+            close(toWorker[1]);
+            close(fromWorker[0]);
+            _pid = -1;
+            throw std::runtime_error("Could not start python worker: " +
+                                     std::string(std::strerror(result)));
+        }
+        _toWorker = toWorker[1];
+        _fromWorker = fromWorker[0];
+    }
+
+    void stop() {
+        // Closing its stdin tells the worker to exit.
+        if (_toWorker >= 0) {
+            close(_toWorker);
+            _toWorker = -1;
+        }
+        if (_fromWorker >= 0) {
+            close(_fromWorker);
+            _fromWorker = -1;
+        }
+        if (_pid > 0) {
+            while (waitpid(_pid, nullptr, 0) < 0 && errno == EINTR) {
+            }
+            _pid = -1;
+        }
+    }
+
+    void writeMessage(const std::string& body) {
+        auto length = static_cast<uint32_t>(body.size());
+        std::array<char, 4> header{static_cast<char>(length >> 24),
+                                   static_cast<char>(length >> 16),
+                                   static_cast<char>(length >> 8),
+                                   static_cast<char>(length)};
+        writeAll(header.data(), header.size());
+        writeAll(body.data(), body.size());
+    }
+
+    std::string readMessage() {
+        std::array<unsigned char, 4> header;
+        readAll(reinterpret_cast<char*>(header.data()), header.size());
+        uint32_t length = (uint32_t{header[0]} << 24) | (uint32_t{header[1]} << 16) |
+            (uint32_t{header[2]} << 8) | uint32_t{header[3]};
+        std::string body(length, '\0');
+        readAll(body.data(), length);
+        return body;
+    }
+
+    void writeAll(const char* data, size_t size) {
+        // A worker that exited mid-call makes this fail with EPIPE, which stops it so the
+        // next call starts a new one.
+        BlockSigpipe blockSigpipe;
+        while (size > 0) {
+            auto written = write(_toWorker, data, size);
+            if (written < 0) {
+                if (errno == EINTR) {
+                    continue;
+                }
+                throw std::runtime_error("Could not write to python worker: " +
+                                         std::string(std::strerror(errno)));
+            }
+            data += written;
+            size -= written;
+        }
+    }
+
+    void readAll(char* data, size_t size) {
+        while (size > 0) {
+            auto bytesRead = ::read(_fromWorker, data, size);
+            if (bytesRead < 0) {
+                if (errno == EINTR) {
+                    continue;
+                }
+                throw std::runtime_error("Could not read from python worker: " +
+                                         std::string(std::strerror(errno)));
+            }
+            if (bytesRead == 0) {
+                throw std::runtime_error("Python worker exited unexpectedly.");
+            }
+            data += bytesRead;
+            size -= bytesRead;
+        }
+    }
+
+    pid_t _pid = -1;
+    int _toWorker = -1;
+    int _fromWorker = -1;
+};
+
 /*
 Note we've specifically split out python support as it has some extra built-in
 features in genny to make python actors have first-class support (beyond smaller
 shell and js scripts, which the general external script runner covers).
+
+Endpoints run in the actor thread's PythonWorker unless the phase sets
+PersistentWorker: false, in which case every iteration runs
+`python -m <Module> <Endpoint> <workload>` as before, with the actor's name and
+phase number in the GENNY_ACTOR and GENNY_PHASE environment variables. Besides
+ExternalScript each call is recorded as ExternalScriptCold if it had to start the
+worker, the first time or after it died, or ExternalScriptWarm otherwise. The
+worker's stdout carries its responses, so anything endpoints write to file descriptor
+1 directly, e.g. from subprocesses, goes to genny's stderr rather than being logged as
+"Script output".
+
+Endpoints written with the genny_actor package can also report their own metrics,
+which are recorded as the operations of the same name listed in the phase's
+Metrics. They come back in the worker's response or, without a worker, as lines
+of output starting with {"metric":.
 */
 class PythonRunner: public ScriptRunner {
 public:
-    PythonRunner(PhaseContext& phaseContext, ActorId id, const std::string& workloadPath)
+    PythonRunner(PhaseContext& phaseContext,
+                 ActorId id,
+                 const std::string& workloadPath,
+                 std::shared_ptr<PythonWorker> worker)
         : ScriptRunner(phaseContext, id, workloadPath),
           _module{phaseContext["Module"].to<std::string>()},
-          _endpoint{phaseContext["Endpoint"].to<std::string>()} {}
+          _endpoint{phaseContext["Endpoint"].to<std::string>()},
+          _worker{phaseContext["PersistentWorker"].maybe<bool>().value_or(true) ? std::move(worker)
+                                                                                 : nullptr},
+          _actorName{phaseContext.actor()["Name"].to<std::string>()},
+          _phase{phaseContext.getPhaseNumber()},
+          _coldOperation{phaseContext.namedOperation("ExternalScriptCold", id)},
+          _warmOperation{phaseContext.namedOperation("ExternalScriptWarm", id)} {
+        if (phaseContext["Metrics"]) {
+            for (const auto&& [k, name] : phaseContext["Metrics"]) {
+                auto metricName = name.to<std::string>();
+                _metrics.emplace(metricName, phaseContext.namedOperation(metricName, id));
+            }
+        }
+    }
 
     virtual std::string runScript() override {
-        std::stringstream invocation;
-        invocation << "python -m " << _module
-            << " " << _endpoint << " " << workloadPath() << " 2>&1";
-        return invoke(invocation.str());
+        if (!_worker) {
+            // Tell genny_actor endpoints which actor and phase they're for, as the worker does.
+            std::stringstream invocation;
+            invocation << "GENNY_ACTOR=" << shellQuote(_actorName) << " GENNY_PHASE=" << _phase
+                << " python -m " << _module
+                << " " << _endpoint << " " << workloadPath() << " 2>&1";
+            auto output = invoke(invocation.str());
+            auto finished = metrics::clock::now();
+            std::istringstream lines{output};
+            for (std::string line; std::getline(lines, line);) {
+                if (line.rfind(kMetricPrefix, 0) == 0) {
+                    recordMetric(bsoncxx::from_json(line), finished);
+                }
+            }
+            return output;
+        }
+
+        BOOST_LOG_TRIVIAL(info) << "Calling python worker: " << _module << " " << _endpoint;
+        auto scriptCtx = scriptOperation().start();
+        auto started = metrics::clock::now();
+        PythonWorker::Response response;
+        try {
+            response = _worker->call(_module, _endpoint, workloadPath(), _actorName, _phase);
+        } catch (...) {
+            scriptCtx.failure();
+            throw;
+        }
+        auto finished = metrics::clock::now();
+
+        // Only known once the call has been made, since it restarts a worker that died.
+        auto outcome = response.exitCode == 0 ? metrics::OutcomeType::kSuccess
+                                              : metrics::OutcomeType::kFailure;
+        auto& operation = response.started ? _coldOperation : _warmOperation;
+        operation.report(
+            finished,
+            std::chrono::duration_cast<std::chrono::microseconds>(finished - started),
+            outcome);
+        if (response.exitCode == 0) {
+            scriptCtx.success();
+        } else {
+            scriptCtx.failure();
+        }
+
+        for (auto&& metric : response.metrics) {
+            recordMetric(metric.view(), finished);
+        }
+
+        if (!response.output.empty()) {
+            BOOST_LOG_TRIVIAL(info) << "Script output: " << response.output;
+        }
+        if (response.exitCode != 0) {
+            throw std::runtime_error("Script exited with non-zero exit code " +
+                                     std::to_string(response.exitCode));
+        }
+        return response.output;
     }
 
 private:
+    static constexpr auto kMetricPrefix = R"({"metric":)";
+
+    /**
+     * Single-quote a value for the shell, e.g. an actor name with spaces in it.
+     */
+    static std::string shellQuote(const std::string& value) {
+        std::string quoted = "'";
+        for (auto c : value) {
+            if (c == '\'') {
+                quoted += "'\\''";
+            } else {
+                quoted += c;
+            }
+        }
+        return quoted + "'";
+    }
+
+    /**
+     * Record one event reported by a genny_actor endpoint, e.g.
+     * {"metric": "Insert", "duration_us": 1200, "ops": 100, "size": 0, "errors": 0,
+     *  "outcome": "success"}
+     */
+    void recordMetric(bsoncxx::document::view metric, metrics::clock::time_point finished) {
+        auto name = metric["metric"].get_utf8().value.to_string();
+        auto operation = _metrics.find(name);
+        if (operation == _metrics.end()) {
+            if (_unknownMetrics.insert(name).second) {
+                BOOST_LOG_TRIVIAL(warning)
+                    << "Ignoring metric " << name << " reported by " << _module << " "
+                    << _endpoint << ". Add it to the phase's Metrics to record it.";
+            }
+            return;
+        }
+
+        auto outcome = metrics::OutcomeType::kUnknown;
+        if (metric["outcome"]) {
+            auto value = metric["outcome"].get_utf8().value.to_string();
+            if (value == "success") {
+                outcome = metrics::OutcomeType::kSuccess;
+            } else if (value == "failure") {
+                outcome = metrics::OutcomeType::kFailure;
+            }
+        }
+        operation->second.report(
+            finished,
+            std::chrono::microseconds{PythonWorker::toInt(metric["duration_us"], 0)},
+            outcome,
+            PythonWorker::toInt(metric["ops"], 1),
+            PythonWorker::toInt(metric["errors"], 0),
+            1,
+            PythonWorker::toInt(metric["size"], 0));
+    }
+
     std::string _module;
     std::string _endpoint;
+    std::shared_ptr<PythonWorker> _worker;
+    std::string _actorName;
+    PhaseNumber _phase;
+    metrics::Operation _coldOperation;
+    metrics::Operation _warmOperation;
+    std::unordered_map<std::string, metrics::Operation> _metrics;
+    std::unordered_set<std::string> _unknownMetrics;
 };
 
 
@@ -177,10 +585,15 @@ struct ExternalScriptRunner::PhaseConfig {
     // ignored.
     metrics::Operation operation;
 
-    PhaseConfig(PhaseContext& phaseContext, ActorId id, const std::string& workloadPath, const std::string& type)
+    PhaseConfig(PhaseContext& phaseContext,
+                ActorId id,
+                const std::string& workloadPath,
+                const std::string& type,
+                std::shared_ptr<PythonWorker> pythonWorker)
         : operation{phaseContext.operation("DefaultMetricsName", id)} {
             if(type == "Python") {
-                _scriptRunner = std::make_unique<PythonRunner>(phaseContext, id, workloadPath);
+                _scriptRunner = std::make_unique<PythonRunner>(
+                    phaseContext, id, workloadPath, std::move(pythonWorker));
             } else {
                 _scriptRunner = std::make_unique<GeneralRunner>(phaseContext, id, workloadPath);
             }
@@ -216,7 +629,12 @@ void ExternalScriptRunner::run() {
 ExternalScriptRunner::ExternalScriptRunner(genny::ActorContext& context)
     // These are the attributes for the actor.
     : Actor{context},
-      _loop{context, ExternalScriptRunner::id(), context.workload().workloadPath(), context["Type"].to<std::string>()}{}
+      _pythonWorker{std::make_shared<PythonWorker>()},
+      _loop{context,
+            ExternalScriptRunner::id(),
+            context.workload().workloadPath(),
+            context["Type"].to<std::string>(),
+            _pythonWorker} {}
 
 namespace {
 auto registerExternalScriptRunner = Cast::registerDefault<ExternalScriptRunner>();
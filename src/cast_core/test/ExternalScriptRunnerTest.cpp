@@ -61,5 +61,61 @@ TEST_CASE_METHOD(MongoTestFixture, "ExternalScriptRunner successfully executed."
         }
     }
 }
+
+TEST_CASE_METHOD(MongoTestFixture, "ExternalScriptRunner runs python actors.",
+          "[standalone][single_node_replset][three_node_replset][sharded][ExternalScriptRunner]") {
+
+    // Needs src/cast_python/src on the PYTHONPATH, which run-genny sets up.
+    NodeSource nodes = NodeSource(R"(
+        SchemaVersion: 2018-07-01
+        Actors:
+        - Name: PythonRunner
+          Type: Python
+          Threads: 1
+          Phases:
+          - Repeat: 3
+            Module: example_actor
+            Endpoint: hello_world
+          - Repeat: 2
+            Module: example_actor
+            Endpoint: hello_world
+            PersistentWorker: false
+    )", __FILE__);
+
+
+    SECTION("Run python endpoints with and without a persistent worker.") {
+        try {
+            genny::ActorHelper ah(nodes.root(), 1);
+            ah.run([](const genny::WorkloadContext& wc) { wc.actors()[0]->run(); });
+        } catch (const std::exception& e) {
+            auto diagInfo = boost::diagnostic_information(e);
+            INFO("CAUGHT " << diagInfo);
+            FAIL(diagInfo);
+        }
+    }
+}
+
+TEST_CASE_METHOD(MongoTestFixture, "ExternalScriptRunner fails python actors that fail.",
+          "[standalone][single_node_replset][three_node_replset][sharded][ExternalScriptRunner]") {
+
+    NodeSource nodes = NodeSource(R"(
+        SchemaVersion: 2018-07-01
+        Actors:
+        - Name: PythonRunner
+          Type: Python
+          Threads: 1
+          Phases:
+          - Repeat: 1
+            Module: no_such_module
+            Endpoint: hello_world
+    )", __FILE__);
+
+    SECTION("A failing endpoint in the persistent worker throws.") {
+        genny::ActorHelper ah(nodes.root(), 1);
+        REQUIRE_THROWS_WITH(
+            ah.run([](const genny::WorkloadContext& wc) { wc.actors()[0]->run(); }),
+            Catch::Contains("non-zero exit code 1"));
+    }
+}
 }  // namespace
 }  // namespace genny
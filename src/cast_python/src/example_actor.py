@@ -11,10 +11,17 @@ given the following actor config:
       Endpoint: hello_world
 
 
-genny would invoke the following command to run this actor:
+genny would call the hello_world endpoint through a long-lived worker process for each
+actor thread (see genny_python_worker.py), which gives the same result as running:
 
 python -m example_actor hello_world <path_to_workload> 2>&1
 
+Set `PersistentWorker: false` in the phase to have genny run that instead, with the
+GENNY_ACTOR and GENNY_PHASE environment variables set to the actor's name and phase number.
+In the worker, only what the endpoint prints through sys.stdout and sys.stderr is logged
+as its output. Anything written to file descriptor 1 directly, e.g. by a subprocess the
+endpoint runs, goes to genny's stderr instead.
+
 
 Note - support for python actors is very experimental. Please reach out
 to the perf team if you have a use-case you would like to try this support for
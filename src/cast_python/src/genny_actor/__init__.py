@@ -0,0 +1,55 @@
+"""Support for writing python actors that genny runs in-process in a genny_python_worker.
+
+Endpoints are plain functions registered with the endpoint decorator. Each call gets a
+Context with the parsed workload and can report any number of named metrics, which
+genny records as operations of the actor alongside ExternalScript:
+
+import genny_actor
+
+
+@genny_actor.endpoint("insert_batch")
+def insert_batch(ctx: genny_actor.Context):
+    batch_size = ctx.phase_config.get("BatchSize", 100)
+    with ctx.timer("InsertBatch", ops=batch_size):
+        ...
+    ctx.count("Retries", errors=1)
+
+
+if __name__ == "__main__":
+    genny_actor.main()
+
+The actor's phase lists the metrics it reports, so genny can set them up before the
+workload starts:
+
+- Name: Inserter
+  Type: Python
+  Phases:
+    - Repeat: 10
+      Module: my_actor
+      Endpoint: insert_batch
+      BatchSize: 1000
+      Metrics: [InsertBatch, Retries]
+"""
+
+from genny_actor.context import Context, load_workload
+from genny_actor.registry import (
+    ACTOR_ENV,
+    METRIC_KEY,
+    PHASE_ENV,
+    call,
+    endpoint,
+    endpoints,
+    main,
+)
+
+__all__ = [
+    "ACTOR_ENV",
+    "Context",
+    "METRIC_KEY",
+    "PHASE_ENV",
+    "call",
+    "endpoint",
+    "endpoints",
+    "load_workload",
+    "main",
+]
@@ -0,0 +1,103 @@
+"""The Context passed to every genny_actor endpoint."""
+import contextlib
+import os
+import time
+
+from genny import yaml_io
+
+# Parsed workloads by path, with the modification time they were parsed at.
+_workloads = {}
+
+
+def load_workload(path):
+    """
+    The parsed workload yaml at path. A worker process parses each workload once and only
+    parses it again if the file changes.
+    """
+    mtime = os.stat(path).st_mtime_ns
+    cached = _workloads.get(path)
+    if cached is None or cached[0] != mtime:
+        cached = (mtime, yaml_io.load_file(path))
+        _workloads[path] = cached
+    return cached[1]
+
+
+class Context:
+    """
+    What an endpoint knows about the call genny made, and where it reports metrics.
+
+    :param workload_path: path to the workload yaml genny is running
+    :param actor: Name of the actor making the call, if known
+    :param phase: number of the phase the actor is in, if known
+    """
+
+    def __init__(self, workload_path, actor=None, phase=None):
+        self.workload_path = workload_path
+        self.actor = actor
+        self.phase = phase
+        self.metrics = []
+
+    @property
+    def workload(self):
+        """The whole workload as a dict."""
+        return load_workload(self.workload_path)
+
+    @property
+    def actor_config(self):
+        """The workload's config for this actor, or {} if it can't be found."""
+        for actor in self.workload.get("Actors") or []:
+            if actor.get("Name") == self.actor:
+                return actor
+        return {}
+
+    @property
+    def phase_config(self):
+        """
+        This actor's config for this phase, or {} if it can't be found. Phases loaded with
+        LoadConfig aren't resolved.
+        """
+        phases = self.actor_config.get("Phases") or []
+        if self.phase is None or not 0 <= self.phase < len(phases):
+            return {}
+        return phases[self.phase] or {}
+
+    def report(self, name, duration=0.0, ops=1, size=0, errors=0, outcome="success"):
+        """
+        Report one event of the named metric.
+
+        :param duration: how long it took, in seconds
+        :param ops: documents inserted, modified, deleted, etc.
+        :param size: size in bytes of those documents
+        :param errors: errors that occurred
+        :param outcome: "success", "failure" or "unknown"
+        """
+        if outcome not in ("success", "failure", "unknown"):
+            raise ValueError(f"Unknown outcome {outcome} for metric {name}.")
+        self.metrics.append(
+            {
+                "metric": name,
+                "duration_us": int(round(duration * 1e6)),
+                "ops": int(ops),
+                "size": int(size),
+                "errors": int(errors),
+                "outcome": outcome,
+            }
+        )
+
+    def count(self, name, ops=1, size=0, errors=0):
+        """Report a named counter, e.g. documents seen, with no duration."""
+        self.report(name, ops=ops, size=size, errors=errors, outcome="unknown")
+
+    @contextlib.contextmanager
+    def timer(self, name, ops=1, size=0):
+        """
+        Report how long the with block takes as the named metric. If it raises, the event
+        is reported as a failure with one error.
+        """
+        started = time.perf_counter()
+        try:
+            yield
+        except BaseException:
+            self.report(name, time.perf_counter() - started, ops, size, errors=1, outcome="failure")
+            raise
+        self.report(name, time.perf_counter() - started, ops, size)
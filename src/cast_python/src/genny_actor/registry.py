@@ -0,0 +1,77 @@
+"""Registering endpoints and running them."""
+import json
+import os
+import sys
+import traceback
+
+from genny_actor.context import Context
+
+# Lines of output starting with this are metrics, when an endpoint is run as its own process.
+METRIC_KEY = '{"metric":'
+# Without a worker genny says which actor and phase the process is for in these variables.
+ACTOR_ENV = "GENNY_ACTOR"
+PHASE_ENV = "GENNY_PHASE"
+
+# Endpoint functions by module name, then by endpoint name.
+_endpoints = {}
+
+
+def endpoint(name=None):
+    """
+    Register the decorated function as an endpoint of its module, called with a Context.
+    The endpoint is named after the function unless name is given.
+    """
+
+    def register(function):
+        _endpoints.setdefault(function.__module__, {})[name or function.__name__] = function
+        return function
+
+    return register
+
+
+def endpoints(module_name):
+    """The endpoints registered by the module with this name, by endpoint name."""
+    return _endpoints.get(module_name, {})
+
+
+def call(module_name, endpoint_name, context):
+    """
+    Call an endpoint and print what it returns, if anything. Printing a single integer is
+    how an endpoint reports genny's DefaultMetricsName.
+    """
+    registered = endpoints(module_name)
+    if endpoint_name not in registered:
+        raise KeyError(
+            f"Module {module_name} has no endpoint {endpoint_name}. "
+            f"Available endpoints: {sorted(registered)}"
+        )
+    result = registered[endpoint_name](context)
+    if result is not None:
+        print(result)
+    return result
+
+
+def main(argv=None):
+    """
+    Run an endpoint of the __main__ module the way genny does without a persistent worker:
+
+    GENNY_ACTOR=<actor> GENNY_PHASE=<phase> python -m <module> <endpoint> <workload_yaml>
+
+    The metrics it reports are printed afterwards, one JSON object per line.
+    """
+    argv = sys.argv[1:] if argv is None else argv
+    if len(argv) != 2:
+        print("Usage: python -m <module> <endpoint> <workload_yaml>", file=sys.stderr)
+        print(f"Endpoints: {sorted(endpoints('__main__'))}", file=sys.stderr)
+        sys.exit(2)
+
+    phase = os.environ.get(PHASE_ENV)
+    context = Context(argv[1], os.environ.get(ACTOR_ENV), int(phase) if phase else None)
+    try:
+        call("__main__", argv[0], context)
+    except Exception:
+        traceback.print_exc()
+        sys.exit(1)
+    finally:
+        for metric in context.metrics:
+            print(json.dumps(metric))
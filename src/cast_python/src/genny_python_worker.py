@@ -0,0 +1,125 @@
+"""A long-lived process that runs python actor endpoints for genny's ExternalScriptRunner.
+
+Running `python -m <module> <endpoint> <workload>` for every iteration pays for
+interpreter startup and the module's imports each time, and genny records all of
+that as the operation's latency. Instead genny starts one worker per actor thread:
+
+python -m genny_python_worker
+
+and sends it requests for the same click endpoints, so a module like example_actor
+works either way. Every message in both directions is a 4-byte big-endian length
+followed by that many bytes of UTF-8 JSON. A request looks like
+
+{"module": "example_actor", "endpoint": "hello_world", "args": ["<path_to_workload>"]}
+
+and is answered with what the endpoint printed, to stdout or stderr, and the exit
+code it would have had as its own process:
+
+{"output": "Hello world from <path_to_workload>\\n", "exit_code": 0, "metrics": []}
+
+Endpoints registered with genny_actor are called directly instead. Requests for them
+can also say which actor and phase they're for, e.g. "actor": "Inserter", "phase": 0,
+and the metrics they report are sent back in "metrics".
+
+The worker keeps answering requests until its stdin is closed.
+"""
+import contextlib
+import importlib
+import io
+import json
+import os
+import struct
+import sys
+import traceback
+
+import click
+
+import genny_actor
+
+_LENGTH = struct.Struct(">I")
+
+# Command groups of the modules imported so far.
+_groups = {}
+
+
+def read_message(stream):
+    """Read one message from the binary stream, or return None if it's closed."""
+    header = stream.read(_LENGTH.size)
+    if not header:
+        return None
+    if len(header) < _LENGTH.size:
+        raise EOFError("Stream closed in the middle of a message length.")
+    (length,) = _LENGTH.unpack(header)
+    body = stream.read(length)
+    if len(body) < length:
+        raise EOFError(f"Stream closed after {len(body)} of {length} bytes of a message.")
+    return json.loads(body.decode("utf-8"))
+
+
+def write_message(stream, message):
+    body = json.dumps(message).encode("utf-8")
+    stream.write(_LENGTH.pack(len(body)) + body)
+    stream.flush()
+
+
+def _command_group(module_name):
+    if module_name not in _groups:
+        group = getattr(sys.modules[module_name], "cli", None)
+        if not isinstance(group, click.Group):
+            raise Exception(f"Module {module_name} has no click group named cli.")
+        _groups[module_name] = group
+    return _groups[module_name]
+
+
+def call(request):
+    """Run the endpoint a request asks for and return the response to send back."""
+    output = io.StringIO()
+    exit_code = 0
+    metrics = []
+    with contextlib.redirect_stdout(output), contextlib.redirect_stderr(output):
+        try:
+            module_name, endpoint = request["module"], request["endpoint"]
+            args = request.get("args", [])
+            module = importlib.import_module(module_name)
+            if endpoint in genny_actor.endpoints(module_name) or not hasattr(module, "cli"):
+                context = genny_actor.Context(
+                    args[0] if args else None, request.get("actor"), request.get("phase")
+                )
+                metrics = context.metrics
+                genny_actor.call(module_name, endpoint, context)
+            else:
+                # Standalone mode handles usage errors and exits the same way it would for
+                # `python -m <module>`, ending with SystemExit.
+                _command_group(module_name).main(args=[endpoint, *args], prog_name=module_name)
+        except SystemExit as e:
+            if e.code is None or isinstance(e.code, int):
+                exit_code = e.code or 0
+            else:
+                print(e.code)
+                exit_code = 1
+        except Exception:
+            traceback.print_exc()
+            exit_code = 1
+    return {"output": output.getvalue(), "exit_code": exit_code, "metrics": metrics}
+
+
+def serve(requests, responses):
+    """Answer requests read from one binary stream on another until the first is closed."""
+    while True:
+        request = read_message(requests)
+        if request is None:
+            return
+        write_message(responses, call(request))
+
+
+def main():
+    # Keep the responses on a descriptor of their own, and send anything else written to
+    # stdout, e.g. by programs an endpoint runs, to stderr.
+    responses = os.fdopen(os.dup(sys.stdout.fileno()), "wb")
+    sys.stdout.flush()
+    os.dup2(sys.stderr.fileno(), sys.stdout.fileno())
+    serve(sys.stdin.buffer, responses)
+
+
+if __name__ == "__main__":
+    main()
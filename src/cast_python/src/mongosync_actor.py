@@ -1,15 +1,161 @@
 import os
+import random
+import threading
 import time
 import requests
 import functools
-from concurrent.futures import ThreadPoolExecutor
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_EXCEPTION, wait
+from typing import NamedTuple, Optional
 import click
-import yaml
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
+import genny_actor
+from genny import yaml_io
+from genny.metrics import columnar
 
-def _get_connection_urls(workload_yaml):
-    with open(workload_yaml) as f:
-        workload = yaml.safe_load(f)
+# How poll checks on mongosync. Override any of these in the workload with e.g.
+#
+# EnvironmentDetails:
+#   MongosyncPolling:
+#     IntervalSeconds: 0.5
+#     TimeoutSeconds: 3600
+DEFAULT_POLLING = {
+    # Wait this long after the first check that doesn't satisfy the predicate...
+    "IntervalSeconds": 0.25,
+    # ...then this much longer after each one after that...
+    "Backoff": 1.5,
+    # ...up to this long.
+    "MaxIntervalSeconds": 1.0,
+    # Randomly lengthen or shorten each wait by up to this fraction of it.
+    "Jitter": 0.1,
+    # Give up if the predicate isn't satisfied after this long. None to wait forever.
+    "TimeoutSeconds": None,
+}
+
+
+# How record_progress samples mongosync. Override any of these in the workload with e.g.
+#
+# EnvironmentDetails:
+#   MongosyncProgressRecorder:
+#     IntervalSeconds: 0.05
+#     DurationSeconds: 3600
+DEFAULT_RECORDING = {
+    # Check each mongosync's progress this often.
+    "IntervalSeconds": 0.1,
+    # Stop checking a mongosync once its state is this. None to never stop early.
+    "StopAtState": "COMMITTED",
+    # Stop after this long even if some haven't reached StopAtState. Required: genny can't
+    # start the next phase until the recorder returns.
+    "DurationSeconds": None,
+    # Where to write the samples, relative to the directory genny is run from. None for
+    # MongosyncProgress.npz in the run's metrics directory, the workload's Metrics: Path.
+    "Path": None,
+}
+
+# Where genny writes a run's metrics unless the workload sets Metrics: Path.
+DEFAULT_METRICS_PATH = "build/WorkloadOutput/CedarMetrics"
+
+
+# Retry requests that couldn't connect to mongosync this many times, waiting a little longer
+# before each try. Requests that did connect are never retried, as /start and /commit aren't
+# safe to repeat.
+CONNECT_RETRIES = 3
+CONNECT_TIMEOUT_SECONDS = 10
+# Give up on a response after this long, or sooner if a poll's TimeoutSeconds runs out first.
+# Generous, since /start and /commit only return once every mongosync has received them.
+READ_TIMEOUT_SECONDS = 300
+# More than the number of mongosyncs a workload connects to, so concurrent requests to the same
+# instance don't have to open and close connections of their own.
+POOL_SIZE = 32
+
+
+class RequestLatency(NamedTuple):
+    """How long one request to mongosync took."""
+
+    method: str
+    url: str
+    route: str
+    seconds: float
+    # None if there was no response.
+    status: Optional[int]
+
+
+_session = None
+_session_lock = threading.Lock()
+# Latencies of requests made since take_request_latencies last emptied it.
+_latencies = deque(maxlen=100000)
+
+
+def _get_session():
+    """
+    The requests.Session shared by everything that talks to mongosync, so connections are kept
+    alive between requests and calls.
+    """
+    global _session
+    with _session_lock:
+        if _session is None:
+            retry = Retry(
+                total=CONNECT_RETRIES,
+                connect=CONNECT_RETRIES,
+                read=0,
+                redirect=0,
+                status=0,
+                backoff_factor=0.1,
+            )
+            adapter = HTTPAdapter(
+                pool_connections=POOL_SIZE, pool_maxsize=POOL_SIZE, max_retries=retry
+            )
+            session = requests.Session()
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            _session = session
+        return _session
+
+
+def _request(method, url, route, deadline=None, **kwargs):
+    """
+    Make a request to the mongosync at url, recording how long it takes. Raises TimeoutError
+    if time.monotonic() has already passed deadline, and otherwise times out when it does.
+    """
+    connect_timeout, read_timeout = CONNECT_TIMEOUT_SECONDS, READ_TIMEOUT_SECONDS
+    if deadline is not None:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise TimeoutError(f"Out of time to request {route} from {url}")
+        connect_timeout = min(connect_timeout, remaining)
+        read_timeout = min(read_timeout, remaining)
+
+    started = time.perf_counter()
+    status = None
+    try:
+        response = _get_session().request(
+            method, f"{url}{route}", timeout=(connect_timeout, read_timeout), **kwargs
+        )
+        status = response.status_code
+        return response
+    except requests.Timeout as e:
+        if deadline is not None and time.monotonic() >= deadline:
+            raise TimeoutError(f"Ran out of time waiting for {route} from {url}") from e
+        raise
+    finally:
+        _latencies.append(RequestLatency(method, url, route, time.perf_counter() - started, status))
+
+
+def take_request_latencies():
+    """Return the latencies recorded since the last call, oldest first."""
+    taken = []
+    while _latencies:
+        taken.append(_latencies.popleft())
+    return taken
+
+
+def _load_workload(workload_yaml):
+    return yaml_io.load_file(workload_yaml)
+
+
+def _get_connection_urls(workload):
     uris = workload.get("EnvironmentDetails", {}).get("MongosyncConnectionURIs")
     if not uris:
         raise Exception(
@@ -18,30 +164,81 @@ def _get_connection_urls(workload_yaml):
     return uris
 
 
-def poll(workload_yaml, predicate, key):
+def _get_polling_config(workload):
+    config = dict(DEFAULT_POLLING)
+    config.update(workload.get("EnvironmentDetails", {}).get("MongosyncPolling") or {})
+    return config
+
+
+def _get_progress(url, key, deadline=None):
+    res = _request("GET", url, "/api/v1/progress", deadline)
+    return res.json()["progress"][key]
+
+
+def _poll_one(url, predicate, key, config, deadline, stop):
     """
-    Wait for all mongosyncs to reach a certain state (e.g. predicate returns False)
-    based on a value returned by the /progress endpoint
+    Poll one mongosync until predicate returns False for its progress[key], and return that
+    value. Raises TimeoutError once time.monotonic() passes deadline, and returns None early if
+    stop is set.
     """
-    connection_urls = _get_connection_urls(workload_yaml)
+    info = None
 
     def get_progress():
-        res = requests.get(f"{url}/api/v1/progress")
-        return res.json()["progress"][key]
+        try:
+            return _get_progress(url, key, deadline)
+        except TimeoutError as e:
+            raise TimeoutError(
+                f"Timed out after {config['TimeoutSeconds']}s polling {url} for {key}, "
+                f"current value = {info}"
+            ) from e
 
-    for url in connection_urls:
+    interval = config["IntervalSeconds"]
+    info = get_progress()
+    while predicate(info):
+        wait_seconds = interval * (1 + random.uniform(-config["Jitter"], config["Jitter"]))
+        if deadline is not None:
+            # Wait no longer than the deadline, so the next check times out on time.
+            wait_seconds = max(min(wait_seconds, deadline - time.monotonic()), 0)
+        if stop.wait(wait_seconds):
+            return None
+        interval = min(interval * config["Backoff"], config["MaxIntervalSeconds"])
+        print(f"Polling {url} for {key}, current value = {info}", flush=True)
         info = get_progress()
-        while predicate(info):
-            time.sleep(1)
-            print(f"Polling {url} for {key}, current value = {info}", flush=True)
-            info = get_progress()
+    return info
+
+
+def poll(workload_yaml, predicate, key):
+    """
+    Wait for all mongosyncs to reach a certain state (e.g. predicate returns False)
+    based on a value returned by the /progress endpoint. All of them are polled at
+    once, and this returns as soon as the last one gets there.
+
+    :return: the final value of progress[key] for each connection url
+    """
+    workload = _load_workload(workload_yaml)
+    connection_urls = _get_connection_urls(workload)
+    config = _get_polling_config(workload)
+    deadline = None
+    if config["TimeoutSeconds"] is not None:
+        deadline = time.monotonic() + config["TimeoutSeconds"]
+
+    stop = threading.Event()
+    with ThreadPoolExecutor(max_workers=len(connection_urls)) as executor:
+        futures = {
+            url: executor.submit(_poll_one, url, predicate, key, config, deadline, stop)
+            for url in connection_urls
+        }
+        wait(futures.values(), return_when=FIRST_EXCEPTION)
+        # Stop polling the others if one of them failed.
+        stop.set()
+        return {url: future.result() for url, future in futures.items()}
 
 
 def _change_one_mongosync_state(route, body, url):
     """
     Change state of a given mongosync running at the provided url
     """
-    resp = requests.post(f"{url}{route}", json=body)
+    resp = _request("POST", url, route, json=body)
     print(resp.json(), flush=True)
     success = resp.json()["success"]
     if not success:
@@ -56,7 +253,7 @@ def change_state(workload_yaml, route, body):
     all instances recieve them
     """
 
-    connection_urls = _get_connection_urls(workload_yaml)
+    connection_urls = _get_connection_urls(_load_workload(workload_yaml))
 
     fn = functools.partial(_change_one_mongosync_state, route, body)
     with ThreadPoolExecutor() as executor:
@@ -70,6 +267,131 @@ def change_state(workload_yaml, route, body):
             f.result()
 
 
+def _get_recording_config(workload):
+    config = dict(DEFAULT_RECORDING)
+    config.update(workload.get("EnvironmentDetails", {}).get("MongosyncProgressRecorder") or {})
+    if config["DurationSeconds"] is None:
+        raise Exception(
+            "MongosyncProgressRecorder needs a DurationSeconds, or the phase it runs in may "
+            "never end"
+        )
+    if config["Path"] is None:
+        metrics_path = (workload.get("Metrics") or {}).get("Path") or DEFAULT_METRICS_PATH
+        config["Path"] = os.path.join(metrics_path, "MongosyncProgress.npz")
+    return config
+
+
+def _flatten(document, prefix=""):
+    """Yield (dotted name, value) for every scalar in a nested dict."""
+    for name, value in document.items():
+        if isinstance(value, dict):
+            yield from _flatten(value, f"{prefix}{name}.")
+        else:
+            yield prefix + name, value
+
+
+def _sample_one(url, config, deadline, stop):
+    """
+    Fetch one mongosync's progress every IntervalSeconds until it reaches StopAtState, the
+    deadline passes or stop is set.
+
+    :return: a list of (milliseconds since the epoch, progress, request latency in seconds)
+    """
+    samples = []
+    next_sample = time.monotonic()
+    while True:
+        ts = int(time.time() * 1000)
+        started = time.perf_counter()
+        try:
+            progress = _request("GET", url, "/api/v1/progress", deadline).json()["progress"]
+        except TimeoutError:
+            # DurationSeconds ran out while waiting for mongosync.
+            return samples
+        except (requests.RequestException, ValueError, KeyError) as e:
+            # A sample missed while mongosync is busy or restarting is still a sample.
+            print(f"Couldn't get progress from {url}: {e}", flush=True)
+            progress = {}
+        samples.append((ts, progress, time.perf_counter() - started))
+
+        if config["StopAtState"] is not None and progress.get("state") == config["StopAtState"]:
+            return samples
+        # Keep to the interval however long the request took, without drifting.
+        next_sample += config["IntervalSeconds"]
+        if deadline is not None and next_sample >= deadline:
+            return samples
+        if stop.wait(max(next_sample - time.monotonic(), 0)):
+            return samples
+
+
+def _to_columns(connection_urls, samples):
+    """
+    Turn each url's samples into int64 columns ordered by time, and the metadata needed to read
+    them back with genny.metrics.read_table.
+
+    Every row has ts (milliseconds since the epoch), instance (index into connection_urls),
+    latency_us and then one column per field of progress, e.g. lagTimeSeconds or
+    collectionCopy.estimatedCopiedBytes, encoded by genny.metrics.encode_table.
+    """
+    rows = sorted(
+        (
+            (ts, instance, latency, dict(_flatten(progress)))
+            for instance, url in enumerate(connection_urls)
+            for ts, progress, latency in samples[url]
+        ),
+        key=lambda row: row[:3],
+    )
+    fields, metadata = columnar.encode_table([row[3] for row in rows])
+    columns = {
+        "ts": [row[0] for row in rows],
+        "instance": [row[1] for row in rows],
+        "latency_us": [int(round(row[2] * 1e6)) for row in rows],
+        **fields,
+    }
+    return columns, metadata
+
+
+def record_progress(workload_yaml):
+    """
+    Sample /progress from every mongosync at once until they all reach StopAtState or
+    DurationSeconds passes, and write the samples to a columnar .npz file to read back with
+    genny.metrics.read_table. See _to_columns for the columns.
+
+    :return: the path written to
+    """
+    workload = _load_workload(workload_yaml)
+    connection_urls = _get_connection_urls(workload)
+    config = _get_recording_config(workload)
+    deadline = None
+    if config["DurationSeconds"] is not None:
+        deadline = time.monotonic() + config["DurationSeconds"]
+
+    stop = threading.Event()
+    with ThreadPoolExecutor(max_workers=len(connection_urls)) as executor:
+        futures = {
+            url: executor.submit(_sample_one, url, config, deadline, stop)
+            for url in connection_urls
+        }
+        wait(futures.values(), return_when=FIRST_EXCEPTION)
+        stop.set()
+        samples = {url: future.result() for url, future in futures.items()}
+
+    columns, metadata = _to_columns(connection_urls, samples)
+    path = config["Path"]
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    columnar.write_columnar(
+        columns,
+        path,
+        metadata={
+            "source": "mongosync_actor.record_progress",
+            "instances": connection_urls,
+            "interval_seconds": config["IntervalSeconds"],
+            **metadata,
+        },
+    )
+    print(f"Wrote {len(columns['ts'])} progress samples to {path}", flush=True)
+    return path
+
+
 @click.group(name="MongosyncActor", context_settings=dict(help_option_names=["-h", "--help"]))
 def cli():
     pass
@@ -115,5 +437,46 @@ def wait_for_commit(workload_yaml):
     poll(workload_yaml, lambda x: x != "COMMITTED", "state")
 
 
+@cli.command(
+    "record_progress",
+    help=(
+        "Record every mongosync's progress, including lagTimeSeconds, until they reach "
+        "a state or for a while"
+    ),
+)
+@click.argument("workload_yaml", nargs=1)
+def record_progress_command(workload_yaml):
+    record_progress(workload_yaml)
+
+
+def _metric_name(route):
+    """E.g. MongosyncStart for /api/v1/start."""
+    return "Mongosync" + route.rstrip("/").rsplit("/", 1)[-1].capitalize()
+
+
+def _reporting_request_latencies(function):
+    def endpoint(ctx):
+        take_request_latencies()
+        try:
+            function(ctx.workload_path)
+        finally:
+            for latency in take_request_latencies():
+                failed = latency.status is None or latency.status >= 400
+                ctx.report(
+                    _metric_name(latency.route),
+                    latency.seconds,
+                    errors=int(failed),
+                    outcome="failure" if failed else "success",
+                )
+
+    return endpoint
+
+
+# Run by genny_python_worker, the same endpoints also report how long each request to mongosync
+# took, as MongosyncStart, MongosyncProgress and MongosyncCommit.
+for _name, _command in cli.commands.items():
+    genny_actor.endpoint(_name)(_reporting_request_latencies(_command.callback))
+
+
 if __name__ == "__main__":
     cli()
@@ -0,0 +1,99 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class FakeMongosync:
+    """
+    A stand-in for one mongosync's HTTP API on a local port. It starts out idle; /api/v1/start
+    moves it through collection copy to change event application, with lagTimeSeconds falling
+    each time progress is checked, and /api/v1/commit to COMMITTED a couple of checks later.
+    """
+
+    def __init__(self, initial_lag=12):
+        self.state = "IDLE"
+        self.info = None
+        self.lag = initial_lag
+        self.events_applied = 0
+        # Progress checks since the last state change.
+        self.checks = 0
+        # Seconds to wait before answering each request, to act like a mongosync that hangs.
+        self.delay = 0
+        self.requests = []
+        # Client ports of the connections requests arrived on.
+        self.connections = set()
+        self._lock = threading.Lock()
+
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            # Keep connections open between requests.
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                fake._handle(self, None)
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                fake._handle(self, json.loads(self.rfile.read(length) or b"{}"))
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.server.server_port}"
+        self._thread = threading.Thread(
+            target=self.server.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True
+        )
+        self._thread.start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def _handle(self, handler, body):
+        time.sleep(self.delay)
+        with self._lock:
+            self.requests.append((handler.command, handler.path))
+            self.connections.add(handler.client_address[1])
+            status, response = 200, self._respond(handler.command, handler.path)
+            if response is None:
+                status, response = 404, {"success": False, "error": "NotFound"}
+
+        payload = json.dumps(response).encode()
+        handler.send_response(status)
+        handler.send_header("Content-Type", "application/json")
+        handler.send_header("Content-Length", str(len(payload)))
+        handler.end_headers()
+        handler.wfile.write(payload)
+
+    def _respond(self, method, path):
+        if (method, path) == ("POST", "/api/v1/start"):
+            self.state, self.info, self.checks = "RUNNING", "collection copy", 0
+            return {"success": True}
+        if (method, path) == ("POST", "/api/v1/commit"):
+            self.state, self.checks = "COMMITTING", 0
+            return {"success": True}
+        if (method, path) != ("GET", "/api/v1/progress"):
+            return None
+
+        self.checks += 1
+        if self.state == "RUNNING":
+            if self.checks >= 2:
+                self.info = "change event application"
+            self.lag = max(0, self.lag - 4)
+            self.events_applied += 100
+        elif self.state == "COMMITTING" and self.checks >= 2:
+            self.state, self.info = "COMMITTED", "commit completed"
+        return {
+            "progress": {
+                "state": self.state,
+                "canCommit": self.state == "RUNNING" and self.lag <= 5,
+                "info": self.info,
+                "lagTimeSeconds": self.lag,
+                "collectionCopy": {"estimatedTotalBytes": 1000, "estimatedCopiedBytes": 1000},
+                "totalEventsApplied": self.events_applied,
+            }
+        }
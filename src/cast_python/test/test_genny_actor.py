@@ -0,0 +1,162 @@
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import textwrap
+import unittest
+from unittest.mock import patch
+
+import genny_actor
+import genny_python_worker as worker
+from genny import yaml_io
+
+WORKLOAD = """
+SchemaVersion: 2018-07-01
+Actors:
+- Name: Inserter
+  Type: Python
+  Phases:
+  - Repeat: 2
+    Module: sdk_actor
+    Endpoint: insert
+    BatchSize: 25
+    Metrics: [Insert, Seen]
+  - Repeat: 1
+    Module: sdk_actor
+    Endpoint: broken
+"""
+
+SDK_ACTOR = """
+import genny_actor
+
+
+@genny_actor.endpoint()
+def insert(ctx):
+    batch_size = ctx.phase_config.get("BatchSize", 1)
+    with ctx.timer("Insert", ops=batch_size):
+        pass
+    ctx.count("Seen", ops=3)
+    return 7
+
+
+@genny_actor.endpoint("broken")
+def fails(ctx):
+    with ctx.timer("Insert"):
+        raise ValueError("no inserts today")
+
+
+if __name__ == "__main__":
+    genny_actor.main()
+"""
+
+
+class TestGennyActor(unittest.TestCase):
+    def setUp(self):
+        self._tmpdir = tempfile.TemporaryDirectory()
+        self.workload = os.path.join(self._tmpdir.name, "Workload.yml")
+        with open(self.workload, "w") as f:
+            f.write(textwrap.dedent(WORKLOAD))
+        with open(os.path.join(self._tmpdir.name, "sdk_actor.py"), "w") as f:
+            f.write(textwrap.dedent(SDK_ACTOR))
+        sys.path.insert(0, self._tmpdir.name)
+
+    def tearDown(self):
+        sys.path.remove(self._tmpdir.name)
+        sys.modules.pop("sdk_actor", None)
+        self._tmpdir.cleanup()
+
+    def _request(self, endpoint, phase):
+        return {
+            "module": "sdk_actor",
+            "endpoint": endpoint,
+            "args": [self.workload],
+            "actor": "Inserter",
+            "phase": phase,
+        }
+
+    def test_context(self):
+        with patch.object(yaml_io, "load_file", wraps=yaml_io.load_file) as load_file:
+            context = genny_actor.Context(self.workload, "Inserter", 0)
+            self.assertEqual(context.phase_config["BatchSize"], 25)
+            self.assertEqual(
+                genny_actor.Context(self.workload, "Inserter", 1).phase_config,
+                {"Repeat": 1, "Module": "sdk_actor", "Endpoint": "broken"},
+            )
+            self.assertEqual(genny_actor.Context(self.workload, "Other", 0).phase_config, {})
+            self.assertEqual(genny_actor.Context(self.workload).phase_config, {})
+            # Parsed once however many contexts use it, until the file changes.
+            self.assertEqual(load_file.call_count, 1)
+            os.utime(self.workload, ns=(0, 0))
+            self.assertEqual(context.workload["SchemaVersion"].isoformat(), "2018-07-01")
+            self.assertEqual(load_file.call_count, 2)
+
+    def test_metrics(self):
+        context = genny_actor.Context(self.workload)
+        with context.timer("Op", ops=5, size=100):
+            pass
+        with self.assertRaises(KeyError):
+            with context.timer("Op"):
+                raise KeyError()
+        context.count("Docs", ops=2, errors=1)
+        context.report("Lag", duration=1.5, outcome="unknown")
+
+        self.assertEqual(
+            [
+                (m["metric"], m["ops"], m["size"], m["errors"], m["outcome"])
+                for m in context.metrics
+            ],
+            [
+                ("Op", 5, 100, 0, "success"),
+                ("Op", 1, 0, 1, "failure"),
+                ("Docs", 2, 0, 1, "unknown"),
+                ("Lag", 1, 0, 0, "unknown"),
+            ],
+        )
+        self.assertEqual(context.metrics[3]["duration_us"], 1500000)
+        self.assertEqual(
+            json.dumps(context.metrics[0])[: len(genny_actor.METRIC_KEY)], genny_actor.METRIC_KEY
+        )
+        with self.assertRaises(ValueError):
+            context.report("Op", outcome="maybe")
+
+    def test_worker(self):
+        response = worker.call(self._request("insert", 0))
+        self.assertEqual((response["output"], response["exit_code"]), ("7\n", 0))
+        self.assertEqual(
+            [(m["metric"], m["ops"]) for m in response["metrics"]], [("Insert", 25), ("Seen", 3)]
+        )
+
+        response = worker.call(self._request("broken", 1))
+        self.assertEqual(response["exit_code"], 1)
+        self.assertIn("ValueError: no inserts today", response["output"])
+        self.assertEqual(response["metrics"][0]["outcome"], "failure")
+
+        response = worker.call(self._request("missing", 1))
+        self.assertEqual(response["exit_code"], 1)
+        self.assertIn("has no endpoint missing", response["output"])
+
+    def test_process(self):
+        env = dict(os.environ)
+        env["PYTHONPATH"] = os.pathsep.join(sys.path)
+
+        def run(**extra_env):
+            result = subprocess.run(
+                [sys.executable, "-m", "sdk_actor", "insert", self.workload],
+                stdout=subprocess.PIPE,
+                universal_newlines=True,
+                env={**env, **extra_env},
+                check=True,
+            )
+            return result.stdout.splitlines()
+
+        lines = run(**{genny_actor.ACTOR_ENV: "Inserter", genny_actor.PHASE_ENV: "0"})
+        self.assertEqual(lines[0], "7")
+        self.assertTrue(all(line.startswith(genny_actor.METRIC_KEY) for line in lines[1:]))
+        # The same phase config as in the worker.
+        self.assertEqual([json.loads(line)["ops"] for line in lines[1:]], [25, 3])
+
+        env.pop(genny_actor.ACTOR_ENV, None)
+        env.pop(genny_actor.PHASE_ENV, None)
+        lines = run()
+        self.assertEqual([json.loads(line)["ops"] for line in lines[1:]], [1, 3])
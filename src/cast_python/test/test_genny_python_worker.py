@@ -0,0 +1,129 @@
+import io
+import os
+import subprocess
+import sys
+import tempfile
+import textwrap
+import unittest
+
+import genny_python_worker as worker
+
+FAILING_ACTOR = """
+import os
+import sys
+import click
+
+
+@click.group()
+def cli():
+    pass
+
+
+@cli.command("fail")
+@click.argument("workload_yaml", nargs=1)
+def fail(workload_yaml):
+    print("about to fail")
+    raise ValueError("failed on " + workload_yaml)
+
+
+@cli.command("exit_3")
+@click.argument("workload_yaml", nargs=1)
+def exit_3(workload_yaml):
+    print("exiting", file=sys.stderr)
+    sys.exit(3)
+
+
+@cli.command("stray_output")
+@click.argument("workload_yaml", nargs=1)
+def stray_output(workload_yaml):
+    # Like a program run by the endpoint, bypassing sys.stdout.
+    os.write(1, b"stray\\n")
+    print("done")
+"""
+
+
+def _request(endpoint, module="example_actor", args=("workload.yml",)):
+    return {"module": module, "endpoint": endpoint, "args": list(args)}
+
+
+class TestGennyPythonWorker(unittest.TestCase):
+    def setUp(self):
+        self._tmpdir = tempfile.TemporaryDirectory()
+        with open(os.path.join(self._tmpdir.name, "failing_actor.py"), "w") as f:
+            f.write(textwrap.dedent(FAILING_ACTOR))
+        sys.path.insert(0, self._tmpdir.name)
+
+    def tearDown(self):
+        sys.path.remove(self._tmpdir.name)
+        self._tmpdir.cleanup()
+
+    def test_call(self):
+        self.assertEqual(
+            worker.call(_request("hello_world")),
+            {"output": "Hello world from workload.yml\n", "exit_code": 0, "metrics": []},
+        )
+
+    def test_call_failures(self):
+        response = worker.call(_request("fail", "failing_actor"))
+        self.assertEqual(response["exit_code"], 1)
+        self.assertIn("about to fail", response["output"])
+        self.assertIn("ValueError: failed on workload.yml", response["output"])
+
+        self.assertEqual(
+            worker.call(_request("exit_3", "failing_actor")),
+            {"output": "exiting\n", "exit_code": 3, "metrics": []},
+        )
+
+        response = worker.call(_request("no_such_endpoint"))
+        self.assertEqual(response["exit_code"], 2)
+        self.assertIn("No such command", response["output"])
+
+        response = worker.call(_request("hello_world", "no_such_module"))
+        self.assertEqual(response["exit_code"], 1)
+        self.assertIn("ModuleNotFoundError", response["output"])
+
+    def test_messages(self):
+        stream = io.BytesIO()
+        worker.write_message(stream, {"a": "é"})
+        worker.write_message(stream, {"b": [1, 2]})
+        self.assertEqual(stream.getvalue()[:4], b"\x00\x00\x00\x0f")
+
+        stream.seek(0)
+        self.assertEqual(worker.read_message(stream), {"a": "é"})
+        self.assertEqual(worker.read_message(stream), {"b": [1, 2]})
+        self.assertIsNone(worker.read_message(stream))
+
+        with self.assertRaises(EOFError):
+            worker.read_message(io.BytesIO(b"\x00\x00\x00\x10{}"))
+
+    def test_process(self):
+        env = dict(os.environ)
+        env["PYTHONPATH"] = os.pathsep.join(sys.path)
+        process = subprocess.Popen(
+            [sys.executable, "-m", "genny_python_worker"],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            env=env,
+        )
+        try:
+            responses = []
+            for request in [
+                _request("hello_world"),
+                _request("fail", "failing_actor"),
+                _request("stray_output", "failing_actor"),
+                _request("hello_world", args=["other.yml"]),
+            ]:
+                worker.write_message(process.stdin, request)
+                responses.append(worker.read_message(process.stdout))
+        finally:
+            process.stdin.close()
+            self.assertEqual(process.wait(timeout=30), 0)
+            process.stdout.close()
+            stderr = process.stderr.read()
+            process.stderr.close()
+
+        self.assertEqual([response["exit_code"] for response in responses], [0, 1, 0, 0])
+        self.assertEqual(responses[2]["output"], "done\n")
+        self.assertEqual(stderr, b"stray\n")
+        self.assertEqual(responses[3]["output"], "Hello world from other.yml\n")
@@ -1,8 +1,18 @@
+import os
+import tempfile
 import unittest
 import builtins
+import threading
+import time
 import requests
 from unittest.mock import patch, Mock, call, mock_open
+import genny_python_worker
+import numpy as np
+from genny.metrics import columnar, read_columnar, read_table, ColumnarFile
 import mongosync_actor as actor
+from fake_mongosync import FakeMongosync
+
+TIMEOUT = (actor.CONNECT_TIMEOUT_SECONDS, actor.READ_TIMEOUT_SECONDS)
 
 ONE_MS = """
 EnvironmentDetails:
@@ -18,6 +28,18 @@ EnvironmentDetails:
     - "http://localhost:27184"
 """
 
+FAST_POLLING = (
+    MULTIPLE_MS
+    + """
+  MongosyncPolling:
+    IntervalSeconds: 0.01
+    Backoff: 2
+    MaxIntervalSeconds: 0.05
+    Jitter: 0.5
+    TimeoutSeconds: %s
+"""
+)
+
 
 class TestMongosyncActor(unittest.TestCase):
     @patch.object(builtins, "open", new_callable=mock_open, read_data="foo: bar")
@@ -26,44 +48,300 @@ class TestMongosyncActor(unittest.TestCase):
             actor.poll("", lambda x: x == 10, "progress")
 
     @patch.object(builtins, "open", new_callable=mock_open, read_data=ONE_MS)
-    @patch.object(requests, "get")
+    @patch.object(requests.Session, "request")
     def test_poll_one_ms(self, mock_get, mock_open_file):
         mock_get.return_value = Mock(status_code=200, json=lambda: {"progress": {"lag": 2}})
         actor.poll("", lambda x: x > 10, "lag")
-        mock_get.assert_called_once_with("http://localhost:27182/api/v1/progress")
+        mock_get.assert_called_once_with(
+            "GET", "http://localhost:27182/api/v1/progress", timeout=TIMEOUT
+        )
 
     @patch.object(builtins, "open", new_callable=mock_open, read_data=MULTIPLE_MS)
-    @patch.object(requests, "get")
+    @patch.object(requests.Session, "request")
     def test_poll_multiple_ms(self, mock_get, mock_open_file):
         mock_get.return_value = Mock(status_code=200, json=lambda: {"progress": {"lag": 2}})
         actor.poll("", lambda x: x > 10, "lag")
         expected_calls = [
-            call("http://localhost:27182/api/v1/progress"),
-            call("http://localhost:27183/api/v1/progress"),
-            call("http://localhost:27184/api/v1/progress"),
+            call("GET", "http://localhost:27182/api/v1/progress", timeout=TIMEOUT),
+            call("GET", "http://localhost:27183/api/v1/progress", timeout=TIMEOUT),
+            call("GET", "http://localhost:27184/api/v1/progress", timeout=TIMEOUT),
         ]
         mock_get.assert_has_calls(expected_calls, any_order=True)
 
     @patch.object(builtins, "open", new_callable=mock_open, read_data=ONE_MS)
-    @patch.object(requests, "post")
+    @patch.object(requests.Session, "request")
     def test_change_state(self, mock_post, mock_open_file):
         actor.change_state("", "/api/v1/start", {})
-        mock_post.assert_called_once_with("http://localhost:27182/api/v1/start", json={})
+        mock_post.assert_called_once_with(
+            "POST", "http://localhost:27182/api/v1/start", timeout=TIMEOUT, json={}
+        )
 
     @patch.object(builtins, "open", new_callable=mock_open, read_data=ONE_MS)
-    @patch.object(requests, "post")
+    @patch.object(requests.Session, "request")
     def test_change_state_failed(self, mock_post, mock_open_file):
         mock_post.return_value = Mock(status_code=200, json=lambda: {"success": False})
         with self.assertRaisesRegex(Exception, "route /api/v1/start"):
             actor.change_state("", "/api/v1/start", {})
 
     @patch.object(builtins, "open", new_callable=mock_open, read_data=MULTIPLE_MS)
-    @patch.object(requests, "post")
+    @patch.object(requests.Session, "request")
     def test_change_state_multiple_ms(self, mock_post, mock_open_file):
         actor.change_state("", "/api/v1/start", {})
         expected_calls = [
-            call("http://localhost:27182/api/v1/start", json={}),
-            call("http://localhost:27183/api/v1/start", json={}),
-            call("http://localhost:27184/api/v1/start", json={}),
+            call("POST", "http://localhost:27182/api/v1/start", timeout=TIMEOUT, json={}),
+            call("POST", "http://localhost:27183/api/v1/start", timeout=TIMEOUT, json={}),
+            call("POST", "http://localhost:27184/api/v1/start", timeout=TIMEOUT, json={}),
         ]
         mock_post.assert_has_calls(expected_calls, any_order=True)
+
+    @patch.object(builtins, "open", new_callable=mock_open, read_data=FAST_POLLING % "null")
+    @patch.object(requests.Session, "request")
+    def test_poll_concurrently(self, mock_get, mock_open_file):
+        # Only passes once every instance has been asked for its progress at the same time.
+        all_polling = threading.Barrier(3, timeout=10)
+        checks = {}
+
+        def get(method, url, **kwargs):
+            base = url[: -len("/api/v1/progress")]
+            checks[base] = checks.get(base, 0) + 1
+            if checks[base] == 1:
+                all_polling.wait()
+            # Each instance catches up after a different number of checks.
+            lag = 10 - checks[base] * int(base[-1])
+            return Mock(status_code=200, json=lambda: {"progress": {"lag": lag}})
+
+        mock_get.side_effect = get
+        result = actor.poll("", lambda x: x > 5, "lag")
+        self.assertEqual(
+            result,
+            {"http://localhost:27182": 4, "http://localhost:27183": 4, "http://localhost:27184": 2},
+        )
+        self.assertEqual(
+            checks,
+            {"http://localhost:27182": 3, "http://localhost:27183": 2, "http://localhost:27184": 2},
+        )
+
+    @patch.object(builtins, "open", new_callable=mock_open, read_data=FAST_POLLING % 0.2)
+    @patch.object(requests.Session, "request")
+    def test_poll_timeout(self, mock_get, mock_open_file):
+        mock_get.return_value = Mock(status_code=200, json=lambda: {"progress": {"lag": 20}})
+        started = time.monotonic()
+        with self.assertRaisesRegex(TimeoutError, "polling http://localhost:2718[234] for lag"):
+            actor.poll("", lambda x: x > 5, "lag")
+        self.assertLess(time.monotonic() - started, 5)
+        # Polled repeatedly, but backed off to at most every 0.05s.
+        self.assertGreater(mock_get.call_count, 6)
+        self.assertLess(mock_get.call_count, 3 * (0.2 / 0.025 + 4))
+
+    def test_to_columns(self):
+        urls = ["http://a", "http://b"]
+        samples = {
+            # The same time and latency as the other instance's first sample.
+            "http://a": [(1000, {"state": "RUNNING", "lagTimeSeconds": 1.5, "n": -1}, 0.25)],
+            "http://b": [
+                (1000, {"state": "RUNNING", "lagTimeSeconds": 2, "n": 4}, 0.25),
+                (1100, {"state": None, "lagTimeSeconds": 0.25, "copy": {"done": True}}, 0.5),
+            ],
+        }
+        columns, metadata = actor._to_columns(urls, samples)
+        self.assertEqual(columns["instance"], [0, 1, 1])
+        self.assertEqual(columns["latency_us"], [250000, 250000, 500000])
+        self.assertEqual(list(columns)[:4], ["ts", "instance", "latency_us", "copy.done"])
+        self.assertEqual(metadata["scales"], {"lagTimeSeconds": columnar.FLOAT_SCALE})
+        self.assertEqual(
+            metadata["valid"],
+            {"copy.done": "valid.copy.done", "n": "valid.n", "state": "valid.state"},
+        )
+        self.assertEqual(columns["valid.n"], [1, 1, 0])
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "progress.npz")
+            columnar.write_columnar(columns, path, metadata=metadata)
+            read = read_table(path)
+        self.assertNotIn("valid.n", read)
+        np.testing.assert_array_equal(read["lagTimeSeconds"], [1.5, 2, 0.25])
+        # A reported -1 is kept apart from a missing value.
+        np.testing.assert_array_equal(read["n"], [-1, 4, np.nan])
+        np.testing.assert_array_equal(read["copy.done"], [np.nan, np.nan, 1])
+        np.testing.assert_array_equal(read["state"], [0, 0, np.nan])
+
+    def test_workload_records_commit(self):
+        # The recorder waits for COMMITTED, so it has to run in the phase that commits.
+        workload = actor._load_workload(
+            os.path.join(
+                os.path.dirname(__file__), "../../workloads/c2c/ChangeEventApplication.yml"
+            )
+        )
+        phases = {
+            phase["LoadConfig"]["Key"]: number
+            for each in workload["Actors"]
+            for number, phase in enumerate(each["Phases"])
+            if "LoadConfig" in phase
+        }
+        self.assertEqual(phases["RecordProgress"], phases["Commit"])
+        self.assertEqual(actor._get_recording_config(workload)["StopAtState"], "COMMITTED")
+
+
+class TestMongosyncActorWithFakeMongosync(unittest.TestCase):
+    def setUp(self):
+        self.fakes = [FakeMongosync(), FakeMongosync(initial_lag=20)]
+        self._tmpdir = tempfile.TemporaryDirectory()
+        self.workload = os.path.join(self._tmpdir.name, "Workload.yml")
+        with open(self.workload, "w") as f:
+            f.write(
+                "EnvironmentDetails:\n"
+                "  MongosyncConnectionURIs: [%s]\n"
+                "  MongosyncPolling: {IntervalSeconds: 0.01, MaxIntervalSeconds: 0.02}\n"
+                % ", ".join(fake.url for fake in self.fakes)
+            )
+        actor.take_request_latencies()
+
+    def tearDown(self):
+        for fake in self.fakes:
+            fake.close()
+        self._tmpdir.cleanup()
+
+    def test_migration(self):
+        for command in ["start", "poll_for_cea", "drain_writes", "commit", "wait_for_commit"]:
+            actor.cli.commands[command].callback(self.workload)
+
+        for fake in self.fakes:
+            self.assertEqual(fake.state, "COMMITTED")
+            self.assertLessEqual(fake.lag, 5)
+            # Connections are kept alive and reused, rather than opened for every request.
+            self.assertGreater(len(fake.requests), 6)
+            self.assertLessEqual(len(fake.connections), 3)
+
+        latencies = actor.take_request_latencies()
+        self.assertEqual(len(latencies), sum(len(fake.requests) for fake in self.fakes))
+        self.assertEqual(
+            {(latency.method, latency.route, latency.status) for latency in latencies},
+            {
+                ("POST", "/api/v1/start", 200),
+                ("GET", "/api/v1/progress", 200),
+                ("POST", "/api/v1/commit", 200),
+            },
+        )
+        self.assertTrue(all(latency.seconds > 0 for latency in latencies))
+        self.assertEqual(actor.take_request_latencies(), [])
+
+    def _record_with(self, config):
+        path = os.path.join(self._tmpdir.name, "progress", "MongosyncProgress.npz")
+        with open(self.workload, "a") as f:
+            f.write(f"  MongosyncProgressRecorder: {{Path: {path}, {config}}}\n")
+        return path
+
+    def test_record_progress(self):
+        path = self._record_with("IntervalSeconds: 0.01, DurationSeconds: 10")
+        recorder = threading.Thread(target=actor.record_progress, args=[self.workload])
+        recorder.start()
+        while not all(fake.requests for fake in self.fakes):
+            time.sleep(0.01)
+        for command in ["start", "poll_for_cea", "drain_writes", "commit", "wait_for_commit"]:
+            actor.cli.commands[command].callback(self.workload)
+        recorder.join(timeout=10)
+        self.assertFalse(recorder.is_alive())
+
+        metadata = ColumnarFile(path).metadata
+        self.assertEqual(metadata["instances"], [fake.url for fake in self.fakes])
+        states = metadata["strings"]["state"]
+        self.assertEqual(set(states), {"IDLE", "RUNNING", "COMMITTING", "COMMITTED"})
+
+        columns = read_table(path)
+        self.assertLessEqual(
+            {
+                "ts",
+                "instance",
+                "latency_us",
+                "state",
+                "info",
+                "canCommit",
+                "lagTimeSeconds",
+                "totalEventsApplied",
+                "collectionCopy.estimatedCopiedBytes",
+            },
+            set(columns),
+        )
+        self.assertTrue(np.all(np.diff(columns["ts"]) >= 0))
+        self.assertTrue(np.all(columns["latency_us"] > 0))
+        # Nothing to report before the migration starts.
+        self.assertTrue(np.isnan(columns["info"][0]))
+
+        for instance, fake in enumerate(self.fakes):
+            rows = columns["instance"] == instance
+            self.assertGreater(rows.sum(), 3)
+            lag = columns["lagTimeSeconds"][rows]
+            self.assertTrue(np.all(np.diff(lag) <= 0))
+            self.assertEqual(lag[-1], fake.lag)
+            # Each instance stops being sampled once it has committed.
+            self.assertEqual(states[columns["state"][rows][-1]], "COMMITTED")
+            self.assertEqual(states[columns["state"][rows][-2]], "COMMITTING")
+
+    def test_record_progress_duration(self):
+        path = self._record_with("IntervalSeconds: 0.02, DurationSeconds: 0.2, StopAtState: null")
+        started = time.monotonic()
+        self.assertEqual(actor.record_progress(self.workload), path)
+        self.assertLess(time.monotonic() - started, 1)
+
+        columns = read_columnar(path, ["instance", "state"])
+        for instance in range(len(self.fakes)):
+            self.assertIn((columns["instance"] == instance).sum(), range(5, 12))
+        self.assertEqual(set(columns["state"]), {0})
+
+        with open(self.workload, "a") as f:
+            f.write("  MongosyncProgressRecorder: {StopAtState: COMMITTED}\n")
+        with self.assertRaisesRegex(Exception, "needs a DurationSeconds"):
+            actor.record_progress(self.workload)
+
+    def test_record_progress_default_path(self):
+        config = {"EnvironmentDetails": {"MongosyncProgressRecorder": {"DurationSeconds": 1}}}
+        self.assertEqual(
+            actor._get_recording_config(config)["Path"],
+            "build/WorkloadOutput/CedarMetrics/MongosyncProgress.npz",
+        )
+        # With a shared Poplar daemon the run's metrics go to a directory of their own.
+        config["Metrics"] = {"Path": "build/WorkloadOutput/CedarMetrics/CollectionCopy"}
+        self.assertEqual(
+            actor._get_recording_config(config)["Path"],
+            "build/WorkloadOutput/CedarMetrics/CollectionCopy/MongosyncProgress.npz",
+        )
+
+    def test_worker_reports_latencies(self):
+        response = genny_python_worker.call(
+            {"module": "mongosync_actor", "endpoint": "start", "args": [self.workload]}
+        )
+        self.assertEqual(response["exit_code"], 0, response["output"])
+        self.assertEqual(
+            [(metric["metric"], metric["outcome"]) for metric in response["metrics"]],
+            [("MongosyncStart", "success")] * 2,
+        )
+
+        response = genny_python_worker.call(
+            {"module": "mongosync_actor", "endpoint": "poll_for_cea", "args": [self.workload]}
+        )
+        self.assertEqual(response["exit_code"], 0, response["output"])
+        self.assertEqual(
+            {metric["metric"] for metric in response["metrics"]}, {"MongosyncProgress"}
+        )
+        self.assertEqual(len(response["metrics"]), 4)
+
+    def test_poll_timeout_while_hung(self):
+        with open(self.workload, "a") as f:
+            f.write("  MongosyncPolling: {IntervalSeconds: 0.01, TimeoutSeconds: 0.2}\n")
+        self.fakes[1].delay = 2
+        started = time.monotonic()
+        with self.assertRaisesRegex(TimeoutError, "polling http://127.0.0.1:[0-9]+ for info"):
+            actor.cli.commands["poll_for_cea"].callback(self.workload)
+        self.assertLess(time.monotonic() - started, 1)
+
+    def test_connection_errors(self):
+        session = actor._get_session()
+        self.assertIs(actor._get_session(), session)
+        self.assertEqual(session.get_adapter("http://").max_retries.connect, actor.CONNECT_RETRIES)
+
+        closed = self.fakes.pop()
+        closed.close()
+        with self.assertRaises(requests.ConnectionError):
+            actor.change_state(self.workload, "/api/v1/start", {})
+        latencies = {latency.url: latency.status for latency in actor.take_request_latencies()}
+        self.assertEqual(latencies, {self.fakes[0].url: 200, closed.url: None})
@@ -0,0 +1,85 @@
+"""
+Validates genny.metrics' FTDC reader against `curator ftdc export csv` and compares
+how long each takes to turn an actor's .ftdc file into columns of numbers.
+
+For every file, curator's csv is loaded with numpy and must match the columns
+read natively, name for name and value for value.
+
+Run from the genny repo root after running a workload:
+
+    PYTHONPATH=src/lamplib/src python3 src/lamplib/benchmarks/bench_ftdc.py \\
+        build/WorkloadOutput/CedarMetrics/*.ftdc
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from genny import metrics
+
+
+def _curator_columns(curator: str, path: str) -> dict:
+    with tempfile.TemporaryDirectory() as tmpdir:
+        csv_path = os.path.join(tmpdir, "out.csv")
+        subprocess.run(
+            [curator, "ftdc", "export", "csv", "--input", path, "--output", csv_path], check=True
+        )
+        with open(csv_path) as f:
+            header = f.readline().strip().split(",")
+            table = np.loadtxt(f, delimiter=",", dtype=np.int64, ndmin=2)
+    return {name: table[:, i] for i, name in enumerate(header)}
+
+
+def _compare(native: dict, exported: dict) -> list:
+    problems = []
+    if list(native) != list(exported):
+        problems.append(f"columns differ: {list(native)} vs {list(exported)}")
+    for name in native.keys() & exported.keys():
+        if not np.array_equal(native[name], exported[name]):
+            mismatches = np.flatnonzero(native[name] != exported[name])
+            problems.append(f"{name} differs in {len(mismatches)} rows, first at {mismatches[:1]}")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("files", nargs="+", help="FTDC files to read.")
+    parser.add_argument(
+        "--curator", default="build/curator/curator", help="Path to the curator binary."
+    )
+    args = parser.parse_args()
+
+    native_total = curator_total = 0.0
+    failed = False
+    for path in args.files:
+        start = time.perf_counter()
+        native = metrics.read_columns(path)
+        native_seconds = time.perf_counter() - start
+        native_total += native_seconds
+
+        start = time.perf_counter()
+        exported = _curator_columns(args.curator, path)
+        curator_seconds = time.perf_counter() - start
+        curator_total += curator_seconds
+
+        rows = len(next(iter(native.values()))) if native else 0
+        problems = _compare(native, exported)
+        failed = failed or bool(problems)
+        print(
+            f"{'MISMATCH' if problems else 'ok':8s} {rows:10d} rows "
+            f"{curator_seconds:8.3f}s curator  {native_seconds:8.3f}s native  {path}"
+        )
+        for problem in problems:
+            print(f"    {problem}")
+
+    print(f"curator export + loadtxt: {curator_total:8.3f}s")
+    print(f"genny.metrics:            {native_total:8.3f}s")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
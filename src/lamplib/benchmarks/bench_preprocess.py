@@ -0,0 +1,88 @@
+"""
+Compares per-workload preprocessing time of the in-memory pipeline in
+genny.tasks.preprocess against the previous implementation, which saved the
+merged OmegaConf config to a temporary file and re-parsed it.
+
+Run from the genny repo root:
+
+    PYTHONPATH=src/lamplib/src python3 src/lamplib/benchmarks/bench_preprocess.py
+"""
+import argparse
+import glob
+import io
+import os
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from omegaconf import OmegaConf
+
+from genny.tasks import preprocess
+
+
+def _legacy_preprocess(workload_path: str, default_uri: str, output_file):
+    """The temp-file round trip that preprocess.preprocess used to do."""
+    conf = OmegaConf.load(workload_path)
+    conf = OmegaConf.unsafe_merge(preprocess.DEFAULT_CONFIG, conf)
+    with tempfile.NamedTemporaryFile() as fp:
+        OmegaConf.save(config=conf, f=fp.name)
+        parser = preprocess._WorkloadParser()
+        raw_parsed = parser.parse(fp.name, path=Path(workload_path), default_uri=default_uri)
+        conf = OmegaConf.create(raw_parsed)
+    OmegaConf.save(config=conf, f=output_file)
+
+
+def _in_memory_preprocess(workload_path: str, default_uri: str, output_file):
+    preprocess.preprocess(
+        workload_path=workload_path, smoke=False, default_uri=default_uri, output_file=output_file
+    )
+
+
+def _time(func, workload_path: str, repeat: int) -> float:
+    """Return the median wall time in seconds of `repeat` runs of func."""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(workload_path, "mongodb://localhost:27017", io.StringIO())
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("-r", "--repeat", type=int, default=3, help="Runs per workload.")
+    parser.add_argument(
+        "-w", "--workloads", default="src/workloads", help="Directory of workloads to preprocess."
+    )
+    parser.add_argument("--per-file", action="store_true", help="Print timings for every file.")
+    args = parser.parse_args()
+
+    files = sorted(glob.glob(os.path.join(args.workloads, "**", "*.yml"), recursive=True))
+    before_total = after_total = 0.0
+    failed = []
+    for workload in files:
+        try:
+            before = _time(_legacy_preprocess, workload, args.repeat)
+            after = _time(_in_memory_preprocess, workload, args.repeat)
+        except Exception as e:
+            failed.append((workload, e))
+            continue
+        before_total += before
+        after_total += after
+        if args.per_file:
+            print(f"{before * 1000:9.2f}ms {after * 1000:9.2f}ms  {workload}")
+
+    n_ok = len(files) - len(failed)
+    print(f"Preprocessed {n_ok} of {len(files)} workloads, median of {args.repeat} runs each.")
+    if n_ok:
+        for label, total in [("temp-file round trip", before_total), ("in-memory", after_total)]:
+            print(f"  {label:21s} {total:8.3f}s ({total / n_ok * 1000:.2f}ms/file)")
+        print(f"  speedup:              {before_total / after_total:8.2f}x")
+    for workload, e in failed:
+        print(f"  FAILED {workload}: {e}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
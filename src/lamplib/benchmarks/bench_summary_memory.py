@@ -0,0 +1,111 @@
+"""
+Measures the peak memory and time test_result_summary.py needs to summarize an
+actor's .csv export, for exports of increasing length. Each size is summarized
+in a fresh process so peak resident memory can be read back from getrusage.
+
+With the blocked reader peak memory should stop growing once a run has more
+than --maxSamples readings per metric.
+
+Run from the genny repo root:
+
+    PYTHONPATH=src/lamplib/src python3 src/lamplib/benchmarks/bench_summary_memory.py \\
+        --rows 500000 2000000 8000000
+"""
+import argparse
+import contextlib
+import importlib.util
+import io
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from types import SimpleNamespace
+
+import numpy as np
+
+_SCRIPT = os.path.join(
+    os.path.dirname(__file__),
+    "..",
+    "..",
+    "workloads",
+    "contrib",
+    "analysis",
+    "test_result_summary.py",
+)
+
+
+def _write_csv(path: str, rows: int, block: int = 1000000) -> None:
+    rng = np.random.default_rng(0)
+    total_dur = 0
+    with open(path, "w") as f:
+        f.write("ts,counters.n,counters.ops,timers.dur,counters.errors\n")
+        for start in range(0, rows, block):
+            n = min(block, rows - start)
+            ops = np.arange(start + 1, start + n + 1)
+            dur = total_dur + np.cumsum(rng.integers(1000, 100000, n))
+            total_dur = int(dur[-1])
+            table = np.column_stack([1600000000000 + ops, ops, ops, dur, np.zeros(n, np.int64)])
+            np.savetxt(f, table, fmt="%d", delimiter=",")
+
+
+def _summarize(csv_path: str, max_samples: int, use_mmap: bool) -> None:
+    spec = importlib.util.spec_from_file_location("test_result_summary", _SCRIPT)
+    script = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(script)
+    args = SimpleNamespace(
+        verbose=False,
+        metrics=["throughput", "timers.dur", "errors"],
+        hideHistograms=True,
+        nHistogramBuckets=15,
+        maxSamples=max_samples,
+        blockMegabytes=4,
+        mmapCsv=use_mmap,
+    )
+    start = time.perf_counter()
+    with open(csv_path) as f, contextlib.redirect_stdout(io.StringIO()):
+        script.process_csv(args, "Actor", f)
+    elapsed = time.perf_counter() - start
+    peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(f"{elapsed:.2f} {peak_mb:.0f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--rows", type=int, nargs="+", default=[500000, 2000000, 8000000])
+    parser.add_argument("--maxSamples", type=int, default=1000000)
+    parser.add_argument("--mmapCsv", action="store_true")
+    parser.add_argument("--summarize", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.summarize:
+        _summarize(args.summarize, args.maxSamples, args.mmapCsv)
+        return
+
+    print(f"{'rows':>10} {'csv MB':>8} {'seconds':>8} {'peak MB':>8}")
+    with tempfile.TemporaryDirectory() as tmpdir:
+        for rows in args.rows:
+            csv_path = os.path.join(tmpdir, f"{rows}.csv")
+            _write_csv(csv_path, rows)
+            out = subprocess.run(
+                [
+                    sys.executable,
+                    __file__,
+                    "--summarize",
+                    csv_path,
+                    "--maxSamples",
+                    str(args.maxSamples),
+                ]
+                + (["--mmapCsv"] if args.mmapCsv else []),
+                check=True,
+                stdout=subprocess.PIPE,
+                universal_newlines=True,
+            ).stdout.split()
+            size_mb = os.path.getsize(csv_path) / (1024 * 1024)
+            print(f"{rows:>10} {size_mb:>8.0f} {float(out[0]):>8.2f} {float(out[1]):>8.0f}")
+            os.remove(csv_path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""
+Compares PyYAML's pure-python SafeLoader with the loader used by genny.yaml_io
+(libyaml's CSafeLoader when available) over every workload and phase file.
+
+Run from the genny repo root:
+
+    PYTHONPATH=src/lamplib/src python3 src/lamplib/benchmarks/bench_yaml_io.py
+"""
+import argparse
+import glob
+import os
+import statistics
+import time
+
+import yaml
+
+from genny import yaml_io
+
+
+def _time(load, text: str, repeat: int) -> float:
+    """Return the median wall time in seconds of `repeat` loads of text."""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        load(text)
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("-r", "--repeat", type=int, default=3, help="Loads per file.")
+    parser.add_argument("-n", "--slowest", type=int, default=10, help="Slowest files to list.")
+    args = parser.parse_args()
+
+    files = sorted(
+        glob.glob(os.path.join("src", "workloads", "**", "*.yml"), recursive=True)
+        + glob.glob(os.path.join("src", "phases", "**", "*.yml"), recursive=True)
+    )
+    timings = []
+    for path in files:
+        with open(path) as handle:
+            text = handle.read()
+        pure = _time(yaml.safe_load, text, args.repeat)
+        fast = _time(yaml_io.load, text, args.repeat)
+        timings.append((pure, fast, path))
+
+    pure_total = sum(t[0] for t in timings)
+    fast_total = sum(t[1] for t in timings)
+    print(f"Loaded {len(files)} files, median of {args.repeat} loads each.")
+    print(f"  libyaml available: {yaml_io.HAVE_LIBYAML}")
+    print(f"  yaml.safe_load:    {pure_total:8.3f}s")
+    print(f"  yaml_io.load:      {fast_total:8.3f}s")
+    print(f"  speedup:           {pure_total / fast_total:8.2f}x")
+    print(f"Slowest {args.slowest} files (yaml.safe_load / yaml_io.load):")
+    for pure, fast, path in sorted(timings, reverse=True)[: args.slowest]:
+        print(f"  {pure * 1000:9.2f}ms {fast * 1000:9.2f}ms  {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -175,7 +175,95 @@ def evaluate(
 
 
 @cli.command(
-    "export", help=("Export the given FTDC file to CSV."),
+    "evaluate-all",
+    help=(
+        "Evaluate every YAML workload file in a directory (or matching a glob) in parallel. "
+        "Outputs are written to a tree mirroring the inputs."
+    ),
+)
+@click.argument("workloads")
+@click.option(
+    "-u",
+    "--mongo-uri",
+    required=False,
+    default="mongodb://localhost:27017",
+    help=("Set a default mongo uri used by connection pools that don't have one configured."),
+)
+@click.option(
+    "-o",
+    "--output-dir",
+    required=False,
+    default=None,
+    help=(
+        "Directory the evaluated workloads are written to. "
+        "Defaults to build/WorkloadOutput/workload."
+    ),
+)
+@click.option(
+    "-v",
+    "--override",
+    required=False,
+    default=None,
+    help=("Filepath of an override file. Use this to override workload configs."),
+)
+@click.option(
+    "-s",
+    "--smoke",
+    is_flag=True,
+    help=(
+        "Convert each workload YAML into a version for smoke test where every phase"
+        " of every actor runs with Repeat: 1."
+    ),
+)
+@click.option(
+    "-j",
+    "--jobs",
+    required=False,
+    default=None,
+    type=int,
+    help=("Number of worker processes. Defaults to the number of CPUs."),
+)
+@click.option(
+    "--summary",
+    required=False,
+    default=None,
+    help=("Filepath where a JSON summary of per-workload timings and errors will be written."),
+)
+@click.pass_context
+def evaluate_all(
+    ctx: click.Context,
+    workloads: str,
+    mongo_uri: str,
+    output_dir: str,
+    override: str,
+    smoke: bool,
+    jobs: int,
+    summary: str,
+):
+    from genny.tasks import preprocess
+
+    if output_dir is None:
+        output_dir = os.path.join(ctx.obj["WORKSPACE_ROOT"], "build", "WorkloadOutput", "workload")
+
+    results = preprocess.evaluate_all(
+        workloads=workloads,
+        default_uri=mongo_uri,
+        smoke=smoke,
+        output_dir=output_dir,
+        override_file_path=override,
+        jobs=jobs,
+        summary_file=summary,
+    )
+    if any(result.error is not None for result in results):
+        sys.exit(1)
+
+
+@cli.command(
+    "export",
+    help=(
+        "Export the given FTDC file to CSV, or with --format npz export it (or every FTDC file "
+        "in the given directory) to a delta-encoded columnar .npz file that can be memory-mapped."
+    ),
 )
 @click.argument("ftdc_path")
 @click.option(
@@ -183,10 +271,34 @@ def evaluate(
     "--output",
     required=False,
     default=None,
-    help=("Filepath where the output CSV will be written. Will write to stdout by default."),
+    help=(
+        "Filepath where the output CSV will be written. Will write to stdout by default. "
+        "With --format npz, the output file or directory; defaults to next to the input."
+    ),
+)
+@click.option(
+    "-f",
+    "--format",
+    "output_format",
+    required=False,
+    default="csv",
+    type=click.Choice(["csv", "npz"]),
+    help=("Output format. Defaults to csv."),
+)
+@click.option(
+    "--compress",
+    is_flag=True,
+    help=("Deflate npz output. Smaller, but it can't be memory-mapped when read back."),
 )
 @click.pass_context
-def evaluate(ctx: click.Context, ftdc_path: str, output):
+def export(ctx: click.Context, ftdc_path: str, output, output_format: str, compress: bool):
+    if output_format == "npz":
+        from genny.metrics import columnar
+
+        for path, rows in columnar.export_path(ftdc_path, output, compress=compress).items():
+            SLOG.info("Exported metrics.", output=path, rows=rows)
+        return
+
     from genny.curator import export
 
     export(
@@ -220,6 +332,65 @@ def translate(ctx: click.Context, ftdc_path: str, output):
     )
 
 
+@cli.command(
+    "compare",
+    help=(
+        "Compare the throughput and latency of every actor between two runs' CedarMetrics "
+        "directories. CANDIDATE defaults to build/WorkloadOutput/CedarMetrics. Without a "
+        "BASELINE each actor is compared to the most recent earlier run of it that was moved "
+        "aside. Exits 1 if any actor regressed significantly."
+    ),
+)
+@click.argument("baseline", required=False, default=None)
+@click.argument("candidate", required=False, default=None)
+@click.option(
+    "-t",
+    "--threshold",
+    required=False,
+    default=0.05,
+    type=float,
+    help=("Smallest relative change that counts as a regression. Defaults to 0.05 (5%)."),
+)
+@click.option(
+    "-c",
+    "--confidence",
+    required=False,
+    default=0.95,
+    type=float,
+    help=("Confidence level for the intervals and significance tests. Defaults to 0.95."),
+)
+@click.option(
+    "--summary",
+    required=False,
+    default=None,
+    help=("Filepath where a JSON list of every compared statistic will be written."),
+)
+@click.pass_context
+def compare(
+    ctx: click.Context,
+    baseline: Optional[str],
+    candidate: Optional[str],
+    threshold: float,
+    confidence: float,
+    summary: Optional[str],
+):
+    from genny.tasks import compare
+
+    if candidate is None:
+        candidate = os.path.join(
+            ctx.obj["WORKSPACE_ROOT"], "build", "WorkloadOutput", "CedarMetrics"
+        )
+    results = compare.compare(
+        baseline_dir=baseline,
+        candidate_dir=candidate,
+        threshold=threshold,
+        confidence=confidence,
+        summary_file=summary,
+    )
+    if any(result.regression for result in results):
+        sys.exit(1)
+
+
 @cli.command(
     name="clean", help="Resets output and venv directories to clean checkout state.",
 )
@@ -396,6 +567,58 @@ def canaries(ctx: click.Context, canary_args: List[str]):
     )
 
 
+@cli.group(
+    name="poplar",
+    help=(
+        "Manage a long-lived Poplar daemon for this workspace. While it is running, "
+        "workload, canaries and test runs reuse it instead of starting their own, and "
+        "each workload's metrics go to build/WorkloadOutput/CedarMetrics/<workload name>."
+    ),
+)
+def poplar():
+    pass
+
+
+@poplar.command(name="start", help="Start the Poplar daemon if it isn't already running.")
+@click.option(
+    "--timeout",
+    required=False,
+    default=30.0,
+    type=float,
+    help=("Seconds to wait for Poplar to start accepting connections."),
+)
+@click.pass_context
+def poplar_start(ctx: click.Context, timeout: float):
+    from genny.curator import PoplarDaemon
+
+    PoplarDaemon(
+        workspace_root=ctx.obj["WORKSPACE_ROOT"], genny_repo_root=ctx.obj["GENNY_REPO_ROOT"]
+    ).start(startup_timeout=timeout)
+
+
+@poplar.command(name="stop", help="Stop the Poplar daemon.")
+@click.pass_context
+def poplar_stop(ctx: click.Context):
+    from genny.curator import PoplarDaemon
+
+    PoplarDaemon(workspace_root=ctx.obj["WORKSPACE_ROOT"]).stop()
+
+
+@poplar.command(
+    name="status", help="Report whether the Poplar daemon is running. Exits 1 if it isn't."
+)
+@click.pass_context
+def poplar_status(ctx: click.Context):
+    from genny.curator import PoplarDaemon
+
+    daemon = PoplarDaemon(workspace_root=ctx.obj["WORKSPACE_ROOT"])
+    pid = daemon.pid()
+    if pid is None:
+        SLOG.info("Poplar daemon is not running.")
+        sys.exit(1)
+    SLOG.info("Poplar daemon is running.", pid=pid, log_file=daemon.log_file)
+
+
 # noinspection PyArgumentEqualDefault
 @cli.command(
     name="resmoke-test",
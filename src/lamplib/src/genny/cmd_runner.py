@@ -1,10 +1,13 @@
+import asyncio
 import subprocess
 import os
 import shlex
+import threading
+from collections import deque
 from uuid import uuid4
 
 import structlog
-from typing import List, NamedTuple
+from typing import Callable, List, NamedTuple, Optional
 
 SLOG = structlog.get_logger(__name__)
 
@@ -15,6 +18,34 @@ class RunCommandOutput(NamedTuple):
     stderr: List[str]
 
 
+def _start(cmd: List[str], cwd: str, env: Optional[dict]):
+    """Validate the arguments common to run_command and run_command_async."""
+    env = os.environ.copy() if env is None else env
+
+    uuid = str(uuid4())[:8]
+    SLOG.debug("Running command", uuid=uuid, cwd=cwd, command=" ".join(shlex.quote(x) for x in cmd))
+
+    if not os.path.exists(cwd):
+        raise Exception(f"Cannot run in {cwd} from cwd={os.getcwd()}")
+    return env, uuid
+
+
+def _log_error(uuid: str, cmd: List[str], env: dict, cwd: str, e: subprocess.CalledProcessError):
+    SLOG.error(
+        "Error in command",
+        uuid=uuid,
+        cmd=cmd,
+        env=env,
+        cwd=cwd,
+        returncode=e.returncode,
+        output=e.output,
+    )
+
+
+def _split(output: Optional[str], capture: bool) -> List[str]:
+    return [] if not capture else output.strip().split("\n")
+
+
 def run_command(
     cmd: List[str],
     check: bool,
@@ -22,21 +53,31 @@ def run_command(
     shell: bool = False,
     env: dict = None,
     capture: bool = True,
+    on_output: Optional[Callable[[str, str], None]] = None,
+    max_lines: Optional[int] = None,
 ) -> RunCommandOutput:
-    env = os.environ.copy() if env is None else env
+    """
+    Run cmd in cwd. The process cwd is left alone so this is safe to call from
+    several threads at once.
 
-    uuid = str(uuid4())[:8]
-    SLOG.debug("Running command", uuid=uuid, cwd=cwd, command=" ".join(shlex.quote(x) for x in cmd))
+    By default captured output is buffered in full. Passing on_output or max_lines
+    streams it line by line instead, logging each line with the command's uuid:
 
-    success = False
+    :param on_output: called with "stdout" or "stderr" and each line (without the
+                      trailing newline) as it is produced. Implies capture.
+    :param max_lines: keep only the last max_lines lines of each stream in the
+                      result and in CalledProcessError, so memory use stays bounded
+                      however much the command prints. None keeps everything.
+    """
+    env, uuid = _start(cmd, cwd, env)
+    if on_output is not None or max_lines is not None:
+        return _run_streaming(cmd, check, cwd, shell, env, uuid, on_output, max_lines)
 
-    old_cwd = os.getcwd()
+    success = False
     try:
-        if not os.path.exists(cwd):
-            raise Exception(f"Cannot chdir to {cwd} from cwd={os.getcwd()}")
-        os.chdir(cwd)
         result: subprocess.CompletedProcess = subprocess.run(
             cmd,
+            cwd=cwd,
             env=env,
             shell=shell,
             check=check,
@@ -47,21 +88,121 @@ def run_command(
         success = result.returncode == 0
         return RunCommandOutput(
             returncode=result.returncode,
-            stdout=[] if not capture else result.stdout.strip().split("\n"),
-            stderr=[] if not capture else result.stderr.strip().split("\n"),
+            stdout=_split(result.stdout, capture),
+            stderr=_split(result.stderr, capture),
         )
 
     except subprocess.CalledProcessError as e:
-        SLOG.error(
-            "Error in command",
-            uuid=uuid,
-            cmd=cmd,
-            env=env,
+        _log_error(uuid, cmd, env, cwd, e)
+        raise e
+    finally:
+        SLOG.debug("Finished command", uuid=uuid, success=success)
+
+
+def _run_streaming(
+    cmd: List[str],
+    check: bool,
+    cwd: str,
+    shell: bool,
+    env: dict,
+    uuid: str,
+    on_output: Optional[Callable[[str, str], None]],
+    max_lines: Optional[int],
+) -> RunCommandOutput:
+    retained = {"stdout": deque(maxlen=max_lines), "stderr": deque(maxlen=max_lines)}
+    # Serializes on_output so callers don't have to make it thread-safe.
+    lock = threading.Lock()
+    callback_errors = []
+
+    def drain(name: str, pipe) -> None:
+        for line in pipe:
+            line = line.rstrip("\n")
+            retained[name].append(line)
+            SLOG.debug("Command output", uuid=uuid, stream=name, line=line)
+            if on_output is not None and not callback_errors:
+                with lock:
+                    try:
+                        on_output(name, line)
+                    except Exception as e:
+                        # Keep draining so the command can't block on a full pipe.
+                        callback_errors.append(e)
+        pipe.close()
+
+    success = False
+    try:
+        with subprocess.Popen(
+            cmd,
             cwd=cwd,
-            returncode=e.returncode,
-            output=e.output,
+            env=env,
+            shell=shell,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            text=True,
+            bufsize=1,
+        ) as process:
+            readers = [
+                threading.Thread(target=drain, args=(name, getattr(process, name)), daemon=True)
+                for name in retained
+            ]
+            for reader in readers:
+                reader.start()
+            for reader in readers:
+                reader.join()
+            returncode = process.wait()
+
+        if callback_errors:
+            raise callback_errors[0]
+        stdout, stderr = "\n".join(retained["stdout"]), "\n".join(retained["stderr"])
+        if check and returncode != 0:
+            raise subprocess.CalledProcessError(returncode, cmd, stdout, stderr)
+        # Split the same way as buffered output, e.g. [""] for a command that printed nothing.
+        stdout, stderr = _split(stdout, True), _split(stderr, True)
+        success = returncode == 0
+        return RunCommandOutput(returncode=returncode, stdout=stdout, stderr=stderr)
+
+    except subprocess.CalledProcessError as e:
+        _log_error(uuid, cmd, env, cwd, e)
+        raise e
+    finally:
+        SLOG.debug("Finished command", uuid=uuid, success=success)
+
+
+async def run_command_async(
+    cmd: List[str],
+    check: bool,
+    cwd: str,
+    shell: bool = False,
+    env: dict = None,
+    capture: bool = True,
+) -> RunCommandOutput:
+    """
+    asyncio counterpart of run_command with the same arguments and result, so
+    independent commands can be awaited together with asyncio.gather.
+    """
+    env, uuid = _start(cmd, cwd, env)
+    success = False
+    pipe = asyncio.subprocess.PIPE if capture else None
+    try:
+        # Same as subprocess.run: with shell=True the first element is the command
+        # line and the rest are arguments to the shell itself.
+        args = ["/bin/sh", "-c", *cmd] if shell else cmd
+        process = await asyncio.create_subprocess_exec(
+            *args, cwd=cwd, env=env, stdout=pipe, stderr=pipe
+        )
+        stdout, stderr = await process.communicate()
+        if capture:
+            stdout, stderr = stdout.decode(), stderr.decode()
+        if check and process.returncode != 0:
+            raise subprocess.CalledProcessError(process.returncode, cmd, stdout, stderr)
+        success = process.returncode == 0
+        return RunCommandOutput(
+            returncode=process.returncode,
+            stdout=_split(stdout, capture),
+            stderr=_split(stderr, capture),
         )
+
+    except subprocess.CalledProcessError as e:
+        _log_error(uuid, cmd, env, cwd, e)
         raise e
     finally:
         SLOG.debug("Finished command", uuid=uuid, success=success)
-        os.chdir(old_cwd)
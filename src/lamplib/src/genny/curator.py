@@ -1,10 +1,14 @@
+import fcntl
 import os
+import re
 import shutil
+import signal
+import socket
 import subprocess
 import datetime
 import time
 from uuid import uuid4
-from typing import Optional
+from typing import Iterator, List, Optional
 
 import structlog
 from contextlib import contextmanager
@@ -88,23 +92,91 @@ _DATE_FORMAT = "%Y-%m-%dT%H%M%SZ"
 _METRICS_PATH = "build/WorkloadOutput/CedarMetrics"
 
 
-def _cleanup_metrics():
-    if not os.path.exists(_METRICS_PATH):
-        return
+def _moved_metrics_path(metrics_path: str) -> str:
     uuid = str(uuid4())[:8]
     ts = datetime.datetime.utcnow().strftime(_DATE_FORMAT)
-    dest = f"{_METRICS_PATH}-{ts}-{uuid}"
-    shutil.move(_METRICS_PATH, dest)
+    return f"{metrics_path}-{ts}-{uuid}"
+
+
+def _cleanup_metrics(metrics_path: str = _METRICS_PATH):
+    if not os.path.exists(metrics_path):
+        return
+    dest = _moved_metrics_path(metrics_path)
+    shutil.move(metrics_path, dest)
     SLOG.info(
         "Moved existing metrics (presumably from a prior run).",
-        existing=_METRICS_PATH,
+        existing=metrics_path,
         moved_to=dest,
         cwd=os.getcwd(),
     )
 
 
-def _create_metrics():
-    os.makedirs(_METRICS_PATH, exist_ok=True)
+def _cleanup_run_metrics(metrics_path: str, run_name: Optional[str]):
+    """
+    Like _cleanup_metrics, but for a shared daemon that may be writing other runs'
+    metrics into metrics_path: only the run_name subdirectory is moved, to
+    f"{metrics_path}-{time}-{uuid}/{run_name}". Without a run_name only the files
+    directly in metrics_path are moved, to f"{metrics_path}-{time}-{uuid}/".
+
+    Either way earlier runs end up outside metrics_path where previous_metrics finds them.
+    """
+    if run_name is not None:
+        entries = [run_name] if os.path.exists(os.path.join(metrics_path, run_name)) else []
+    elif os.path.isdir(metrics_path):
+        entries = [
+            entry
+            for entry in sorted(os.listdir(metrics_path))
+            if os.path.isfile(os.path.join(metrics_path, entry))
+        ]
+    else:
+        entries = []
+    if not entries:
+        return
+    dest = _moved_metrics_path(metrics_path)
+    os.makedirs(dest)
+    for entry in entries:
+        shutil.move(os.path.join(metrics_path, entry), os.path.join(dest, entry))
+    SLOG.info(
+        "Moved existing metrics (presumably from a prior run).",
+        existing=metrics_path,
+        run_name=run_name,
+        moved_to=dest,
+    )
+
+
+def previous_metrics(metrics_path: str = _METRICS_PATH) -> List[str]:
+    """
+    Directories the metrics of earlier runs were moved to, newest first.
+
+    For build/WorkloadOutput/CedarMetrics these are its siblings CedarMetrics-{time}-{uuid};
+    for a shared daemon's CedarMetrics/MyWorkload they are CedarMetrics-{time}-{uuid}/MyWorkload.
+    """
+    parent, name = os.path.split(os.path.abspath(metrics_path))
+    grandparent, parent_name = os.path.split(parent)
+    candidates = []
+    if os.path.isdir(parent):
+        candidates += [(name, entry, os.path.join(parent, entry)) for entry in os.listdir(parent)]
+    if os.path.isdir(grandparent):
+        candidates += [
+            (parent_name, entry, os.path.join(grandparent, entry, name))
+            for entry in os.listdir(grandparent)
+        ]
+
+    found = []
+    for moved_name, entry, moved_path in candidates:
+        match = re.fullmatch(re.escape(moved_name) + r"-(.+)-[0-9a-f]{8}", entry)
+        if match is None or not os.path.isdir(moved_path):
+            continue
+        try:
+            moved_at = datetime.datetime.strptime(match.group(1), _DATE_FORMAT)
+        except ValueError:
+            continue
+        found.append((moved_at, moved_path))
+    return [path for _, path in sorted(found, reverse=True)]
+
+
+def _create_metrics(metrics_path: str = _METRICS_PATH):
+    os.makedirs(metrics_path, exist_ok=True)
 
 
 def export(workspace_root: str, genny_repo_root: str, input_path: str, output_path: str = None):
@@ -127,38 +199,296 @@ def translate(workspace_root: str, genny_repo_root: str, input_path: str, output
     subprocess.run(args, check=True)
 
 
-@contextmanager
-def poplar_grpc(cleanup_metrics: bool, workspace_root: str, genny_repo_root: str):
-    args = _get_poplar_args(workspace_root=workspace_root, genny_repo_root=genny_repo_root)
+# Where genny's metrics collector (src/metrics/include/metrics/v2/event.hpp) sends events.
+_POPLAR_HOST = "localhost"
+_POPLAR_PORT = 2288
 
-    if cleanup_metrics:
-        _cleanup_metrics()
-    _create_metrics()
-    SLOG.info("Starting poplar grpc in the background.", command=args, cwd=workspace_root)
 
-    prior_cwd = os.getcwd()
+def _check_port_free(host: str = _POPLAR_HOST, port: int = _POPLAR_PORT) -> None:
+    """
+    Make sure nothing is listening on Poplar's port yet, e.g. a Poplar left over from a
+    crashed run. Otherwise the new Poplar would fail to bind while the old one made it look
+    ready.
+
+    :raises OSError: if something accepts connections on the port
+    """
     try:
-        os.chdir(workspace_root)
-        poplar = subprocess.Popen(args)
+        with socket.create_connection((host, port), timeout=0.2):
+            pass
+    except OSError:
+        return
+    raise OSError(
+        f"Something is already listening on {host}:{port}, probably a Poplar left over from "
+        f"an earlier run. Stop it before starting another."
+    )
+
+
+def _wait_for_poplar(
+    poplar: subprocess.Popen,
+    host: str = _POPLAR_HOST,
+    port: int = _POPLAR_PORT,
+    timeout: float = 30,
+    max_backoff: float = 0.2,
+) -> float:
+    """
+    Wait until Poplar accepts connections on its gRPC port. Call _check_port_free before
+    starting it, so the connections can't be accepted by some other process.
+
+    Polls with exponential backoff starting at 5ms and capped at max_backoff.
+
+    :return: seconds it took for Poplar to become ready
+    :raises OSError: if Poplar exits or isn't ready within timeout seconds
+    """
+    start = time.monotonic()
+    backoff = 0.005
+    while True:
         if poplar.poll() is not None:
-            raise OSError("Failed to start Poplar.")
+            raise OSError(f"Poplar exited with code {poplar.returncode} before it was ready.")
         try:
-            os.chdir(prior_cwd)
-            time.sleep(0.5)  # sleep to let curator get started. This is a heuristic.
-            yield poplar
-        finally:
+            with socket.create_connection((host, port), timeout=max_backoff):
+                pass
+        except OSError:
+            pass
+        else:
+            # Still the one listening, rather than having exited since.
+            if poplar.poll() is None:
+                return time.monotonic() - start
+            continue
+        elapsed = time.monotonic() - start
+        if elapsed >= timeout:
+            raise OSError(
+                f"Poplar did not start listening on {host}:{port} within {timeout} seconds."
+            )
+        time.sleep(min(backoff, timeout - elapsed))
+        backoff = min(backoff * 2, max_backoff)
+
+
+def _process_exists(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        # Someone else's process.
+        return True
+    try:
+        # Reap it if it's an exited child of ours, e.g. started and stopped by
+        # the same process.
+        if os.waitpid(pid, os.WNOHANG)[0] == pid:
+            return False
+    except ChildProcessError:
+        pass
+    return True
+
+
+def _is_poplar(pid: int) -> bool:
+    """Whether pid runs `curator poplar ...`, as started from _get_poplar_args."""
+    if os.path.isdir("/proc/self"):
+        try:
+            with open(f"/proc/{pid}/cmdline", "rb") as f:
+                args = f.read().decode(errors="replace").split("\0")
+        except OSError:
+            return False
+    else:
+        # No procfs, e.g. on macOS.
+        ps = subprocess.run(
+            ["ps", "-o", "command=", "-p", str(pid)], stdout=subprocess.PIPE, encoding="utf-8"
+        )
+        args = ps.stdout.split()
+    return "poplar" in args[1:]
+
+
+class PoplarDaemon:
+    """
+    A long-lived Poplar process shared by every run in a workspace.
+
+    Started and stopped with `run-genny poplar start/stop`. Its state lives in
+    build/poplar under the workspace: a pidfile, a lockfile that serializes
+    start/stop, and Poplar's log.
+    """
+
+    port = _POPLAR_PORT
+
+    def __init__(self, workspace_root: str, genny_repo_root: Optional[str] = None):
+        self.workspace_root = workspace_root
+        self.genny_repo_root = genny_repo_root
+        state_dir = os.path.join(workspace_root, "build", "poplar")
+        self.pid_file = os.path.join(state_dir, "poplar.pid")
+        self.lock_file = os.path.join(state_dir, "poplar.lock")
+        self.log_file = os.path.join(state_dir, "poplar.log")
+
+    def pid(self) -> Optional[int]:
+        """
+        The pid of the running daemon, or None if it isn't running.
+
+        The pidfile can outlive the daemon, e.g. after a reboot, and its pid be reused by
+        an unrelated process. Unless that pid is a Poplar and something listens on the
+        port, the pidfile is removed and the daemon treated as down.
+        """
+        pid = self._read_pid()
+        if pid is None:
+            return None
+        if _process_exists(pid) and _is_poplar(pid) and self._listening():
+            return pid
+        SLOG.info("Removing stale poplar pidfile.", pid=pid, pid_file=self.pid_file)
+        self._remove_pid_file(pid)
+        return None
+
+    def start(self, startup_timeout: float = 30) -> int:
+        """
+        Start the daemon unless it's already running.
+
+        :return: its pid
+        """
+        with self._locked():
+            pid = self.pid()
+            if pid is not None:
+                SLOG.info("Poplar daemon is already running.", pid=pid)
+                return pid
+
+            args = _get_poplar_args(
+                workspace_root=self.workspace_root, genny_repo_root=self.genny_repo_root
+            )
+            _check_port_free(port=self.port)
+            SLOG.info("Starting poplar daemon.", command=args, log_file=self.log_file)
+            with open(self.log_file, "a") as log:
+                # A new session so the daemon outlives this process and its terminal.
+                poplar = subprocess.Popen(
+                    args,
+                    cwd=self.workspace_root,
+                    stdin=subprocess.DEVNULL,
+                    stdout=log,
+                    stderr=subprocess.STDOUT,
+                    start_new_session=True,
+                )
             try:
-                poplar.terminate()
-                exit_code = poplar.wait(timeout=10)
-                if exit_code not in (0, -15):  # Termination or exit.
-                    raise OSError(f"Poplar exited with code: {exit_code}.")
+                startup_seconds = _wait_for_poplar(poplar, port=self.port, timeout=startup_timeout)
             except:
-                # If Poplar doesn't die then future runs can be broken.
                 if poplar.poll() is None:
                     poplar.kill()
                 raise
+            with open(self.pid_file, "w") as f:
+                f.write(str(poplar.pid))
+            SLOG.info(
+                "Poplar daemon is ready.", pid=poplar.pid, startup_seconds=round(startup_seconds, 3)
+            )
+            return poplar.pid
+
+    def stop(self, timeout: float = 10) -> bool:
+        """
+        Stop the daemon if it's running, killing it if it doesn't terminate in time.
+
+        :return: whether it was running
+        """
+        with self._locked():
+            pid = self.pid()
+            if pid is None:
+                SLOG.info("Poplar daemon is not running.")
+                self._remove_pid_file()
+                return False
+
+            os.kill(pid, signal.SIGTERM)
+            deadline = time.monotonic() + timeout
+            while _process_exists(pid) and time.monotonic() < deadline:
+                time.sleep(0.05)
+            if _process_exists(pid):
+                SLOG.warning("Poplar daemon did not terminate, killing it.", pid=pid)
+                os.kill(pid, signal.SIGKILL)
+            self._remove_pid_file()
+            SLOG.info("Stopped poplar daemon.", pid=pid)
+            return True
+
+    def _read_pid(self) -> Optional[int]:
+        try:
+            with open(self.pid_file) as f:
+                return int(f.read().strip())
+        except (OSError, ValueError):
+            return None
+
+    def _remove_pid_file(self, pid: Optional[int] = None) -> None:
+        """Remove the pidfile, unless pid is given and the file has since been rewritten."""
+        if pid is not None and self._read_pid() != pid:
+            return
+        if os.path.exists(self.pid_file):
+            os.remove(self.pid_file)
+
+    def _listening(self) -> bool:
+        try:
+            with socket.create_connection((_POPLAR_HOST, self.port), timeout=0.2):
+                return True
+        except OSError:
+            return False
+
+    @contextmanager
+    def _locked(self) -> Iterator[None]:
+        os.makedirs(os.path.dirname(self.lock_file), exist_ok=True)
+        with open(self.lock_file, "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+@contextmanager
+def poplar_grpc(
+    cleanup_metrics: bool,
+    workspace_root: str,
+    genny_repo_root: str,
+    startup_timeout: float = 30,
+    run_name: Optional[str] = None,
+) -> Iterator[Optional[str]]:
+    """
+    Make sure Poplar is running for the duration of the context.
+
+    If a PoplarDaemon is running in workspace_root it's reused. Otherwise a Poplar
+    process is started and torn down for just this context.
+
+    :param run_name: with a shared daemon, metrics of this run go to a subdirectory
+                     of build/WorkloadOutput/CedarMetrics with this name, so that
+                     cleanup_metrics only moves that subdirectory aside. Runs without
+                     a name keep writing to CedarMetrics itself, and only the files
+                     directly in it are moved aside.
+    :return: the directory the caller should point the run's metrics at, or None to
+             use the default.
+    """
+    daemon_pid = PoplarDaemon(workspace_root).pid()
+    if daemon_pid is not None:
+        # Never move the whole of CedarMetrics aside while the daemon may be writing
+        # other runs' metrics into it.
+        root = os.path.join(workspace_root, _METRICS_PATH)
+        if cleanup_metrics:
+            _cleanup_run_metrics(root, run_name)
+        metrics_path = root if run_name is None else os.path.join(root, run_name)
+        _create_metrics(metrics_path)
+        SLOG.info("Using shared poplar daemon.", pid=daemon_pid, metrics_path=metrics_path)
+        yield None if run_name is None else metrics_path
+        return
+
+    args = _get_poplar_args(workspace_root=workspace_root, genny_repo_root=genny_repo_root)
+
+    _check_port_free()
+    if cleanup_metrics:
+        _cleanup_metrics()
+    _create_metrics()
+    SLOG.info("Starting poplar grpc in the background.", command=args, cwd=workspace_root)
+
+    poplar = subprocess.Popen(args, cwd=workspace_root)
+    try:
+        startup_seconds = _wait_for_poplar(poplar, timeout=startup_timeout)
+        SLOG.info("Poplar is ready.", startup_seconds=round(startup_seconds, 3))
+        yield None
     finally:
-        os.chdir(prior_cwd)
+        try:
+            poplar.terminate()
+            exit_code = poplar.wait(timeout=10)
+            if exit_code not in (0, -15):  # Termination or exit.
+                raise OSError(f"Poplar exited with code: {exit_code}.")
+        except:
+            # If Poplar doesn't die then future runs can be broken.
+            if poplar.poll() is None:
+                poplar.kill()
+            raise
 
 
 # For now we put curator in ./src/genny/build/curator, but ideally it would be in ./bin
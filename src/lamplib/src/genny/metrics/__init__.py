@@ -0,0 +1,34 @@
+"""
+Reading and analysing the metrics genny writes to build/WorkloadOutput/CedarMetrics.
+"""
+
+from genny.metrics.ftdc import (
+    Chunk,
+    FTDCError,
+    decode_chunk,
+    read_chunks,
+    read_columns,
+    read_metadata,
+    write_csv,
+)
+from genny.metrics.sketch import PERCENTILES, QuantileSketch
+from genny.metrics.timeline import (
+    PHASE_RECORDER_FILE,
+    Phase,
+    phase_markers,
+    phase_summary,
+    phases_from_columns,
+    sparkline,
+    window_rows,
+    windows,
+)
+from genny.metrics.compare import MetricDelta, compare_actor, mann_whitney_u
+from genny.metrics.columnar import (
+    ColumnarFile,
+    encode_table,
+    export_ftdc,
+    read_columnar,
+    read_metrics,
+    read_table,
+    write_columnar,
+)
@@ -0,0 +1,276 @@
+"""
+Compact columnar copies of FTDC files, for reloading metrics without decoding or
+exporting them again.
+
+The format is an .npz archive numpy can open: a metadata.json member describing
+the file, then one int64 .npy member per metric holding its first value followed
+by the difference between each pair of consecutive samples. Cumulative counters
+and timestamps then turn into small, repetitive numbers.
+
+By default members are stored uncompressed so read_columnar can memory-map them
+and only touch the columns it's asked for. With compress=True they are deflated
+instead, which is smaller for archiving but has to be read in full.
+
+Tables of other values, e.g. records polled from a service, can be stored the same
+way: encode_table turns them into int64 columns and the metadata read_table needs to
+turn them back.
+"""
+import datetime
+import json
+import math
+import os
+import struct
+import zipfile
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from genny.metrics import ftdc
+
+FORMAT = "genny-columnar"
+VERSION = 1
+_METADATA_MEMBER = "metadata.json"
+_LOCAL_HEADER = struct.Struct("<4s2B4HL2L2H")
+
+# encode_table stores fractional values as integer multiples of 1 / FLOAT_SCALE.
+FLOAT_SCALE = 1000000
+
+
+def _delta_encode(column: np.ndarray) -> np.ndarray:
+    # Differences wrap around in int64 the same way the FTDC encoder's do.
+    out = np.empty(len(column), dtype=np.int64)
+    if len(column):
+        out[0] = column[0]
+        np.subtract(column[1:], column[:-1], out=out[1:])
+    return out
+
+
+def _delta_decode(deltas: np.ndarray) -> np.ndarray:
+    return np.cumsum(deltas, dtype=np.int64)
+
+
+def _json_default(value):
+    if isinstance(value, datetime.datetime):
+        return value.isoformat()
+    if isinstance(value, bytes):
+        return value.hex()
+    return str(value)
+
+
+def write_columnar(
+    columns: Dict[str, np.ndarray], out_path: str, metadata: Optional[dict] = None, compress=False
+) -> None:
+    """
+    Write int64 columns of equal length to out_path.
+
+    :param metadata: extra information to store in the metadata header
+    :param compress: deflate the columns rather than storing them memory-mappable
+    """
+    lengths = {len(column) for column in columns.values()}
+    if len(lengths) > 1:
+        raise ValueError("Columns have different lengths.")
+    header = {
+        "format": FORMAT,
+        "version": VERSION,
+        "rows": lengths.pop() if lengths else 0,
+        "encoding": "delta",
+        "columns": list(columns),
+        **(metadata or {}),
+    }
+
+    compression = zipfile.ZIP_DEFLATED if compress else zipfile.ZIP_STORED
+    tmp_path = out_path + ".tmp"
+    with zipfile.ZipFile(tmp_path, "w", compression=compression, allowZip64=True) as archive:
+        archive.writestr(_METADATA_MEMBER, json.dumps(header, default=_json_default, indent=2))
+        for name, column in columns.items():
+            with archive.open(name + ".npy", "w", force_zip64=True) as member:
+                np.lib.format.write_array(
+                    member, _delta_encode(np.asarray(column, dtype=np.int64)), allow_pickle=False
+                )
+    os.replace(tmp_path, out_path)
+
+
+def export_ftdc(ftdc_path: str, out_path: str, compress=False) -> int:
+    """
+    Write the metrics of the FTDC file at ftdc_path to a columnar file.
+
+    :return: number of rows written
+    """
+    columns = ftdc.read_columns(ftdc_path)
+    write_columnar(
+        columns,
+        out_path,
+        metadata={
+            "source": os.path.basename(ftdc_path),
+            "ftdc_metadata": ftdc.read_metadata(ftdc_path),
+        },
+        compress=compress,
+    )
+    return len(next(iter(columns.values()))) if columns else 0
+
+
+def export_path(
+    input_path: str, output_path: Optional[str] = None, compress=False
+) -> Dict[str, int]:
+    """
+    Export an FTDC file, or every FTDC file in a directory tree, with export_ftdc.
+
+    :param output_path: output file, or directory for a directory of inputs. Defaults
+                        to writing <name>.npz next to each input.
+    :return: number of rows written to each output file
+    """
+    if os.path.isdir(input_path):
+        inputs = sorted(
+            os.path.join(dirpath, filename)
+            for dirpath, _, filenames in os.walk(input_path)
+            for filename in filenames
+            if filename.endswith(".ftdc")
+        )
+        base = output_path or input_path
+        outputs = [
+            os.path.join(base, os.path.relpath(path, input_path)[: -len(".ftdc")] + ".npz")
+            for path in inputs
+        ]
+    else:
+        inputs = [input_path]
+        outputs = [output_path or os.path.splitext(input_path)[0] + ".npz"]
+
+    written = {}
+    for path, out_path in zip(inputs, outputs):
+        os.makedirs(os.path.dirname(os.path.abspath(out_path)), exist_ok=True)
+        written[out_path] = export_ftdc(path, out_path, compress=compress)
+    return written
+
+
+class ColumnarFile:
+    """A columnar file opened for reading. Columns are decoded when asked for."""
+
+    def __init__(self, path: str):
+        self.path = path
+        with zipfile.ZipFile(path) as archive:
+            self.metadata = json.loads(archive.read(_METADATA_MEMBER))
+            self._members = {info.filename: info for info in archive.infolist()}
+        if self.metadata.get("format") != FORMAT:
+            raise ftdc.FTDCError(f"{path} is not a {FORMAT} file.")
+        if self.metadata.get("version") != VERSION:
+            raise ftdc.FTDCError(
+                f"{path} is version {self.metadata.get('version')}; expected {VERSION}."
+            )
+
+    @property
+    def names(self) -> List[str]:
+        return self.metadata["columns"]
+
+    @property
+    def rows(self) -> int:
+        return self.metadata["rows"]
+
+    def deltas(self, name: str) -> np.ndarray:
+        """The stored deltas of a column, memory-mapped if it isn't compressed."""
+        info = self._members[name + ".npy"]
+        if info.compress_type != zipfile.ZIP_STORED:
+            with zipfile.ZipFile(self.path) as archive, archive.open(info) as member:
+                return np.lib.format.read_array(member, allow_pickle=False)
+
+        with open(self.path, "rb") as f:
+            f.seek(info.header_offset)
+            local = _LOCAL_HEADER.unpack(f.read(_LOCAL_HEADER.size))
+            name_length, extra_length = local[-2], local[-1]
+            f.seek(info.header_offset + _LOCAL_HEADER.size + name_length + extra_length)
+            if np.lib.format.read_magic(f) == (1, 0):
+                shape, _, dtype = np.lib.format.read_array_header_1_0(f)
+            else:
+                shape, _, dtype = np.lib.format.read_array_header_2_0(f)
+            offset = f.tell()
+        if shape[0] == 0:
+            return np.zeros(0, dtype=dtype)
+        return np.memmap(self.path, dtype=dtype, mode="r", offset=offset, shape=shape)
+
+    def __getitem__(self, name: str) -> np.ndarray:
+        if name not in self.names:
+            raise KeyError(name)
+        return _delta_decode(self.deltas(name))
+
+    def columns(self, names: Optional[Iterable[str]] = None) -> Dict[str, np.ndarray]:
+        wanted = None if names is None else set(names)
+        return {name: self[name] for name in self.names if wanted is None or name in wanted}
+
+
+def read_columnar(path: str, names: Optional[Iterable[str]] = None) -> Dict[str, np.ndarray]:
+    """Like read_columns, but for a file written by export_ftdc or write_columnar."""
+    return ColumnarFile(path).columns(names)
+
+
+def read_metrics(path: str, names: Optional[Iterable[str]] = None) -> Dict[str, np.ndarray]:
+    """read_columnar for .npz files and read_columns for anything else."""
+    if path.endswith(".npz"):
+        return read_columnar(path, names)
+    return ftdc.read_columns(path, names)
+
+
+def _is_value(value) -> bool:
+    if isinstance(value, float):
+        return math.isfinite(value)
+    return isinstance(value, (bool, int, str))
+
+
+def encode_table(records: List[Dict[str, Any]]) -> Tuple[Dict[str, List[int]], dict]:
+    """
+    Turn records, flat dicts of field name to scalar, into one int64 column per field for
+    write_columnar, plus the metadata read_table needs to read them back.
+
+    Booleans are stored as 0 or 1, strings as indexes into metadata["strings"][field] and
+    fields with fractional values multiplied by metadata["scales"][field]. Fields that some
+    records don't have, or have as null, NaN or infinity, also get a column of 0 or 1
+    named metadata["valid"][field] saying which records have them.
+    """
+    fields = sorted({name for record in records for name in record})
+    metadata = {"strings": {}, "scales": {}, "valid": {}}
+    columns = {}
+    for name in fields:
+        values = [record.get(name) for record in records]
+        valid = [_is_value(value) for value in values]
+        if any(isinstance(value, str) for value in values):
+            known = metadata["strings"].setdefault(name, [])
+            for value in values:
+                if isinstance(value, str) and value not in known:
+                    known.append(value)
+            valid = [isinstance(value, str) for value in values]
+            column = [known.index(value) if ok else 0 for value, ok in zip(values, valid)]
+        elif any(
+            ok and isinstance(value, float) and not value.is_integer()
+            for value, ok in zip(values, valid)
+        ):
+            metadata["scales"][name] = FLOAT_SCALE
+            column = [
+                int(round(value * FLOAT_SCALE)) if ok else 0 for value, ok in zip(values, valid)
+            ]
+        else:
+            column = [int(value) if ok else 0 for value, ok in zip(values, valid)]
+        columns[name] = column
+        if not all(valid):
+            metadata["valid"][name] = f"valid.{name}"
+            columns[f"valid.{name}"] = [int(ok) for ok in valid]
+    return columns, metadata
+
+
+def read_table(path: str) -> Dict[str, np.ndarray]:
+    """
+    Read a file written with encode_table's columns and metadata, scaled back to the
+    original values and with NaN where a record didn't have a field. String fields stay
+    indexes into ColumnarFile(path).metadata["strings"][field].
+    """
+    recorded = ColumnarFile(path)
+    scales = recorded.metadata.get("scales", {})
+    valid = recorded.metadata.get("valid", {})
+    out = {}
+    for name in recorded.names:
+        if name in valid.values():
+            continue
+        column = recorded[name]
+        if name in valid or name in scales:
+            column = column.astype(float) / scales.get(name, 1)
+            if name in valid:
+                column[recorded[valid[name]] == 0] = np.nan
+        out[name] = column
+    return out
@@ -0,0 +1,210 @@
+"""
+Statistics for comparing an actor's metrics between two runs.
+
+Throughput is compared through the ops/s of every 1s window of each run and
+latency through every event's duration, so both have enough samples to tell a
+real change from run-to-run noise. Confidence intervals on the relative change
+of each statistic are found by bootstrapping, and latency distributions are also
+compared with a Mann-Whitney U test.
+"""
+import math
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+from genny.metrics import timeline
+
+LATENCY_PERCENTILES = {"latency p50": 0.5, "latency p90": 0.9, "latency p99": 0.99}
+
+# Throughput needs at least this many whole windows from each run to be compared.
+_MIN_WINDOWS = 3
+
+
+class MetricDelta(NamedTuple):
+    """Change of one statistic of one actor from the baseline to the candidate run."""
+
+    actor: str
+    metric: str
+    baseline: Optional[float]
+    candidate: Optional[float]
+    # Relative change: candidate / baseline - 1.
+    change: Optional[float]
+    # Confidence interval of the relative change, if there were enough samples.
+    ci_low: Optional[float]
+    ci_high: Optional[float]
+    # Mann-Whitney U test p-value for latency metrics.
+    p_value: Optional[float]
+    regression: bool
+
+
+def mann_whitney_u(a: np.ndarray, b: np.ndarray) -> Tuple[float, float]:
+    """
+    Two-sided Mann-Whitney U test of whether values from a tend to be larger or
+    smaller than values from b, using the tie-corrected normal approximation.
+
+    :return: U statistic of a, p-value
+    """
+    n1, n2 = len(a), len(b)
+    if n1 == 0 or n2 == 0:
+        raise ValueError("Both samples need values.")
+    combined = np.concatenate([np.asarray(a, dtype=float), np.asarray(b, dtype=float)])
+    order = np.argsort(combined, kind="mergesort")
+    sorted_values = combined[order]
+
+    # Give tied values the average of the ranks they span.
+    is_new = np.concatenate([[True], sorted_values[1:] != sorted_values[:-1]])
+    group = np.cumsum(is_new) - 1
+    ties = np.bincount(group)
+    average_rank = np.cumsum(ties) - (ties - 1) / 2.0
+    ranks = np.empty(len(combined))
+    ranks[order] = average_rank[group]
+
+    u = float(ranks[:n1].sum() - n1 * (n1 + 1) / 2.0)
+    n = n1 + n2
+    tie_term = float((ties.astype(float) ** 3 - ties).sum()) / (n * (n - 1)) if n > 1 else 0.0
+    sigma = math.sqrt(n1 * n2 / 12.0 * ((n + 1) - tie_term))
+    if sigma == 0:
+        return u, 1.0
+    z = (abs(u - n1 * n2 / 2.0) - 0.5) / sigma
+    return u, math.erfc(max(z, 0.0) / math.sqrt(2))
+
+
+def _bootstrap_quantiles(
+    sorted_values: np.ndarray, q: float, n_resamples: int, rng: np.random.Generator
+) -> np.ndarray:
+    """
+    The q-quantile of n_resamples bootstrap resamples of sorted_values.
+
+    Rather than drawing every resample, draw the position of its order statistic:
+    the r-th smallest of n uniform values follows Beta(r, n - r + 1).
+    """
+    n = len(sorted_values)
+    rank = max(1, math.ceil(q * n))
+    positions = rng.beta(rank, n - rank + 1, size=n_resamples)
+    return sorted_values[np.minimum((positions * n).astype(np.int64), n - 1)]
+
+
+def _bootstrap_means(values: np.ndarray, n_resamples: int, rng: np.random.Generator):
+    means = []
+    # In batches so long runs with many windows don't need n_resamples copies at once.
+    for start in range(0, n_resamples, 100):
+        samples = rng.integers(0, len(values), size=(min(100, n_resamples - start), len(values)))
+        means.append(values[samples].mean(axis=1))
+    return np.concatenate(means)
+
+
+def nearest_rank(sorted_values: np.ndarray, q: float) -> float:
+    """The q-quantile of sorted_values, picking the value at the nearest rank."""
+    return float(sorted_values[int(round(q * (len(sorted_values) - 1)))])
+
+
+def _relative(candidate, baseline):
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(baseline != 0, candidate / baseline - 1, np.nan)
+
+
+def _interval(changes: np.ndarray, confidence: float) -> Tuple[Optional[float], Optional[float]]:
+    changes = changes[np.isfinite(changes)]
+    if len(changes) == 0:
+        return None, None
+    tail = (1 - confidence) / 2 * 100
+    low, high = np.percentile(changes, [tail, 100 - tail])
+    return float(low), float(high)
+
+
+def _float(value) -> Optional[float]:
+    return None if value is None or not np.isfinite(value) else float(value)
+
+
+def _whole_windows(columns: Dict[str, np.ndarray]) -> np.ndarray:
+    """Ops/s of every window except the first and last, which are usually partial."""
+    return timeline.windows(columns)["ops_per_second"][1:-1]
+
+
+def compare_actor(
+    actor: str,
+    baseline: Dict[str, np.ndarray],
+    candidate: Dict[str, np.ndarray],
+    threshold: float = 0.05,
+    confidence: float = 0.95,
+    n_resamples: int = 1000,
+    seed: int = 0,
+) -> List[MetricDelta]:
+    """
+    Compare throughput and latency percentiles of one actor between two runs.
+
+    A statistic is a regression if it got worse by more than threshold (relative)
+    and its confidence interval is entirely on the worse side of no change; for
+    latency the Mann-Whitney test must be significant at the same confidence too.
+
+    :param baseline: the actor's columns from the baseline run, as from read_columns
+    :param candidate: the same for the candidate run
+    """
+    rng = np.random.default_rng(seed)
+    out = []
+
+    base_windows, cand_windows = _whole_windows(baseline), _whole_windows(candidate)
+    base_rate = float(base_windows.mean()) if len(base_windows) else math.nan
+    cand_rate = float(cand_windows.mean()) if len(cand_windows) else math.nan
+    ci_low = ci_high = None
+    if len(base_windows) >= _MIN_WINDOWS and len(cand_windows) >= _MIN_WINDOWS:
+        ci_low, ci_high = _interval(
+            _relative(
+                _bootstrap_means(cand_windows, n_resamples, rng),
+                _bootstrap_means(base_windows, n_resamples, rng),
+            ),
+            confidence,
+        )
+    change = _float(_relative(np.float64(cand_rate), np.float64(base_rate)))
+    out.append(
+        MetricDelta(
+            actor=actor,
+            metric="ops per second",
+            baseline=_float(base_rate),
+            candidate=_float(cand_rate),
+            change=change,
+            ci_low=ci_low,
+            ci_high=ci_high,
+            p_value=None,
+            regression=(
+                change is not None and ci_high is not None and change < -threshold and ci_high < 0
+            ),
+        )
+    )
+
+    base_latency = np.sort(np.diff(baseline["timers.dur"], prepend=0) / (1000.0 * 1000.0))
+    cand_latency = np.sort(np.diff(candidate["timers.dur"], prepend=0) / (1000.0 * 1000.0))
+    if len(base_latency) == 0 or len(cand_latency) == 0:
+        return out
+    _, p_value = mann_whitney_u(cand_latency, base_latency)
+    for metric, q in LATENCY_PERCENTILES.items():
+        base_value = nearest_rank(base_latency, q)
+        cand_value = nearest_rank(cand_latency, q)
+        ci_low, ci_high = _interval(
+            _relative(
+                _bootstrap_quantiles(cand_latency, q, n_resamples, rng),
+                _bootstrap_quantiles(base_latency, q, n_resamples, rng),
+            ),
+            confidence,
+        )
+        change = _float(_relative(np.float64(cand_value), np.float64(base_value)))
+        out.append(
+            MetricDelta(
+                actor=actor,
+                metric=metric,
+                baseline=base_value,
+                candidate=cand_value,
+                change=change,
+                ci_low=ci_low,
+                ci_high=ci_high,
+                p_value=p_value,
+                regression=(
+                    change is not None
+                    and ci_low is not None
+                    and change > threshold
+                    and ci_low > 0
+                    and p_value < 1 - confidence
+                ),
+            )
+        )
+    return out
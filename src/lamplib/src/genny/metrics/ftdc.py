@@ -0,0 +1,313 @@
+"""
+Pure-python reader for the FTDC files Poplar writes to build/WorkloadOutput/CedarMetrics.
+
+An FTDC file is a sequence of BSON documents. Those with type 1 hold a chunk of
+samples: a zlib-compressed payload made of a reference document, the number of
+metrics and of deltas, then every metric's deltas from the reference as
+zero-run-length-encoded varints. Metrics are the numeric fields of the reference
+document in order, named by their dotted path (e.g. "counters.ops"), the same way
+`curator ftdc export csv` names its columns.
+
+Chunks are decoded lazily, with the varint stream decoded by NumPy rather than
+byte by byte.
+"""
+import datetime
+import struct
+import zlib
+from typing import BinaryIO, Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+_METADATA_TYPE = 0
+_METRIC_CHUNK_TYPE = 1
+
+
+class FTDCError(Exception):
+    pass
+
+
+class Timestamp(NamedTuple):
+    """BSON timestamp."""
+
+    time: int
+    inc: int
+
+
+class Chunk(NamedTuple):
+    """
+    One chunk of samples.
+
+    metrics maps each metric name to an int64 array with one value per sample, in
+    the order the metrics appear in the chunk's reference document.
+    """
+
+    start: Optional[datetime.datetime]
+    metrics: Dict[str, np.ndarray]
+
+    @property
+    def n_samples(self) -> int:
+        return len(next(iter(self.metrics.values()))) if self.metrics else 0
+
+
+#
+# BSON
+#
+
+_INT32 = struct.Struct("<i")
+_UINT32 = struct.Struct("<I")
+_INT64 = struct.Struct("<q")
+_DOUBLE = struct.Struct("<d")
+
+
+def _cstring_end(buf: bytes, pos: int) -> int:
+    return buf.index(b"\x00", pos)
+
+
+def _to_datetime(millis: int):
+    try:
+        return datetime.datetime(1970, 1, 1) + datetime.timedelta(milliseconds=millis)
+    except OverflowError:
+        return millis
+
+
+def _decode_value(buf: bytes, pos: int, kind: int) -> Tuple[object, int]:
+    """Decode the value of the given BSON type at pos. Returns (value, end position)."""
+    if kind == 0x01:
+        return _DOUBLE.unpack_from(buf, pos)[0], pos + 8
+    if kind in (0x02, 0x0D, 0x0E):  # string, javascript, symbol
+        length = _INT32.unpack_from(buf, pos)[0]
+        return buf[pos + 4 : pos + 3 + length].decode("utf-8", "replace"), pos + 4 + length
+    if kind in (0x03, 0x04):
+        length = _INT32.unpack_from(buf, pos)[0]
+        doc = _decode_document(buf, pos)
+        return (list(doc.values()) if kind == 0x04 else doc), pos + length
+    if kind == 0x05:
+        length = _INT32.unpack_from(buf, pos)[0]
+        return buf[pos + 5 : pos + 5 + length], pos + 5 + length
+    if kind in (0x06, 0x0A, 0x7F, 0xFF):  # undefined, null, max and min key
+        return None, pos
+    if kind == 0x07:
+        return buf[pos : pos + 12], pos + 12
+    if kind == 0x08:
+        return buf[pos] != 0, pos + 1
+    if kind == 0x09:
+        return _to_datetime(_INT64.unpack_from(buf, pos)[0]), pos + 8
+    if kind == 0x0B:
+        pattern_end = _cstring_end(buf, pos)
+        options_end = _cstring_end(buf, pattern_end + 1)
+        return buf[pos:pattern_end].decode("utf-8", "replace"), options_end + 1
+    if kind == 0x0C:
+        length = _INT32.unpack_from(buf, pos)[0]
+        return buf[pos + 4 : pos + 3 + length].decode("utf-8", "replace"), pos + 4 + length + 12
+    if kind == 0x0F:
+        return None, pos + _INT32.unpack_from(buf, pos)[0]
+    if kind == 0x10:
+        return _INT32.unpack_from(buf, pos)[0], pos + 4
+    if kind == 0x11:
+        inc, time = struct.unpack_from("<II", buf, pos)
+        return Timestamp(time, inc), pos + 8
+    if kind == 0x12:
+        return _INT64.unpack_from(buf, pos)[0], pos + 8
+    if kind == 0x13:
+        return buf[pos : pos + 16], pos + 16
+    raise FTDCError(f"Unknown BSON type {kind:#x} at offset {pos}.")
+
+
+def _decode_document(buf: bytes, pos: int = 0) -> dict:
+    """Decode the BSON document starting at pos."""
+    length = _INT32.unpack_from(buf, pos)[0]
+    end = pos + length - 1
+    pos += 4
+    out = {}
+    while pos < end:
+        kind = buf[pos]
+        name_end = _cstring_end(buf, pos + 1)
+        name = buf[pos + 1 : name_end].decode("utf-8", "replace")
+        out[name], pos = _decode_value(buf, name_end + 1, kind)
+    return out
+
+
+def _extract_metrics(doc: dict, prefix: str, names: List[str], values: List[int]) -> None:
+    """Flatten the numeric fields of a reference document, in order."""
+    for key, value in doc.items():
+        name = prefix + key
+        if isinstance(value, bool):
+            names.append(name)
+            values.append(int(value))
+        elif isinstance(value, int):
+            names.append(name)
+            values.append(value)
+        elif isinstance(value, float):
+            # FTDC stores doubles truncated to integers.
+            names.append(name)
+            values.append(int(value) if np.isfinite(value) else 0)
+        elif isinstance(value, datetime.datetime):
+            names.append(name)
+            values.append(
+                (value - datetime.datetime(1970, 1, 1)) // datetime.timedelta(milliseconds=1)
+            )
+        elif isinstance(value, Timestamp):
+            names.extend([name, name + ".inc"])
+            values.extend([value.time, value.inc])
+        elif isinstance(value, dict):
+            _extract_metrics(value, name + ".", names, values)
+        elif isinstance(value, list):
+            _extract_metrics({str(i): v for i, v in enumerate(value)}, name + ".", names, values)
+
+
+#
+# Chunk payloads
+#
+
+
+def _decode_varints(buf: np.ndarray) -> np.ndarray:
+    """Decode a buffer of unsigned LEB128 varints into uint64s."""
+    is_last = buf < 0x80
+    ends = np.flatnonzero(is_last)
+    if len(ends) == 0:
+        return np.zeros(0, dtype=np.uint64)
+    buf = buf[: ends[-1] + 1]
+    starts = np.empty_like(ends)
+    starts[0] = 0
+    starts[1:] = ends[:-1] + 1
+    # Shift every byte's 7 bits into place, then OR together the bytes of each varint.
+    varint_of_byte = np.repeat(np.arange(len(starts)), ends - starts + 1)
+    shifts = (np.arange(len(buf)) - starts[varint_of_byte]) * 7
+    parts = (buf & 0x7F).astype(np.uint64) << shifts.astype(np.uint64)
+    return np.bitwise_or.reduceat(parts, starts)
+
+
+def _expand_zero_runs(varints: np.ndarray, n: int) -> np.ndarray:
+    """
+    Undo FTDC's run-length encoding: every 0 delta is followed by a count of the
+    additional zeros after it.
+    """
+    is_zero = varints == 0
+    # After a non-zero varint (a delta or a count) always comes a delta, so runs of
+    # 0 varints alternate between a 0 delta and a count of 0 more zeros.
+    index = np.arange(len(varints))
+    last_non_zero = np.maximum.accumulate(np.where(is_zero, -1, index))
+    offset_in_run = index - last_non_zero - 1
+    is_count = is_zero & (offset_in_run % 2 == 1)
+    # A non-zero varint directly after a run that ended on a 0 delta is its count.
+    is_count[1:] |= ~is_zero[1:] & is_zero[:-1] & ~is_count[:-1]
+
+    is_delta = ~is_count
+    repeats = np.ones(len(varints), dtype=np.int64)
+    counts_follow = np.flatnonzero(is_count) - 1
+    repeats[counts_follow] += varints[counts_follow + 1].astype(np.int64)
+    deltas = np.repeat(varints[is_delta], repeats[is_delta])
+    if len(deltas) < n:
+        raise FTDCError(f"Chunk has {len(deltas)} deltas, expected {n}.")
+    return deltas[:n]
+
+
+def decode_chunk(data: bytes, start: Optional[datetime.datetime] = None) -> Chunk:
+    """
+    Decode the binary data of a metric chunk document.
+
+    :param data: the chunk's `data` field: uncompressed length followed by zlib data
+    :param start: the chunk's `_id`
+    """
+    payload = zlib.decompress(data[4:])
+    if len(payload) != _UINT32.unpack_from(data)[0]:
+        raise FTDCError("Chunk length does not match its header.")
+
+    reference = _decode_document(payload)
+    pos = _INT32.unpack_from(payload)[0]
+    n_metrics, n_deltas = struct.unpack_from("<II", payload, pos)
+    pos += 8
+
+    names, reference_values = [], []
+    _extract_metrics(reference, "", names, reference_values)
+    if len(names) != n_metrics:
+        raise FTDCError(
+            f"Reference document has {len(names)} metrics but the chunk says {n_metrics}."
+        )
+
+    values = np.empty((n_metrics, n_deltas + 1), dtype=np.uint64)
+    values[:, 0] = np.array(reference_values, dtype=np.int64).view(np.uint64)
+    if n_deltas and n_metrics:
+        varints = _decode_varints(np.frombuffer(payload, dtype=np.uint8, offset=pos))
+        deltas = _expand_zero_runs(varints, n_metrics * n_deltas)
+        values[:, 1:] = deltas.reshape(n_metrics, n_deltas)
+        # Unsigned addition wraps just like the encoder's subtraction did.
+        np.cumsum(values, axis=1, out=values)
+
+    values = values.view(np.int64)
+    return Chunk(start=start, metrics={name: values[i] for i, name in enumerate(names)})
+
+
+def _documents(stream: BinaryIO) -> Iterator[bytes]:
+    while True:
+        header = stream.read(4)
+        if not header:
+            return
+        if len(header) < 4:
+            raise FTDCError("Truncated BSON document.")
+        length = _INT32.unpack(header)[0]
+        body = stream.read(length - 4)
+        if len(body) < length - 4:
+            raise FTDCError("Truncated BSON document.")
+        yield header + body
+
+
+def read_chunks(path: str) -> Iterator[Chunk]:
+    """Lazily decode the metric chunks of the FTDC file at path."""
+    with open(path, "rb") as stream:
+        for raw in _documents(stream):
+            doc = _decode_document(raw)
+            if doc.get("type") != _METRIC_CHUNK_TYPE:
+                continue
+            start = doc.get("_id")
+            yield decode_chunk(
+                doc["data"], start=start if isinstance(start, datetime.datetime) else None
+            )
+
+
+def read_metadata(path: str) -> List[dict]:
+    """The metadata documents of the FTDC file at path."""
+    with open(path, "rb") as stream:
+        return [
+            doc.get("doc")
+            for doc in (_decode_document(raw) for raw in _documents(stream))
+            if doc.get("type") == _METADATA_TYPE
+        ]
+
+
+def read_columns(path: str, names: Optional[Iterable[str]] = None) -> Dict[str, np.ndarray]:
+    """
+    Every sample of the FTDC file at path, concatenated across chunks.
+
+    :param names: only return these metrics; by default return all of them
+    """
+    wanted = None if names is None else set(names)
+    parts: Dict[str, List[np.ndarray]] = {}
+    for chunk in read_chunks(path):
+        for name, column in chunk.metrics.items():
+            if wanted is None or name in wanted:
+                parts.setdefault(name, []).append(column)
+    return {name: np.concatenate(columns) for name, columns in parts.items()}
+
+
+def write_csv(path: str, out) -> int:
+    """
+    Write the samples of the FTDC file at path to the text stream out, in the same
+    layout as `curator ftdc export csv`: a header of metric names from the first
+    chunk, then one row of integers per sample.
+
+    :return: number of rows written
+    """
+    header = None
+    rows = 0
+    for chunk in read_chunks(path):
+        names = list(chunk.metrics)
+        if header is None:
+            header = names
+            out.write(",".join(header) + "\n")
+        elif names != header:
+            raise FTDCError("Chunks have different metrics; can't write them as one csv.")
+        table = np.column_stack([chunk.metrics[name] for name in header])
+        np.savetxt(out, table, fmt="%d", delimiter=",")
+        rows += len(table)
+    return rows
@@ -0,0 +1,118 @@
+"""
+Streaming quantile estimates in bounded memory.
+
+QuantileSketch is an HDR-style histogram with logarithmically sized buckets:
+every value v is counted in bucket ceil(log(|v|) / log(gamma)), where
+gamma = (1 + relative_error) / (1 - relative_error). Any quantile is then within
+relative_error of a value that was actually added, and the number of buckets only
+grows with the log of the range of the values, not with how many there are.
+"""
+import math
+from typing import Dict, Iterable, Union
+
+import numpy as np
+
+PERCENTILES = {"p50": 0.5, "p90": 0.9, "p99": 0.99, "p99.9": 0.999}
+
+
+class QuantileSketch:
+    """
+    Counts values in logarithmic buckets to answer quantile queries. The exact
+    count, min and max are kept as well.
+    """
+
+    def __init__(self, relative_error: float = 0.005):
+        if not 0 < relative_error < 1:
+            raise ValueError(f"relative_error must be in (0, 1), got {relative_error}")
+        self.relative_error = relative_error
+        self._gamma = (1 + relative_error) / (1 - relative_error)
+        self._log_gamma = math.log(self._gamma)
+        # Bucket index -> count, separately for positive and negative values.
+        self._positive: Dict[int, int] = {}
+        self._negative: Dict[int, int] = {}
+        self._zeros = 0
+        self.count = 0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def add(self, values: Union[float, Iterable[float], np.ndarray]) -> "QuantileSketch":
+        """Add one value or an array of them."""
+        values = np.asarray(values, dtype=float).ravel()
+        values = values[np.isfinite(values)]
+        if len(values) == 0:
+            return self
+
+        self.count += len(values)
+        self.min = min(self.min, float(values.min()))
+        self.max = max(self.max, float(values.max()))
+        self._zeros += int(np.count_nonzero(values == 0))
+        self._count_buckets(self._positive, values[values > 0])
+        self._count_buckets(self._negative, -values[values < 0])
+        return self
+
+    def merge(self, other: "QuantileSketch") -> "QuantileSketch":
+        """Add every value counted by other, which must have the same relative_error."""
+        if other.relative_error != self.relative_error:
+            raise ValueError("Can only merge sketches with the same relative_error.")
+        for mine, theirs in [(self._positive, other._positive), (self._negative, other._negative)]:
+            for index, count in theirs.items():
+                mine[index] = mine.get(index, 0) + count
+        self._zeros += other._zeros
+        self.count += other.count
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        return self
+
+    def quantile(self, q: float) -> float:
+        """
+        Estimate the value below which a fraction q of the values fall, using the
+        same ranks as numpy's default "linear" method rounded to the nearest value.
+        """
+        if self.count == 0:
+            raise ValueError("No values in sketch.")
+        if not 0 <= q <= 1:
+            raise ValueError(f"Quantile must be in [0, 1], got {q}")
+        if q == 0:
+            return self.min
+        if q == 1:
+            return self.max
+
+        rank = round(q * (self.count - 1))
+        seen = 0
+        for index in sorted(self._negative, reverse=True):
+            seen += self._negative[index]
+            if seen > rank:
+                return self._clamp(-self._value(index))
+        seen += self._zeros
+        if seen > rank:
+            return 0.0
+        for index in sorted(self._positive):
+            seen += self._positive[index]
+            if seen > rank:
+                return self._clamp(self._value(index))
+        return self.max
+
+    def percentiles(self) -> Dict[str, float]:
+        """The quantiles in PERCENTILES, plus the max."""
+        out = {name: self.quantile(q) for name, q in PERCENTILES.items()}
+        out["max"] = self.max
+        return out
+
+    @property
+    def n_buckets(self) -> int:
+        return len(self._positive) + len(self._negative) + (1 if self._zeros else 0)
+
+    def _count_buckets(self, buckets: Dict[int, int], values: np.ndarray) -> None:
+        if len(values) == 0:
+            return
+        indexes = np.ceil(np.log(values) / self._log_gamma).astype(np.int64)
+        for index, count in zip(*np.unique(indexes, return_counts=True)):
+            index = int(index)
+            buckets[index] = buckets.get(index, 0) + int(count)
+
+    def _value(self, index: int) -> float:
+        # Bucket i holds (gamma^(i-1), gamma^i]; this is within relative_error of both ends.
+        return 2 * self._gamma ** index / (self._gamma + 1)
+
+    def _clamp(self, value: float) -> float:
+        return min(max(value, self.min), self.max)
@@ -0,0 +1,197 @@
+"""
+Time-windowed throughput and latency for the columns of an actor's .ftdc file.
+
+Poplar writes one sample per event with cumulative counters.ops and timers.dur
+and the event's finish time in ts (milliseconds since the epoch). Diffing those
+gives every event's ops and latency, which are then grouped into fixed windows of
+wall-clock time. Phase boundaries come from the PhaseTimingRecorder actor the
+preprocessor adds to every workload (see preprocess.GENNY_INTERNAL): it records
+one event at the end of each phase, lasting as long as the phase did.
+"""
+from typing import Dict, List, NamedTuple, Optional, Sequence
+
+import numpy as np
+
+# The .ftdc file the PhaseTimingRecorder's "Phase" operation is written to,
+# without its extension.
+PHASE_RECORDER_FILE = "PhaseTimingRecorder.Phase"
+
+TIMELINE_PERCENTILES = {"p50": 0.5, "p90": 0.9, "p99": 0.99}
+
+_SPARKS = "▁▂▃▄▅▆▇█"
+
+
+class Phase(NamedTuple):
+    number: int
+    start_ms: int
+    end_ms: int
+
+
+def phases_from_columns(columns: Dict[str, np.ndarray]) -> List[Phase]:
+    """Phase boundaries from the columns of the PhaseTimingRecorder's .ftdc file."""
+    ends = columns["ts"]
+    durations_ms = np.diff(columns["timers.dur"], prepend=0) // 1000000
+    return [
+        Phase(number=i, start_ms=int(end - duration), end_ms=int(end))
+        for i, (end, duration) in enumerate(zip(ends, durations_ms))
+    ]
+
+
+def _event_columns(columns: Dict[str, np.ndarray]):
+    """Per-event finish time (ms), ops, errors and latency (ms)."""
+    ts = columns["ts"].astype(np.int64)
+    ops = np.diff(columns["counters.ops"], prepend=0)
+    errors = np.diff(columns.get("counters.errors", np.zeros_like(ts)), prepend=0)
+    latency_ms = np.diff(columns["timers.dur"], prepend=0) / (1000.0 * 1000.0)
+    return ts, ops, errors, latency_ms
+
+
+def _grouped_percentiles(groups: np.ndarray, values: np.ndarray, n_groups: int) -> dict:
+    """
+    The TIMELINE_PERCENTILES and max of values within each group, by nearest
+    rank. NaN for empty groups.
+    """
+    counts = np.bincount(groups, minlength=n_groups)
+    if len(values) == 0:
+        return {name: np.full(n_groups, np.nan) for name in [*TIMELINE_PERCENTILES, "max"]}
+    sorted_values = values[np.lexsort((values, groups))]
+    offsets = np.cumsum(counts) - counts
+    out = {}
+    for name, q in [*TIMELINE_PERCENTILES.items(), ("max", 1.0)]:
+        index = offsets + np.round(q * np.maximum(counts - 1, 0)).astype(np.int64)
+        picked = sorted_values[np.minimum(index, len(sorted_values) - 1)]
+        out[name] = np.where(counts == 0, np.nan, picked)
+    return out
+
+
+def windows(
+    columns: Dict[str, np.ndarray],
+    window_ms: int = 1000,
+    start_ms: Optional[int] = None,
+    phases: Sequence[Phase] = (),
+) -> Dict[str, np.ndarray]:
+    """
+    Group an actor's events into windows of window_ms by finish time.
+
+    Windows with no events are included, so stalls show up as zero throughput.
+
+    :param columns: an actor's metrics as returned by read_columns
+    :param start_ms: start of the first window. Pass the same value for every actor
+                     so their windows line up. Defaults to the first event.
+    :param phases: if given, each window is labelled with the phase it starts in
+    :return: one array per column: start_ms, phase, count, ops, ops_per_second,
+             errors and latency percentiles in milliseconds (NaN when a window is
+             empty)
+    """
+    ts, ops, errors, latency_ms = _event_columns(columns)
+    if start_ms is None:
+        start_ms = int(ts[0]) if len(ts) else 0
+    window = np.maximum((ts - start_ms) // window_ms, 0)
+    n_windows = int(window.max()) + 1 if len(window) else 0
+    starts = start_ms + np.arange(n_windows, dtype=np.int64) * window_ms
+
+    ops_total = np.bincount(window, weights=ops, minlength=n_windows)
+    out = {
+        "start_ms": starts,
+        "phase": _phase_of(starts, window_ms, phases),
+        "count": np.bincount(window, minlength=n_windows),
+        "ops": ops_total,
+        "ops_per_second": ops_total * 1000.0 / window_ms,
+        "errors": np.bincount(window, weights=errors, minlength=n_windows),
+    }
+    out.update(_grouped_percentiles(window, latency_ms, n_windows))
+    return out
+
+
+def _phase_of(starts: np.ndarray, window_ms: int, phases: Sequence[Phase]) -> np.ndarray:
+    """The phase each window starts in, or -1 if it's outside of every phase."""
+    if not phases:
+        return np.full(len(starts), -1, dtype=np.int64)
+    phase_starts = np.array([phase.start_ms for phase in phases])
+    phase_ends = np.array([phase.end_ms for phase in phases])
+    index = np.minimum(np.searchsorted(phase_ends, starts, side="right"), len(phases) - 1)
+    # A window that starts between phases belongs to the next one if they overlap.
+    inside = (phase_starts[index] < starts + window_ms) & (starts < phase_ends[index])
+    numbers = np.array([phase.number for phase in phases])
+    return np.where(inside, numbers[index], -1)
+
+
+def phase_summary(columns: Dict[str, np.ndarray], phases: Sequence[Phase]) -> List[dict]:
+    """Throughput and latency percentiles of an actor within each phase."""
+    if not phases:
+        return []
+    ts, ops, errors, latency_ms = _event_columns(columns)
+    phase_ends = np.array([phase.end_ms for phase in phases])
+    # Events finishing exactly at the end of a phase belong to it.
+    index = np.searchsorted(phase_ends, ts, side="left")
+    # Drop events finishing after the last phase.
+    keep = index < len(phases)
+    index = index[keep]
+
+    n = len(phases)
+    ops_total = np.bincount(index, weights=ops[keep], minlength=n)
+    counts = np.bincount(index, minlength=n)
+    errors_total = np.bincount(index, weights=errors[keep], minlength=n)
+    percentiles = _grouped_percentiles(index, latency_ms[keep], n)
+    out = []
+    for i, phase in enumerate(phases):
+        seconds = (phase.end_ms - phase.start_ms) / 1000.0
+        out.append(
+            {
+                "phase": phase.number,
+                "start_ms": phase.start_ms,
+                "end_ms": phase.end_ms,
+                "count": int(counts[i]),
+                "ops": float(ops_total[i]),
+                "ops_per_second": float(ops_total[i] / seconds) if seconds > 0 else None,
+                "errors": float(errors_total[i]),
+                **{name: _or_none(values[i]) for name, values in percentiles.items()},
+            }
+        )
+    return out
+
+
+def _or_none(value) -> Optional[float]:
+    return None if np.isnan(value) else float(value)
+
+
+def window_rows(windows: Dict[str, np.ndarray]) -> List[dict]:
+    """The columns returned by windows() as one JSON-friendly dict per window."""
+    columns = {
+        name: [_or_none(v) for v in values] if values.dtype.kind == "f" else values.tolist()
+        for name, values in windows.items()
+    }
+    return [dict(zip(columns, row)) for row in zip(*columns.values())]
+
+
+def sparkline(values: Sequence[float], width: int = 80) -> str:
+    """
+    Draw values as a line of block characters, averaging neighbouring values if
+    there are more than width of them. NaNs are drawn as spaces.
+    """
+    values = np.asarray(values, dtype=float)
+    if len(values) > width:
+        groups = np.array_split(values, width)
+        values = np.array([np.nanmean(g) if not np.isnan(g).all() else np.nan for g in groups])
+    finite = values[~np.isnan(values)]
+    if len(finite) == 0:
+        return " " * len(values)
+    low, high = finite.min(), finite.max()
+    scale = (len(_SPARKS) - 1) / (high - low) if high > low else 0
+    return "".join(" " if np.isnan(v) else _SPARKS[int(round((v - low) * scale))] for v in values)
+
+
+def phase_markers(phase: Sequence[int], width: int = 80) -> str:
+    """
+    A line to print under sparkline(): the last digit of each phase's number
+    where that phase starts, grouping windows the same way sparkline() does.
+    """
+    phase = np.asarray(phase)
+    groups = np.array_split(np.arange(len(phase)), min(width, len(phase))) if len(phase) else []
+    marks = []
+    previous = -1
+    for group in groups:
+        changes = [p for p in phase[group] if p != -1 and p != previous]
+        marks.append(str(changes[0] % 10) if changes else " ")
+        previous = phase[group[-1]] if phase[group[-1]] != -1 else previous
+    return "".join(marks)
@@ -6,18 +6,25 @@ import enum
 import glob
 import os
 import re
-from typing import NamedTuple, List, Optional, Set
-import yaml
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable, Iterator, NamedTuple, List, Optional, Set
 import structlog
 
 from shrub.command import CommandDefinition
 from shrub.config import Configuration
 from shrub.variant import TaskSpec
 
+from genny import yaml_io
 from genny.cmd_runner import run_command
+from genny.tasks.workload_index import WorkloadIndex
 
 SLOG = structlog.get_logger(__name__)
 
+# A top-level AutoRun key, and the first line after it that starts another
+# top-level key or document. Block sequences may sit at column 0 under a key.
+_AUTO_RUN_KEY = re.compile(r"^AutoRun\s*:", re.MULTILINE)
+_NEXT_TOP_LEVEL = re.compile(r"^(?:[^\s#-]|---|\.\.\.)", re.MULTILINE)
+
 
 #
 # The classes are listed here in dependency order to avoid having to quote typenames.
@@ -38,10 +45,43 @@ class YamlReader:
         :return: deserialized yaml file
         """
         joined = os.path.join(workspace_root, path)
+        if not os.path.exists(joined):
+            raise Exception(f"File {joined} not found.")
+        return yaml_io.load_file(joined)
+
+    def load_auto_run(self, workspace_root: str, path: str) -> dict:
+        """
+        Cheaper alternative to load() for when only the AutoRun section is needed.
+
+        :param workspace_root: effective cwd
+        :param path: path relative to workspace_root
+        :return: {"AutoRun": <contents>} if the file has a top-level AutoRun key, else {}
+        """
+        joined = os.path.join(workspace_root, path)
         if not os.path.exists(joined):
             raise Exception(f"File {joined} not found.")
         with open(joined) as handle:
-            return yaml.safe_load(handle)
+            text = handle.read()
+        if "AutoRun" not in text:
+            return {}
+
+        matches = list(_AUTO_RUN_KEY.finditer(text))
+        if len(matches) == 1:
+            start = matches[0].start()
+            end = _NEXT_TOP_LEVEL.search(text, matches[0].end())
+            section = text[start : end.start() if end else len(text)]
+            # Aliases may refer to anchors outside the section; parse the whole file then.
+            if "*" not in section:
+                try:
+                    return yaml_io.load(section) or {}
+                except Exception:
+                    pass
+
+        # Flow-style, quoted or repeated keys: fall back to parsing everything.
+        conts = yaml_io.load(text)
+        if isinstance(conts, dict) and "AutoRun" in conts:
+            return {"AutoRun": conts["AutoRun"]}
+        return {}
 
     # Really just here for easy mocking.
     def exists(self, path: str) -> bool:
@@ -64,6 +104,20 @@ class YamlReader:
         return out
 
 
+def _git(repo_path: str, *args: str) -> List[str]:
+    """
+    Run git in repo_path. Safe to call from several threads at once.
+
+    :return: non-empty lines of stdout
+    """
+    cmd = run_command(cmd=["git", *args], cwd=repo_path, check=False)
+    if cmd.returncode != 0:
+        raise RuntimeError(
+            f"Failed to run git {args} in {repo_path}: stdout: {cmd.stdout} stderr: {cmd.stderr}"
+        )
+    return [line for line in cmd.stdout if line]
+
+
 class WorkloadLister:
     """
     Lists files in the repo dir etc.
@@ -74,6 +128,8 @@ class WorkloadLister:
         self.workspace_root = workspace_root
         self.genny_repo_root = genny_repo_root
         self._expansions = None
+        self._merge_bases = {}
+        self._modified_workload_files = None
         self.reader = reader
 
     def all_workload_files(self) -> Set[str]:
@@ -81,30 +137,89 @@ class WorkloadLister:
         return {*glob.glob(pattern, recursive=True)}
 
     def modified_workload_files(self) -> Set[str]:
-        """Relies on git to find files in src/workloads modified versus origin/master"""
+        """
+        Relies on git to find files in src/workloads modified versus origin/master,
+        plus the workloads that LoadConfig a modified file in src/phases.
+
+        Each repo under src/ is diffed concurrently and the result is cached.
+        """
+        if self._modified_workload_files is not None:
+            return self._modified_workload_files
+
         src_path = os.path.join(self.workspace_root, "src")
-        all_repo_directories = {
-            path for path in os.listdir(src_path) if os.path.isdir(os.path.join(src_path, path))
-        }
-        command = (
-            "git diff --name-only --diff-filter=AMR "
-            "$(git merge-base HEAD origin) -- src/workloads/"
-        )
+        repo_paths = [
+            os.path.join(src_path, path)
+            for path in sorted(os.listdir(src_path))
+            if os.path.isdir(os.path.join(src_path, path))
+        ]
+        with ThreadPoolExecutor(max_workers=len(repo_paths) or 1) as pool:
+            per_repo = list(pool.map(self._modified_repo_files, repo_paths))
+
         modified_workloads = set()
-        for repo_directory in all_repo_directories:
-            repo_path = os.path.join(src_path, repo_directory)
-            cmd = run_command(cmd=[command], cwd=repo_path, shell=True, check=True)
-            if cmd.returncode != 0:
-                SLOG.fatal("Failed to compare workload directory to origin.", *cmd)
-                raise RuntimeError(
-                    "Failed to compare workload directory to origin: stdout: {cmd.stdout} stderr: {cmd.stderr}"
-                )
-            lines = cmd.stdout
+        for repo_path, lines in zip(repo_paths, per_repo):
+            lines = [line for line in lines if line.endswith(".yml")]
             modified_workloads.update(
-                {os.path.join(repo_path, line) for line in lines if line.endswith(".yml")}
+                os.path.join(repo_path, line) for line in lines if line.startswith("src/workloads/")
             )
+            modified_phases = {
+                os.path.join(repo_path, line) for line in lines if line.startswith("src/phases/")
+            }
+            if modified_phases:
+                modified_workloads.update(self._dependent_workloads(repo_path, modified_phases))
+        self._modified_workload_files = modified_workloads
         return modified_workloads
 
+    def merge_base(self, repo_path: str) -> Optional[str]:
+        """
+        :param repo_path: path to a git checkout
+        :return: the merge-base of HEAD and origin in that checkout, cached per repo.
+                 None if there isn't one, e.g. because the repo has no origin.
+        """
+        if repo_path not in self._merge_bases:
+            try:
+                self._merge_bases[repo_path] = _git(repo_path, "merge-base", "HEAD", "origin")[0]
+            except RuntimeError as e:
+                SLOG.warning(
+                    "Could not find merge-base with origin, only considering uncommitted changes.",
+                    repo_path=repo_path,
+                    error=str(e),
+                )
+                self._merge_bases[repo_path] = None
+        return self._merge_bases[repo_path]
+
+    def _modified_repo_files(self, repo_path: str) -> List[str]:
+        """Files under src/workloads and src/phases added, modified or renamed versus origin."""
+        merge_base = self.merge_base(repo_path)
+        base = [merge_base] if merge_base else []
+        return _git(
+            repo_path,
+            "diff",
+            "--name-only",
+            "--diff-filter=AMR",
+            *base,
+            "--",
+            "src/workloads/",
+            "src/phases/",
+        )
+
+    def _dependent_workloads(self, repo_path: str, modified_files: Set[str]) -> Set[str]:
+        index_path = os.path.join(
+            self.workspace_root, "build", "WorkloadIndex", os.path.basename(repo_path) + ".json"
+        )
+        index = WorkloadIndex(repo_root=repo_path, index_path=index_path).update()
+        index.save()
+        dependents = index.dependents(modified_files)
+        SLOG.info(
+            "Found workloads depending on modified phase files.",
+            phase_files=sorted(modified_files),
+            workloads=sorted(dependents),
+        )
+        # Keep paths in the same form as all_workload_files().
+        return {
+            os.path.join(repo_path, os.path.relpath(path, os.path.abspath(repo_path)))
+            for path in dependents
+        }
+
 
 class OpName(enum.Enum):
     """
@@ -200,7 +315,7 @@ class Workload:
         self.file_path = file_path
         self.is_modified = is_modified
 
-        conts = reader.load(workspace_root, self.file_path)
+        conts = reader.load_auto_run(workspace_root, self.file_path)
         SLOG.info(f"Running auto-tasks for workload: {self.file_path}")
 
         if "AutoRun" not in conts:
@@ -388,54 +503,77 @@ class Repo:
     Represents the git checkout.
     """
 
-    def __init__(self, lister: WorkloadLister, reader: YamlReader, workspace_root: str):
+    def __init__(
+        self,
+        lister: WorkloadLister,
+        reader: YamlReader,
+        workspace_root: str,
+        jobs: Optional[int] = None,
+    ):
+        """
+        :param jobs: number of workload files to read concurrently, default is the
+                     ThreadPoolExecutor default.
+        """
         self._modified_repo_files = None
         self.workspace_root = workspace_root
         self.lister = lister
         self.reader = reader
+        self.jobs = jobs
+
+    def _load_workloads(self, files: Iterable[str], modified: Set[str]) -> Iterator[Workload]:
+        """
+        Read the given workload files on a thread pool, yielding them in order
+        as they finish loading.
+        """
 
-    def all_workloads(self) -> List[Workload]:
-        all_files = self.lister.all_workload_files()
-        modified = self.lister.modified_workload_files()
-        return [
-            Workload(
+        # Workload only scans for the AutoRun section so reading is mostly I/O.
+        def load(fpath: str) -> Workload:
+            return Workload(
                 workspace_root=self.workspace_root,
                 file_path=fpath,
                 is_modified=fpath in modified,
                 reader=self.reader,
             )
-            for fpath in all_files
-        ]
 
-    def modified_workloads(self) -> List[Workload]:
-        return [workload for workload in self.all_workloads() if workload.is_modified]
+        with ThreadPoolExecutor(max_workers=self.jobs) as pool:
+            yield from pool.map(load, files)
 
-    def all_tasks(self) -> List[GeneratedTask]:
+    def all_workloads(self) -> Iterator[Workload]:
+        modified = set(self.lister.modified_workload_files())
+        return self._load_workloads(self.lister.all_workload_files(), modified)
+
+    def modified_workloads(self) -> Iterator[Workload]:
+        # Only read the files we'll actually generate tasks for.
+        modified = set(self.lister.modified_workload_files())
+        files = [fpath for fpath in self.lister.all_workload_files() if fpath in modified]
+        return self._load_workloads(files, modified)
+
+    def all_tasks(self) -> Iterator[GeneratedTask]:
         """
         :return: All possible tasks fom all possible workloads
         """
         # Double list-comprehensions always read backward to me :(
-        return [task for workload in self.all_workloads() for task in workload.all_tasks()]
+        return (task for workload in self.all_workloads() for task in workload.all_tasks())
 
-    def variant_tasks(self, build: CurrentBuildInfo) -> List[GeneratedTask]:
+    def variant_tasks(self, build: CurrentBuildInfo) -> Iterator[GeneratedTask]:
         """
         :return: Tasks to schedule given the current variant (runtime)
         """
-        return [task for workload in self.all_workloads() for task in workload.variant_tasks(build)]
+        return (task for workload in self.all_workloads() for task in workload.variant_tasks(build))
 
-    def patch_tasks(self, build: CurrentBuildInfo) -> List[GeneratedTask]:
+    def patch_tasks(self, build: CurrentBuildInfo) -> Iterator[GeneratedTask]:
         """
         :return: Tasks for modified workloads current variant (runtime)
         """
-        return [
+        return (
             task for workload in self.modified_workloads() for task in workload.variant_tasks(build)
-        ]
+        )
 
-    def tasks(self, op: CLIOperation, build: CurrentBuildInfo) -> List[GeneratedTask]:
+    def tasks(self, op: CLIOperation, build: CurrentBuildInfo) -> Iterator[GeneratedTask]:
         """
         :param op: current cli invocation
         :param build: current build info
-        :return: tasks that should be scheduled given the above
+        :return: tasks that should be scheduled given the above, generated lazily
         """
         if op.mode == OpName.ALL_TASKS:
             tasks = self.all_tasks()
@@ -456,9 +594,9 @@ class ConfigWriter:
     def __init__(self, op: CLIOperation):
         self.op = op
 
-    def write(self, tasks: List[GeneratedTask], write: bool = True) -> Configuration:
+    def write(self, tasks: Iterable[GeneratedTask], write: bool = True) -> Configuration:
         """
-        :param tasks: tasks to write
+        :param tasks: tasks to write, consumed once
         :param write: boolean to actually write the file - exposed for testing
         :return: the configuration object to write (exposed for testing)
         """
@@ -497,13 +635,13 @@ class ConfigWriter:
         return config
 
     @staticmethod
-    def variant_tasks(tasks: List[GeneratedTask], variant: str) -> Configuration:
+    def variant_tasks(tasks: Iterable[GeneratedTask], variant: str) -> Configuration:
         c = Configuration()
         c.variant(variant).tasks([TaskSpec(task.name) for task in tasks])
         return c
 
     @staticmethod
-    def all_tasks_modern(tasks: List[GeneratedTask]) -> Configuration:
+    def all_tasks_modern(tasks: Iterable[GeneratedTask]) -> Configuration:
         c = Configuration()
         c.exec_timeout(64800)  # 18 hours
         for task in tasks:
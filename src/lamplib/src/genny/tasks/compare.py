@@ -0,0 +1,145 @@
+"""
+Compare the per-actor metrics of two runs, as written to build/WorkloadOutput/CedarMetrics.
+"""
+import json
+import os
+import zipfile
+from typing import Dict, List, Optional
+
+import structlog
+
+from genny import curator
+from genny.metrics import ColumnarFile, FTDCError, MetricDelta, compare_actor, read_metrics
+
+SLOG = structlog.get_logger(__name__)
+
+# Columns needed from every actor's .ftdc file.
+_COLUMNS = ["ts", "counters.ops", "timers.dur"]
+
+
+def actor_files(metrics_dir: str) -> Dict[str, str]:
+    """
+    The .ftdc files under metrics_dir, keyed by their path relative to it without the
+    extension, e.g. "InsertRemove.Insert" or, with a shared Poplar daemon,
+    "MyWorkload/InsertRemove.Insert". Where an actor has been exported with
+    `run-genny export --format npz`, the .npz file is used instead. Other .npz files,
+    e.g. mongosync_actor's MongosyncProgress.npz, are skipped.
+    """
+    found = {}
+    for dirpath, _, filenames in os.walk(metrics_dir):
+        exports = {
+            filename
+            for filename in filenames
+            if filename.endswith(".npz") and _is_ftdc_export(os.path.join(dirpath, filename))
+        }
+        for filename in sorted(filenames):
+            actor, extension = os.path.splitext(filename)
+            if filename in exports or (extension == ".ftdc" and actor + ".npz" not in exports):
+                path = os.path.join(dirpath, filename)
+                found[os.path.relpath(os.path.join(dirpath, actor), metrics_dir)] = path
+    return found
+
+
+def _is_ftdc_export(path: str) -> bool:
+    try:
+        return "ftdc_metadata" in ColumnarFile(path).metadata
+    except (FTDCError, OSError, ValueError, KeyError, zipfile.BadZipFile):
+        return False
+
+
+def previous_actor_files(candidate_dir: str) -> Dict[str, str]:
+    """
+    Like actor_files, but for the runs moved aside before candidate_dir: each actor's
+    file is taken from the most recent of those runs it appears in. With a shared Poplar
+    daemon different workloads' previous runs are moved aside at different times.
+    """
+    previous = curator.previous_metrics(candidate_dir)
+    if not previous:
+        raise Exception(
+            f"No previous run found for {candidate_dir}. Pass a baseline directory explicitly."
+        )
+    found = {}
+    for run in reversed(previous):
+        found.update(actor_files(run))
+    return found
+
+
+def compare(
+    baseline_dir: Optional[str],
+    candidate_dir: str,
+    threshold: float = 0.05,
+    confidence: float = 0.95,
+    summary_file: Optional[str] = None,
+) -> List[MetricDelta]:
+    """
+    Compare throughput and latency of every actor present in both directories.
+
+    :param baseline_dir: None to compare each actor to its previous_actor_files
+
+    :return: the change of each statistic; those with regression set are significant
+             regressions
+    """
+    if baseline_dir is None:
+        baseline_files = previous_actor_files(candidate_dir)
+    else:
+        baseline_files = actor_files(baseline_dir)
+    candidate_files = actor_files(candidate_dir)
+    for actor in sorted(baseline_files.keys() ^ candidate_files.keys()):
+        SLOG.warning(
+            "Actor only in one run, not comparing it.",
+            actor=actor,
+            run="baseline" if actor in baseline_files else "candidate",
+        )
+    actors = sorted(baseline_files.keys() & candidate_files.keys())
+    if not actors:
+        raise Exception(
+            f"No actors in common between {baseline_dir or 'previous runs'} and {candidate_dir}."
+        )
+
+    SLOG.info(
+        "Comparing runs.",
+        baseline=baseline_dir or "previous runs",
+        candidate=candidate_dir,
+        actors=len(actors),
+    )
+    results = []
+    for actor in actors:
+        baseline = read_metrics(baseline_files[actor], names=_COLUMNS)
+        candidate = read_metrics(candidate_files[actor], names=_COLUMNS)
+        missing = [name for name in _COLUMNS if name not in baseline or name not in candidate]
+        if missing:
+            SLOG.warning(
+                "Actor is missing metrics, not comparing it.", actor=actor, missing=missing
+            )
+            continue
+        results.extend(
+            compare_actor(actor, baseline, candidate, threshold=threshold, confidence=confidence)
+        )
+
+    for result in results:
+        log = SLOG.error if result.regression else SLOG.info
+        log(
+            "Regression." if result.regression else "Compared.",
+            actor=result.actor,
+            metric=result.metric,
+            baseline=_round(result.baseline),
+            candidate=_round(result.candidate),
+            change=_percent(result.change),
+            ci=f"[{_percent(result.ci_low)}, {_percent(result.ci_high)}]",
+            p_value=None if result.p_value is None else f"{result.p_value:.3g}",
+        )
+    regressions = [result for result in results if result.regression]
+    SLOG.info("Finished comparing runs.", compared=len(results), regressions=len(regressions))
+
+    if summary_file is not None:
+        with open(summary_file, "w") as f:
+            json.dump([result._asdict() for result in results], f, indent=2)
+    return results
+
+
+def _round(value: Optional[float]) -> Optional[float]:
+    return None if value is None else round(value, 3)
+
+
+def _percent(value: Optional[float]) -> str:
+    return "n/a" if value is None else f"{value * 100:+.1f}%"
@@ -27,11 +27,14 @@ def main_genny_runner(
     """
     Intended to be the main entry point for running Genny.
     """
+    # With a shared poplar daemon each workload's metrics go to their own directory.
+    run_name = os.path.splitext(os.path.basename(workload_yaml_path))[0]
     with poplar_grpc(
         cleanup_metrics=cleanup_metrics,
         workspace_root=workspace_root,
         genny_repo_root=genny_repo_root,
-    ):
+        run_name=run_name,
+    ) as metrics_path:
         path = os.path.join(genny_repo_root, "dist", "bin", "genny_core")
         if not os.path.exists(path):
             SLOG.error("genny_core not found. Run install first.", path=path)
@@ -50,14 +53,14 @@ def main_genny_runner(
         os.makedirs(preprocessed_dir, exist_ok=True)
 
         processed_workload = os.path.join(preprocessed_dir, os.path.basename(workload_yaml_path))
-        with open(processed_workload, "w") as f:
-            preprocess.preprocess(
-                workload_path=workload_yaml_path,
-                default_uri=mongo_uri,
-                smoke=smoke_test,
-                output_file=f,
-                override_file_path=override,
-            )
+        preprocess.preprocess_cached(
+            workload_path=workload_yaml_path,
+            default_uri=mongo_uri,
+            smoke=smoke_test,
+            output_path=processed_workload,
+            override_file_path=override,
+            metrics_path=metrics_path,
+        )
 
         cmd.append("--workload-file")
         cmd.append(processed_workload)
@@ -1,17 +1,24 @@
 import os
 import sys
-import tempfile
+import copy
+import glob
+import json
+import time
+import hashlib
 import datetime
 from enum import Enum
 from pathlib import Path
 from collections import namedtuple
 from contextlib import AbstractContextManager
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, NamedTuple, Optional
 
 from omegaconf import OmegaConf
-import yaml
 import structlog
 import numexpr
 
+from genny import yaml_io
+
 SLOG = structlog.get_logger(__name__)
 # Cannot be in the default config because yaml merges overwrite lists instead of appending.
 GENNY_INTERNAL = {"Name": "PhaseTimingRecorder", "Type": "PhaseTimingRecorder", "Threads": 1}
@@ -51,6 +58,127 @@ def evaluate(
         )
 
 
+class BatchResult(NamedTuple):
+    """Outcome of preprocessing one workload as part of evaluate_all."""
+
+    workload_path: str
+    output_path: str
+    seconds: float
+    error: Optional[str]
+    cache_hits: int
+    cache_misses: int
+
+
+def evaluate_all(
+    workloads: str,
+    default_uri: str,
+    smoke: bool,
+    output_dir: str,
+    override_file_path=None,
+    jobs: Optional[int] = None,
+    summary_file: Optional[str] = None,
+) -> List[BatchResult]:
+    """
+    Preprocess every workload in a directory (or matching a glob) with a process pool.
+
+    Outputs are written to a tree under output_dir that mirrors the input tree.
+    Failures don't stop the batch; they are reported in the returned results.
+    """
+    if os.path.isdir(workloads):
+        workload_paths = glob.glob(os.path.join(workloads, "**", "*.yml"), recursive=True)
+    else:
+        workload_paths = glob.glob(workloads, recursive=True)
+    workload_paths = sorted(os.path.abspath(p) for p in workload_paths if os.path.isfile(p))
+    if not workload_paths:
+        raise Exception(f"No workload files found in {workloads}.")
+
+    if os.path.isdir(workloads):
+        input_root = os.path.abspath(workloads)
+    elif len(workload_paths) == 1:
+        input_root = os.path.dirname(workload_paths[0])
+    else:
+        input_root = os.path.commonpath(workload_paths)
+
+    tasks = [
+        (
+            workload_path,
+            os.path.join(output_dir, os.path.relpath(workload_path, input_root)),
+            default_uri,
+            smoke,
+            override_file_path,
+        )
+        for workload_path in workload_paths
+    ]
+
+    SLOG.info(
+        "Preprocessing workloads.", count=len(tasks), input_root=input_root, output_dir=output_dir
+    )
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        results = list(executor.map(_evaluate_one, tasks))
+    elapsed = time.perf_counter() - start
+
+    for result in results:
+        if result.error is None:
+            SLOG.info(
+                "Preprocessed workload.",
+                workload=result.workload_path,
+                millis=round(result.seconds * 1000, 2),
+            )
+        else:
+            SLOG.error(
+                "Failed to preprocess workload.",
+                workload=result.workload_path,
+                millis=round(result.seconds * 1000, 2),
+                error=result.error,
+            )
+    failed = [result for result in results if result.error is not None]
+    SLOG.info(
+        "Finished preprocessing workloads.",
+        succeeded=len(results) - len(failed),
+        failed=len(failed),
+        seconds=round(elapsed, 3),
+        load_config_cache_hits=sum(result.cache_hits for result in results),
+        load_config_cache_misses=sum(result.cache_misses for result in results),
+    )
+
+    if summary_file is not None:
+        with open(summary_file, "w") as f:
+            json.dump([result._asdict() for result in results], f, indent=2)
+    return results
+
+
+def _evaluate_one(task) -> BatchResult:
+    """Process pool worker for evaluate_all."""
+    workload_path, output_path, default_uri, smoke, override_file_path = task
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    error = None
+    hits, misses = _PHASE_FILE_CACHE.hits, _PHASE_FILE_CACHE.misses
+    start = time.perf_counter()
+    try:
+        with open(output_path, "w") as f:
+            preprocess(
+                workload_path=workload_path,
+                default_uri=default_uri,
+                smoke=smoke,
+                output_file=f,
+                override_file_path=override_file_path,
+            )
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+        # Unless open() itself failed, don't leave a partial output behind.
+        if os.path.isfile(output_path):
+            os.remove(output_path)
+    return BatchResult(
+        workload_path=workload_path,
+        output_path=output_path,
+        seconds=time.perf_counter() - start,
+        error=error,
+        cache_hits=_PHASE_FILE_CACHE.hits - hits,
+        cache_misses=_PHASE_FILE_CACHE.misses - misses,
+    )
+
+
 # It's weird to mix our custom preprocessor with OmegaConf.
 # Future work can replace it with OmegaConf resolvers and interpolation.
 def preprocess(
@@ -59,34 +187,149 @@ def preprocess(
     default_uri: str,
     output_file=sys.stdout,
     override_file_path=None,
-):
-    """Evaluate a workload and output it to a file (or stdout)."""
+    metrics_path: Optional[str] = None,
+) -> List[str]:
+    """
+    Evaluate a workload and output it to a file (or stdout).
+
+    If given, metrics_path replaces the default Metrics.Path, unless the workload
+    or override file sets one.
+
+    Returns the absolute paths of every file read: the workload, the override file
+    and all files pulled in (transitively) by LoadConfig.
+    """
     mode = _ParseMode.Smoke if smoke else _ParseMode.Normal
 
     # First, apply the workload yaml over the defaults.
+    defaults = DEFAULT_CONFIG
+    if metrics_path is not None:
+        defaults = {**DEFAULT_CONFIG, "Metrics": {"Path": metrics_path}}
     conf = OmegaConf.load(workload_path)
-    OmegaConf.create(DEFAULT_CONFIG)
-    conf = OmegaConf.unsafe_merge(DEFAULT_CONFIG, conf)
+    conf = OmegaConf.unsafe_merge(defaults, conf)
 
     # Second, apply any overrides.
     if override_file_path is not None:
         overrides = OmegaConf.load(override_file_path)
         conf = OmegaConf.unsafe_merge(conf, overrides)
 
-    # Third, use preprocessor on the merged config.
-    with tempfile.NamedTemporaryFile() as fp:
-        OmegaConf.save(config=conf, f=fp.name)
-        parser = _WorkloadParser()
-        path = Path(workload_path)
-        raw_parsed = parser.parse(fp.name, path=path, parse_mode=mode, default_uri=default_uri)
-        conf = OmegaConf.create(raw_parsed)
+    # Third, use preprocessor on the merged config. The merged tree is handed to the
+    # parser and the result emitted directly, without round-tripping through yaml files
+    # or building OmegaConf objects for the (much larger) preprocessed tree.
+    parser = _WorkloadParser()
+    path = Path(workload_path)
+    raw_parsed = parser.parse(
+        OmegaConf.to_container(conf),
+        source=_WorkloadParser.YamlSource.Dict,
+        path=path,
+        parse_mode=mode,
+        default_uri=default_uri,
+    )
 
     output_logger = structlog.PrintLogger(output_file)
     output_logger.msg(
         "# This file was generated by running the Genny preprocessor on the workload "
         + os.path.basename(workload_path)
     )
-    OmegaConf.save(config=conf, f=output_file)
+    _dump_output(raw_parsed, output_file)
+
+    inputs = {os.path.abspath(workload_path), *parser.loaded_files}
+    if override_file_path is not None:
+        inputs.add(os.path.abspath(override_file_path))
+    return sorted(inputs)
+
+
+def preprocess_cached(
+    workload_path: str,
+    smoke: bool,
+    default_uri: str,
+    output_path: str,
+    override_file_path=None,
+    metrics_path: Optional[str] = None,
+) -> bool:
+    """
+    Like preprocess but reuses output_path if a prior call already produced it from
+    identical inputs.
+
+    Alongside each output we record a hash over every input file, default_uri, the
+    smoke flag, metrics_path and the preprocessor itself. Returns True if the output
+    was reused.
+    """
+    manifest_path = os.path.join(
+        os.path.dirname(output_path), _CACHE_DIR, os.path.basename(output_path) + ".json"
+    )
+    workload_path = os.path.abspath(workload_path)
+    if override_file_path is not None:
+        override_file_path = os.path.abspath(override_file_path)
+
+    try:
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+        inputs = {*manifest["inputs"], workload_path}
+        if override_file_path is not None:
+            inputs.add(override_file_path)
+        closure = _closure_hash(
+            inputs, workload_path, smoke, default_uri, override_file_path, metrics_path
+        )
+        if closure == manifest["closure"] and _hash_file(output_path) == manifest["output"]:
+            SLOG.info(
+                "Reusing preprocessed workload, inputs are unchanged.",
+                workload=workload_path,
+                output=output_path,
+            )
+            return True
+    except (OSError, ValueError, KeyError):
+        # No usable manifest or output, or an input has gone away.
+        pass
+
+    os.makedirs(os.path.dirname(manifest_path), exist_ok=True)
+    if os.path.exists(manifest_path):
+        os.remove(manifest_path)
+    with open(output_path, "w") as f:
+        inputs = preprocess(
+            workload_path=workload_path,
+            default_uri=default_uri,
+            smoke=smoke,
+            output_file=f,
+            override_file_path=override_file_path,
+            metrics_path=metrics_path,
+        )
+    manifest = {
+        "inputs": inputs,
+        "closure": _closure_hash(
+            inputs, workload_path, smoke, default_uri, override_file_path, metrics_path
+        ),
+        "output": _hash_file(output_path),
+    }
+    with open(manifest_path, "w") as f:
+        json.dump(manifest, f, indent=2)
+    return False
+
+
+_CACHE_DIR = ".preprocess-cache"
+
+
+def _hash_file(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 16), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _closure_hash(
+    inputs, workload_path, smoke, default_uri, override_file_path, metrics_path
+) -> str:
+    """Hash everything that determines the output of preprocess."""
+    key = {
+        "inputs": {path: _hash_file(path) for path in sorted(inputs)},
+        "workload": workload_path,
+        "override": override_file_path,
+        "smoke": smoke,
+        "default_uri": default_uri,
+        "metrics_path": metrics_path,
+        "preprocessor": [_hash_file(__file__), _hash_file(yaml_io.__file__)],
+    }
+    return hashlib.sha256(json.dumps(key, sort_keys=True).encode()).hexdigest()
 
 
 class _ContextType(Enum):
@@ -171,6 +414,46 @@ class _Context(object):
         return _Context.ScopeManager(self)
 
 
+class _PhaseFileCache(object):
+    """
+    Caches the documents loaded by LoadConfig.
+
+    Entries are keyed by absolute path and are reloaded if the file's size or
+    mtime changes. Readers get a deep copy, so the parser is free to modify it.
+    """
+
+    def __init__(self):
+        """Initialize PhaseFileCache."""
+        self._docs = {}
+        self.hits = 0
+        self.misses = 0
+
+    def load(self, path: str):
+        """Load the yaml file at path, reusing a previously loaded copy if unchanged."""
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        version = (stat.st_size, stat.st_mtime_ns)
+
+        cached = self._docs.get(path)
+        if cached is not None and cached[0] == version:
+            self.hits += 1
+        else:
+            self.misses += 1
+            cached = (version, _load_file(path))
+            self._docs[path] = cached
+        return copy.deepcopy(cached[1])
+
+    def clear(self):
+        """Drop all cached documents and reset the stats."""
+        self._docs.clear()
+        self.hits = 0
+        self.misses = 0
+
+
+# Shared by all parsers in a process so a batch of workloads loads each phase file once.
+_PHASE_FILE_CACHE = _PhaseFileCache()
+
+
 class _WorkloadParser(object):
     """Parses/preprocesses workloads, stores state while doing so."""
 
@@ -179,11 +462,14 @@ class _WorkloadParser(object):
 
         File = (1,)
         String = 2
+        Dict = (3,)
 
-    def __init__(self):
+    def __init__(self, phase_file_cache: _PhaseFileCache = None):
         """Initialize WorkloadParser."""
         self._phase_config_path = ""
         self._context = _Context()
+        self._phase_file_cache = _PHASE_FILE_CACHE if phase_file_cache is None else phase_file_cache
+        self.loaded_files = set()
 
     def parse(
         self,
@@ -193,7 +479,12 @@ class _WorkloadParser(object):
         path="",
         parse_mode=_ParseMode.Normal,
     ):
-        """Parse the yaml input, assumed to be a file by default."""
+        """
+        Parse the yaml input, assumed to be a file by default.
+
+        For the Dict source, yaml_input is an already-loaded workload tree and path is
+        the path of the original workload file.
+        """
 
         if path == "":
             raise ParseException("Must specify path of original yaml for parser.")
@@ -204,8 +495,11 @@ class _WorkloadParser(object):
                 workload = _load_file(yaml_input)
                 self._phase_config_path = path.parent.absolute()
             elif source == _WorkloadParser.YamlSource.String:
-                workload = yaml.safe_load(yaml_input)
+                workload = yaml_io.load(yaml_input)
                 self._phase_config_path = path
+            elif source == _WorkloadParser.YamlSource.Dict:
+                workload = yaml_input
+                self._phase_config_path = path.parent.absolute()
             else:
                 raise ParseException(f"Invalid yaml source type {source}.")
             doc = self._recursive_parse(workload)
@@ -410,7 +704,8 @@ class _WorkloadParser(object):
                 )
                 raise ParseException(msg)
 
-            replacement = _load_file(path)
+            replacement = self._phase_file_cache.load(path)
+            self.loaded_files.add(os.path.abspath(path))
 
             if "SchemaVersion" not in replacement:
                 raise ParseException(
@@ -503,9 +798,55 @@ def _convert_obj_for_smoke(in_node):
 
 def _load_file(source):
     try:
-        with open(source) as file:
-            workload = yaml.safe_load(file)
-            return workload
+        return yaml_io.load_file(source)
     except:
         SLOG.error(f"Error loading yaml from {source}: {sys.exc_info()[0]}")
         raise
+
+
+class _OutputDumper(yaml_io.SafeDumper):
+    """
+    Dumps preprocessed workloads the same way OmegaConf.save does.
+
+    The preprocessor reuses nodes (e.g. the Nop phases of OnlyActiveInPhases),
+    which must be written out in full rather than as yaml aliases.
+    """
+
+    _BOOL_STRINGS = {
+        *("y", "Y", "yes", "Yes", "YES", "n", "N", "no", "No", "NO"),
+        *("true", "True", "TRUE", "false", "False", "FALSE"),
+        *("on", "On", "ON", "off", "Off", "OFF"),
+    }
+
+    def ignore_aliases(self, data):
+        return True
+
+    def represent_str(self, data):
+        # Quote strings that would otherwise be read back as bools or numbers.
+        return self.represent_scalar(
+            "tag:yaml.org,2002:str", data, style="'" if _OutputDumper._is_ambiguous(data) else None
+        )
+
+    @staticmethod
+    def _is_ambiguous(data: str) -> bool:
+        if data in _OutputDumper._BOOL_STRINGS:
+            return True
+        try:
+            float(data)
+            return True
+        except ValueError:
+            return False
+
+
+_OutputDumper.add_representer(str, _OutputDumper.represent_str)
+
+
+def _dump_output(workload, output_file):
+    yaml_io.dump(
+        workload,
+        output_file,
+        Dumper=_OutputDumper,
+        default_flow_style=False,
+        allow_unicode=True,
+        sort_keys=False,
+    )
@@ -0,0 +1,188 @@
+"""
+Index of which phase files and actor templates each workload depends on.
+
+Scans src/workloads and src/phases of a repo for LoadConfig, ActorTemplates and
+ActorFromTemplate nodes without preprocessing anything. The index is persisted as
+json and only files whose mtime or size changed are rescanned on update.
+"""
+import json
+import os
+from typing import Dict, Iterable, List, Optional, Set
+
+import structlog
+
+from genny import yaml_io
+
+SLOG = structlog.get_logger(__name__)
+
+# Bump when the format of an entry changes to force a full rescan.
+_INDEX_VERSION = 1
+
+
+class WorkloadIndex:
+    """
+    Maps workloads to the phase files they LoadConfig (transitively) and the
+    actor templates they use.
+    """
+
+    def __init__(self, repo_root: str, index_path: Optional[str] = None):
+        """
+        :param repo_root: directory containing src/workloads and src/phases
+        :param index_path: json file the index is persisted to, if any
+        """
+        self.repo_root = os.path.abspath(repo_root)
+        self.index_path = index_path
+        # Keyed by path relative to repo_root.
+        self._entries: Dict[str, dict] = {}
+        self._load()
+
+    def update(self) -> "WorkloadIndex":
+        """Rescan the yaml files that were added or changed since the last update."""
+        entries = {}
+        scanned = 0
+        for path in self._yaml_files():
+            rel_path = os.path.relpath(path, self.repo_root)
+            stat = os.stat(path)
+            entry = self._entries.get(rel_path)
+            if entry is None or entry["mtime"] != stat.st_mtime_ns or entry["size"] != stat.st_size:
+                entry = _scan_file(path)
+                entry["mtime"] = stat.st_mtime_ns
+                entry["size"] = stat.st_size
+                scanned += 1
+            entries[rel_path] = entry
+        SLOG.debug(
+            "Updated workload index.", repo_root=self.repo_root, files=len(entries), scanned=scanned
+        )
+        self._entries = entries
+        return self
+
+    def save(self) -> None:
+        """Persist the index to index_path."""
+        if self.index_path is None:
+            return
+        os.makedirs(os.path.dirname(os.path.abspath(self.index_path)), exist_ok=True)
+        with open(self.index_path, "w") as f:
+            json.dump(
+                {"version": _INDEX_VERSION, "entries": self._entries}, f, separators=(",", ":")
+            )
+
+    def workloads(self) -> List[str]:
+        """Absolute paths of every indexed workload."""
+        prefix = os.path.join("src", "workloads") + os.sep
+        return sorted(
+            os.path.join(self.repo_root, rel_path)
+            for rel_path in self._entries
+            if rel_path.startswith(prefix)
+        )
+
+    def dependencies(self, workload_path: str) -> Set[str]:
+        """Absolute paths of the files workload_path pulls in with LoadConfig, transitively."""
+        workload_path = os.path.abspath(workload_path)
+        # Like the preprocessor, resolve every LoadConfig path (even ones in phase
+        # files) relative to the directory of the workload.
+        base = os.path.dirname(workload_path)
+        found = set()
+        to_visit = [workload_path]
+        while to_visit:
+            entry = self._entries.get(os.path.relpath(to_visit.pop(), self.repo_root))
+            if entry is None:
+                continue
+            for load_path in entry["load_config"]:
+                dep = os.path.normpath(os.path.join(base, load_path))
+                if dep not in found and dep != workload_path:
+                    found.add(dep)
+                    to_visit.append(dep)
+        return found
+
+    def templates(self, workload_path: str) -> Set[str]:
+        """Names of the ActorTemplates used by workload_path or the files it loads."""
+        used = set()
+        for path in {os.path.abspath(workload_path), *self.dependencies(workload_path)}:
+            entry = self._entries.get(os.path.relpath(path, self.repo_root))
+            if entry is not None:
+                used.update(entry["templates_used"])
+        return used
+
+    def dependents(self, changed_files: Iterable[str]) -> Set[str]:
+        """Absolute paths of the workloads that are, or depend on, any of changed_files."""
+        changed = {os.path.abspath(path) for path in changed_files}
+        return {
+            workload
+            for workload in self.workloads()
+            if workload in changed or not changed.isdisjoint(self.dependencies(workload))
+        }
+
+    def _yaml_files(self) -> List[str]:
+        found = []
+        for directory in ["workloads", "phases"]:
+            root = os.path.join(self.repo_root, "src", directory)
+            for dirpath, _, filenames in os.walk(root):
+                found.extend(os.path.join(dirpath, f) for f in filenames if f.endswith(".yml"))
+        return found
+
+    def _load(self) -> None:
+        if self.index_path is None or not os.path.exists(self.index_path):
+            return
+        try:
+            with open(self.index_path) as f:
+                stored = json.load(f)
+            if stored.get("version") == _INDEX_VERSION:
+                self._entries = stored["entries"]
+        except (OSError, ValueError, KeyError):
+            SLOG.warning("Ignoring unreadable workload index.", index_path=self.index_path)
+
+
+def _scan_file(path: str) -> dict:
+    """Collect the LoadConfig paths and template names referenced by a yaml file."""
+    entry = {"load_config": set(), "templates_defined": set(), "templates_used": set()}
+    try:
+        _scan_node(yaml_io.load_file(path), entry)
+    except Exception as e:
+        SLOG.warning("Could not scan yaml file for dependencies.", path=path, error=str(e))
+    return {key: sorted(values) for key, values in entry.items()}
+
+
+def _scan_node(node, entry: dict) -> None:
+    if isinstance(node, list):
+        for value in node:
+            _scan_node(value, entry)
+        return
+    if not isinstance(node, dict):
+        return
+
+    for key, value in node.items():
+        if key == "LoadConfig" and isinstance(value, dict):
+            entry["load_config"].update(_load_config_paths(value))
+        elif key == "ActorTemplates" and isinstance(value, list):
+            entry["templates_defined"].update(
+                template["TemplateName"]
+                for template in value
+                if isinstance(template, dict) and isinstance(template.get("TemplateName"), str)
+            )
+        elif key == "ActorFromTemplate" and isinstance(value, dict):
+            if isinstance(value.get("TemplateName"), str):
+                entry["templates_used"].add(value["TemplateName"])
+        _scan_node(value, entry)
+
+
+def _load_config_paths(load_config: dict) -> Set[str]:
+    """
+    Possible paths loaded by a LoadConfig node. Parameterized paths can't be known
+    without preprocessing, so be conservative and include both the parameter's
+    default and any yml files passed as Parameters.
+    """
+    paths = set()
+    path = load_config.get("Path")
+    if isinstance(path, dict) and isinstance(path.get("^Parameter"), dict):
+        path = path["^Parameter"].get("Default")
+    if isinstance(path, str):
+        paths.add(path)
+
+    parameters = load_config.get("Parameters")
+    if isinstance(parameters, dict):
+        paths.update(
+            value
+            for value in parameters.values()
+            if isinstance(value, str) and value.endswith(".yml")
+        )
+    return paths
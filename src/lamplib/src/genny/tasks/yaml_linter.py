@@ -1,11 +1,12 @@
 import os
 import os.path as path
 import sys
-import yaml
 
 import structlog
 import yamllint.cli
 
+from genny import yaml_io
+
 SLOG = structlog.get_logger(__name__)
 
 
@@ -85,6 +86,4 @@ def _traverse_yamls(roots):
 
 
 def _load_yaml(yaml_path):
-    with open(yaml_path) as file:
-        workload = yaml.safe_load(file)
-        return workload
+    return yaml_io.load_file(yaml_path)
@@ -0,0 +1,45 @@
+"""
+YAML loading and dumping for genny's python tooling.
+
+Uses the libyaml-backed CSafeLoader/CSafeDumper when PyYAML was built with libyaml
+and falls back to the pure-python SafeLoader/SafeDumper otherwise. Both construct
+the same python objects, and documents that only PyYAML accepts are retried with
+the pure-python loader. In particular unquoted dates like `SchemaVersion: 2018-07-01`
+load as datetime.date, which the preprocessor converts back to strings.
+"""
+import yaml
+
+try:
+    from yaml import CSafeLoader as SafeLoader, CSafeDumper as SafeDumper
+
+    HAVE_LIBYAML = True
+except ImportError:
+    from yaml import SafeLoader, SafeDumper
+
+    HAVE_LIBYAML = False
+
+
+def load(stream):
+    """Load a single yaml document from a string or an open file."""
+    if HAVE_LIBYAML:
+        if not isinstance(stream, (str, bytes)):
+            stream = stream.read()
+        try:
+            return yaml.load(stream, Loader=SafeLoader)
+        except yaml.YAMLError:
+            # libyaml is stricter than PyYAML about some plain scalars in flow
+            # collections, e.g. `{^FastRandomString:{length: 5}}`. Retry with
+            # PyYAML so we accept (or reject) exactly what we always have.
+            pass
+    return yaml.load(stream, Loader=yaml.SafeLoader)
+
+
+def load_file(path: str):
+    """Load the yaml document in the file at path."""
+    with open(path) as handle:
+        return load(handle)
+
+
+def dump(data, stream=None, Dumper=SafeDumper, **kwargs):
+    """Dump data as yaml to stream, or return it as a string if stream is None."""
+    return yaml.dump(data, stream, Dumper=Dumper, **kwargs)
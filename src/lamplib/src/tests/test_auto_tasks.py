@@ -1,5 +1,7 @@
 import json
 import shutil
+import subprocess
+import tempfile
 import unittest
 import os
 from typing import NamedTuple, List, Optional
@@ -34,6 +36,10 @@ class MockReader(YamlReader):
             raise Exception(f"Yaml file {path} not configured.")
         return self._find_file(path).yaml_conts
 
+    def load_auto_run(self, workspace_root: str, path: str):
+        conts = self.load(workspace_root, path)
+        return {"AutoRun": conts["AutoRun"]} if "AutoRun" in conts else {}
+
     def exists(self, path: str) -> bool:
         found = self._find_file(path)
         return found is not None
@@ -580,6 +586,131 @@ class AutoTasksTests(BaseTestClass):
         )
 
 
+class WorkloadListerTests(unittest.TestCase):
+    def setUp(self):
+        self._tmpdir = tempfile.TemporaryDirectory()
+        self.workspace_root = self._tmpdir.name
+
+    def tearDown(self):
+        self._tmpdir.cleanup()
+
+    def _git(self, repo_path, *args):
+        subprocess.run(
+            ["git", "-c", "user.name=test", "-c", "user.email=test@example.com", *args],
+            cwd=repo_path,
+            check=True,
+            capture_output=True,
+        )
+
+    def _write(self, repo_path, rel_path, conts="{}\n"):
+        path = os.path.join(repo_path, rel_path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as f:
+            f.write(conts)
+
+    def _make_repo(self, name, committed, modified):
+        """Create a repo whose origin is at a commit with `committed` files."""
+        repo_path = os.path.join(self.workspace_root, "src", name)
+        os.makedirs(repo_path)
+        self._git(repo_path, "init", "-q")
+        for rel_path in committed:
+            self._write(repo_path, rel_path)
+        self._git(repo_path, "add", "-A")
+        self._git(repo_path, "commit", "-q", "-m", "base")
+        self._git(repo_path, "update-ref", "refs/remotes/origin/HEAD", "HEAD")
+        for rel_path, conts in modified.items():
+            self._write(repo_path, rel_path, conts)
+        return repo_path
+
+    def test_modified_workload_files(self):
+        genny = self._make_repo(
+            "genny",
+            committed=["src/workloads/scale/Old.yml", "src/phases/scale/Phase.yml"],
+            modified={
+                "src/workloads/scale/New.yml": "{}\n",
+                "src/workloads/scale/UsesPhase.yml": (
+                    "Actors:\n- Phases:\n  - LoadConfig:\n"
+                    "      Path: ../../phases/scale/Phase.yml\n"
+                ),
+                "src/phases/scale/Phase.yml": "Repeat: 1\n",
+            },
+        )
+        other = self._make_repo(
+            "other",
+            committed=["src/workloads/Unmodified.yml"],
+            modified={"src/workloads/Modified.yml": "{}\n"},
+        )
+        for repo_path in [genny, other]:
+            self._git(repo_path, "add", "-A")
+
+        lister = WorkloadLister(self.workspace_root, genny, YamlReader())
+        modified = lister.modified_workload_files()
+        self.assertSetEqual(
+            modified,
+            {
+                os.path.join(genny, "src/workloads/scale/New.yml"),
+                os.path.join(genny, "src/workloads/scale/UsesPhase.yml"),
+                os.path.join(other, "src/workloads/Modified.yml"),
+            },
+        )
+        self.assertIs(lister.modified_workload_files(), modified)
+
+
+class YamlReaderTests(unittest.TestCase):
+    def _load_auto_run(self, conts: str) -> dict:
+        with tempfile.TemporaryDirectory() as workspace_root:
+            with open(os.path.join(workspace_root, "Workload.yml"), "w") as f:
+                f.write(conts)
+            return YamlReader().load_auto_run(workspace_root, "Workload.yml")
+
+    def test_load_auto_run(self):
+        auto_run = self._load_auto_run(
+            """
+SchemaVersion: 2018-07-01
+# AutoRun is mentioned in a comment.
+AutoRun:
+# Sequences under a top-level key can start at column 0.
+- When:
+    mongodb_setup:
+      $eq: replica
+  ThenRun:
+  - infrastructure_provisioning: foo
+Actors:
+- Name: AutoRun
+"""
+        )
+        self.assertDictEqual(
+            auto_run,
+            {
+                "AutoRun": [
+                    {
+                        "When": {"mongodb_setup": {"$eq": "replica"}},
+                        "ThenRun": [{"infrastructure_provisioning": "foo"}],
+                    }
+                ]
+            },
+        )
+
+    def test_load_auto_run_missing(self):
+        self.assertDictEqual(self._load_auto_run("Actors:\n- Name: AutoRun\n"), {})
+        self.assertDictEqual(self._load_auto_run("Actors: []\n"), {})
+
+    def test_load_auto_run_alias(self):
+        auto_run = self._load_auto_run(
+            """
+Setups: &setups [replica, standalone]
+AutoRun:
+- When:
+    mongodb_setup:
+      $eq: *setups
+"""
+        )
+        self.assertDictEqual(
+            auto_run,
+            {"AutoRun": [{"When": {"mongodb_setup": {"$eq": ["replica", "standalone"]}}}]},
+        )
+
+
 def test_dry_run_all_tasks():
     """This is a dry run of schedule_global_auto_tasks."""
 
@@ -0,0 +1,97 @@
+import asyncio
+import os
+import subprocess
+import tempfile
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+from genny.cmd_runner import RunCommandOutput, run_command, run_command_async
+
+
+class RunCommandTests(unittest.TestCase):
+    def setUp(self):
+        self._tmpdir = tempfile.TemporaryDirectory()
+        self.dirs = []
+        for name in ["a", "b", "c", "d"]:
+            path = os.path.realpath(os.path.join(self._tmpdir.name, name))
+            os.makedirs(path)
+            self.dirs.append(path)
+
+    def tearDown(self):
+        self._tmpdir.cleanup()
+
+    def test_run_command_does_not_chdir(self):
+        cwd = os.getcwd()
+        with ThreadPoolExecutor(max_workers=len(self.dirs)) as pool:
+            outputs = list(
+                pool.map(lambda d: run_command(cmd=["pwd"], cwd=d, check=True), self.dirs)
+            )
+        self.assertEqual([output.stdout for output in outputs], [[d] for d in self.dirs])
+        self.assertEqual(os.getcwd(), cwd)
+
+    def test_run_command_check(self):
+        output = run_command(cmd=["exit 3"], cwd=self.dirs[0], shell=True, check=False)
+        self.assertEqual(output.returncode, 3)
+        with self.assertRaises(subprocess.CalledProcessError):
+            run_command(cmd=["false"], cwd=self.dirs[0], check=True)
+
+    def test_run_command_streaming(self):
+        lines = []
+        output = run_command(
+            cmd=["seq 1 10000; echo done >&2"],
+            cwd=self.dirs[0],
+            shell=True,
+            check=True,
+            on_output=lambda stream, line: lines.append((stream, line)),
+            max_lines=3,
+        )
+        self.assertEqual(
+            output, RunCommandOutput(0, stdout=["9998", "9999", "10000"], stderr=["done"])
+        )
+        self.assertEqual(len(lines), 10001)
+        self.assertEqual(
+            [line for stream, line in lines if stream == "stdout"],
+            [str(i) for i in range(1, 10001)],
+        )
+        self.assertIn(("stderr", "done"), lines)
+
+    def test_run_command_streaming_check(self):
+        with self.assertRaises(subprocess.CalledProcessError) as context:
+            run_command(
+                cmd=["seq 1 100; exit 2"], cwd=self.dirs[0], shell=True, check=True, max_lines=2
+            )
+        self.assertEqual(context.exception.returncode, 2)
+        self.assertEqual(context.exception.output, "99\n100")
+
+    def test_run_command_streaming_matches_buffered(self):
+        for cmd in ["true", "echo; echo a; echo; echo b; echo"]:
+            buffered = run_command(cmd=[cmd], cwd=self.dirs[0], shell=True, check=True)
+            streamed = run_command(
+                cmd=[cmd], cwd=self.dirs[0], shell=True, check=True, max_lines=10
+            )
+            self.assertEqual(streamed, buffered, cmd)
+        self.assertEqual(streamed.stdout, ["a", "", "b"])
+        self.assertEqual(buffered.stderr, [""])
+
+    def test_run_command_async(self):
+        async def run_all():
+            return await asyncio.gather(
+                *[run_command_async(cmd=["pwd"], cwd=d, check=True) for d in self.dirs],
+                run_command_async(
+                    cmd=["echo out; echo err >&2"], cwd=self.dirs[0], shell=True, check=True
+                ),
+            )
+
+        *outputs, shell_output = asyncio.run(run_all())
+        self.assertEqual(
+            outputs, [RunCommandOutput(returncode=0, stdout=[d], stderr=[""]) for d in self.dirs]
+        )
+        self.assertEqual(
+            shell_output, RunCommandOutput(returncode=0, stdout=["out"], stderr=["err"])
+        )
+
+    def test_run_command_async_check(self):
+        with self.assertRaises(subprocess.CalledProcessError):
+            asyncio.run(run_command_async(cmd=["false"], cwd=self.dirs[0], check=True))
+        output = asyncio.run(run_command_async(cmd=["false"], cwd=self.dirs[0], check=False))
+        self.assertEqual(output.returncode, 1)
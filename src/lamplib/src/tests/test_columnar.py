@@ -0,0 +1,123 @@
+import json
+import os
+import tempfile
+import unittest
+import zipfile
+
+import numpy as np
+from click.testing import CliRunner
+
+from genny import cli, metrics
+from genny.metrics import ftdc
+from tests.test_ftdc import _samples, _write_ftdc
+
+
+class ColumnarTests(unittest.TestCase):
+    def setUp(self):
+        self._tmpdir = tempfile.TemporaryDirectory()
+        self.dir = self._tmpdir.name
+        self.ftdc_path = os.path.join(self.dir, "Actor.Op.ftdc")
+        _write_ftdc(self.ftdc_path, [_samples(3000, seed=1), _samples(10, seed=2, start=3000)])
+
+    def tearDown(self):
+        self._tmpdir.cleanup()
+
+    def _assert_same(self, actual, expected):
+        self.assertEqual(list(actual), list(expected))
+        for name in expected:
+            self.assertEqual(actual[name].dtype, np.int64)
+            np.testing.assert_array_equal(actual[name], expected[name], name)
+
+    def test_round_trip(self):
+        expected = metrics.read_columns(self.ftdc_path)
+        for compress in [False, True]:
+            out_path = os.path.join(self.dir, f"out-{compress}.npz")
+            self.assertEqual(metrics.export_ftdc(self.ftdc_path, out_path, compress=compress), 3010)
+            self._assert_same(metrics.read_columnar(out_path), expected)
+
+            opened = metrics.ColumnarFile(out_path)
+            self.assertEqual(opened.rows, 3010)
+            self.assertEqual(opened.metadata["source"], "Actor.Op.ftdc")
+            self.assertEqual(opened.metadata["ftdc_metadata"], [{"name": "TestActor"}])
+            self.assertEqual(isinstance(opened.deltas("timers.dur"), np.memmap), not compress)
+
+        only = metrics.read_columnar(out_path, names=["counters.ops"])
+        self.assertEqual(list(only), ["counters.ops"])
+
+    def test_format(self):
+        out_path = os.path.join(self.dir, "out.npz")
+        metrics.write_columnar(
+            {"a": np.array([5, 7, 7, 10]), "b": np.array([np.iinfo(np.int64).max, -1, 0, 1])},
+            out_path,
+        )
+        with zipfile.ZipFile(out_path) as archive:
+            names = archive.namelist()
+            header = json.loads(archive.read(names[0]))
+        self.assertEqual(names, ["metadata.json", "a.npy", "b.npy"])
+        self.assertEqual(header["columns"], ["a", "b"])
+        self.assertEqual(header["encoding"], "delta")
+
+        # Plain numpy sees the deltas; differences that overflow wrap around.
+        with np.load(out_path) as npz:
+            self.assertEqual(npz["a"].tolist(), [5, 2, 0, 3])
+        self.assertEqual(
+            metrics.read_columnar(out_path)["b"].tolist(), [np.iinfo(np.int64).max, -1, 0, 1]
+        )
+
+        metrics.write_columnar({"empty": np.array([], dtype=np.int64)}, out_path)
+        self.assertEqual(metrics.read_columnar(out_path)["empty"].tolist(), [])
+
+        with self.assertRaises(ValueError):
+            metrics.write_columnar({"a": np.arange(2), "b": np.arange(3)}, out_path)
+
+    def test_table(self):
+        records = [
+            {"state": "RUNNING", "lag": 1.5, "n": -1, "done": False},
+            {"state": "RUNNING", "lag": 2, "n": 4},
+            {"state": None, "lag": 0.25, "n": float("nan"), "done": True},
+            {"state": "COMMITTED", "lag": float("inf"), "n": 3.0, "done": True},
+        ]
+        columns, metadata = metrics.encode_table(records)
+        self.assertEqual(
+            list(columns),
+            ["done", "valid.done", "lag", "valid.lag", "n", "valid.n", "state", "valid.state"],
+        )
+        self.assertEqual(metadata["strings"], {"state": ["RUNNING", "COMMITTED"]})
+        self.assertEqual(metadata["scales"], {"lag": metrics.columnar.FLOAT_SCALE})
+        self.assertEqual(columns["n"], [-1, 4, 0, 3])
+        self.assertEqual(columns["valid.n"], [1, 1, 0, 1])
+
+        out_path = os.path.join(self.dir, "table.npz")
+        metrics.write_columnar(columns, out_path, metadata=metadata)
+        read = metrics.read_table(out_path)
+        self.assertEqual(list(read), ["done", "lag", "n", "state"])
+        # NaN and infinity are stored as missing, and a reported -1 is kept apart from them.
+        np.testing.assert_array_equal(read["lag"], [1.5, 2, 0.25, np.nan])
+        np.testing.assert_array_equal(read["n"], [-1, 4, np.nan, 3])
+        np.testing.assert_array_equal(read["done"], [0, np.nan, 1, 1])
+        np.testing.assert_array_equal(read["state"], [0, 0, np.nan, 1])
+
+        # Columns without table metadata are read as they are.
+        metrics.write_columnar({"a": np.array([5, 7])}, out_path)
+        self.assertEqual(metrics.read_table(out_path)["a"].tolist(), [5, 7])
+
+    def test_not_columnar(self):
+        out_path = os.path.join(self.dir, "other.npz")
+        with zipfile.ZipFile(out_path, "w") as archive:
+            archive.writestr("metadata.json", json.dumps({"format": "something else"}))
+        with self.assertRaises(ftdc.FTDCError):
+            metrics.ColumnarFile(out_path)
+
+    def test_export_directory(self):
+        nested = os.path.join(self.dir, "Workload", "Other.Op.ftdc")
+        os.makedirs(os.path.dirname(nested))
+        _write_ftdc(nested, [_samples(5, seed=3)])
+        out_dir = os.path.join(self.dir, "npz")
+
+        result = CliRunner().invoke(cli.cli, ["export", self.dir, "--format", "npz", "-o", out_dir])
+        self.assertEqual(result.exit_code, 0, result.output)
+        self._assert_same(
+            metrics.read_metrics(os.path.join(out_dir, "Workload", "Other.Op.npz")),
+            metrics.read_metrics(nested),
+        )
+        self.assertTrue(os.path.exists(os.path.join(out_dir, "Actor.Op.npz")))
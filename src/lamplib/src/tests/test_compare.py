@@ -0,0 +1,161 @@
+import datetime
+import json
+import os
+import tempfile
+import unittest
+
+import numpy as np
+from click.testing import CliRunner
+
+from genny import cli, metrics
+from genny.tasks import compare
+from tests.test_ftdc import _EPOCH, _write_ftdc
+from tests.test_timeline import _columns
+
+_EPOCH_MS = 1600000000000
+
+
+def _run(rng, seconds=30, rate=100, latency_ms=5.0):
+    """Columns of an actor doing about rate ops/s with exponential latencies."""
+    n = seconds * rate
+    ts = _EPOCH_MS + np.sort(rng.integers(0, seconds * 1000, n))
+    return _columns(ts, np.maximum(1, rng.exponential(latency_ms, n)).astype(np.int64))
+
+
+class MannWhitneyTests(unittest.TestCase):
+    def test_separated(self):
+        u, p = metrics.mann_whitney_u(np.arange(1, 6), np.arange(6, 11))
+        self.assertEqual(u, 0.0)
+        self.assertAlmostEqual(p, 0.01219, places=4)
+
+    def test_matches_brute_force_u(self):
+        rng = np.random.default_rng(1)
+        a, b = rng.integers(0, 20, 300), rng.integers(0, 20, 200)
+        expected = (a[:, None] > b[None, :]).sum() + 0.5 * (a[:, None] == b[None, :]).sum()
+        u, p = metrics.mann_whitney_u(a, b)
+        self.assertEqual(u, expected)
+        self.assertGreater(p, 0.01)
+        self.assertEqual(metrics.mann_whitney_u([3, 3], [3, 3]), (2.0, 1.0))
+
+
+class CompareActorTests(unittest.TestCase):
+    def _by_metric(self, deltas):
+        return {delta.metric: delta for delta in deltas}
+
+    def test_no_change(self):
+        rng = np.random.default_rng(2)
+        deltas = self._by_metric(metrics.compare_actor("A", _run(rng), _run(rng)))
+        self.assertEqual(
+            list(deltas), ["ops per second", "latency p50", "latency p90", "latency p99"]
+        )
+        self.assertFalse(any(delta.regression for delta in deltas.values()))
+        ops = deltas["ops per second"]
+        self.assertLess(ops.ci_low, 0)
+        self.assertGreater(ops.ci_high, 0)
+
+    def test_regressions(self):
+        rng = np.random.default_rng(3)
+        baseline = _run(rng)
+        slower = _run(rng, rate=70, latency_ms=8.0)
+        deltas = self._by_metric(metrics.compare_actor("A", baseline, slower))
+        self.assertTrue(deltas["ops per second"].regression)
+        self.assertAlmostEqual(deltas["ops per second"].change, -0.3, delta=0.05)
+        self.assertTrue(deltas["latency p90"].regression)
+        self.assertLess(deltas["latency p90"].p_value, 0.001)
+
+        # Getting faster isn't a regression.
+        deltas = self._by_metric(metrics.compare_actor("A", slower, baseline))
+        self.assertFalse(any(delta.regression for delta in deltas.values()))
+
+    def test_short_runs(self):
+        rng = np.random.default_rng(4)
+        deltas = self._by_metric(
+            metrics.compare_actor("A", _run(rng, seconds=2), _run(rng, seconds=2, rate=10))
+        )
+        self.assertIsNone(deltas["ops per second"].ci_low)
+        self.assertFalse(deltas["ops per second"].regression)
+
+
+class CompareTaskTests(unittest.TestCase):
+    def setUp(self):
+        self._tmpdir = tempfile.TemporaryDirectory()
+        self.workspace = self._tmpdir.name
+        self.candidate = os.path.join(self.workspace, "build", "WorkloadOutput", "CedarMetrics")
+
+    def tearDown(self):
+        self._tmpdir.cleanup()
+
+    def _write_run(self, path, actors):
+        os.makedirs(path)
+        for name, columns in actors.items():
+            samples = [
+                {
+                    "ts": _EPOCH + datetime.timedelta(milliseconds=int(ts)),
+                    "counters": {"ops": int(ops)},
+                    "timers": {"dur": int(dur)},
+                }
+                for ts, ops, dur in zip(
+                    columns["ts"], columns["counters.ops"], columns["timers.dur"]
+                )
+            ]
+            _write_ftdc(os.path.join(path, name + ".ftdc"), [samples])
+
+    def test_cli(self):
+        rng = np.random.default_rng(5)
+        old = self.candidate + "-2021-01-01T000000Z-0123abcd"
+        older = self.candidate + "-2020-01-01T000000Z-4567cdef"
+        self._write_run(older, {"Actor.Op": _run(rng, rate=1000)})
+        self._write_run(old, {"Actor.Op": _run(rng), "Gone.Op": _run(rng)})
+        self._write_run(self.candidate, {"Actor.Op": _run(rng, rate=60), "New.Op": _run(rng)})
+
+        self.assertEqual(
+            compare.previous_actor_files(self.candidate),
+            {
+                "Actor.Op": os.path.join(old, "Actor.Op.ftdc"),
+                "Gone.Op": os.path.join(old, "Gone.Op.ftdc"),
+            },
+        )
+        self.assertEqual(sorted(compare.actor_files(old)), ["Actor.Op", "Gone.Op"])
+
+        # Exported actors are read from their .npz, and other columnar files aren't actors.
+        gone = os.path.join(old, "Gone.Op.npz")
+        metrics.export_ftdc(os.path.join(old, "Gone.Op.ftdc"), gone)
+        metrics.write_columnar({"ts": [1, 2]}, os.path.join(old, "MongosyncProgress.npz"))
+        self.assertEqual(
+            compare.actor_files(old),
+            {"Actor.Op": os.path.join(old, "Actor.Op.ftdc"), "Gone.Op": gone},
+        )
+
+        summary = os.path.join(self.workspace, "summary.json")
+        result = CliRunner().invoke(cli.cli, ["compare", old, self.candidate, "--summary", summary])
+        self.assertEqual(result.exit_code, 1, result.output)
+        with open(summary) as f:
+            written = json.load(f)
+        self.assertEqual({row["actor"] for row in written}, {"Actor.Op"})
+        self.assertTrue(written[0]["regression"])
+
+        # The same run compared to itself has no regressions.
+        result = CliRunner().invoke(cli.cli, ["compare", old, old])
+        self.assertEqual(result.exit_code, 0, result.output)
+
+    def test_daemon_runs(self):
+        # With a shared Poplar daemon each workload's runs are moved aside separately.
+        rng = np.random.default_rng(6)
+        self._write_run(
+            os.path.join(self.candidate + "-2021-01-01T000000Z-0123abcd", "Slow"),
+            {"Actor.Op": _run(rng)},
+        )
+        self._write_run(
+            os.path.join(self.candidate + "-2021-01-02T000000Z-4567cdef", "Fast"),
+            {"Actor.Op": _run(rng)},
+        )
+        self._write_run(os.path.join(self.candidate, "Slow"), {"Actor.Op": _run(rng, rate=60)})
+        self._write_run(os.path.join(self.candidate, "Fast"), {"Actor.Op": _run(rng)})
+
+        self.assertEqual(
+            sorted(compare.actor_files(self.candidate)), ["Fast/Actor.Op", "Slow/Actor.Op"]
+        )
+        results = compare.compare(None, self.candidate)
+        self.assertEqual({result.actor for result in results}, {"Fast/Actor.Op", "Slow/Actor.Op"})
+        regressed = {result.actor for result in results if result.regression}
+        self.assertEqual(regressed, {"Slow/Actor.Op"})
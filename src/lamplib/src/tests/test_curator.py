@@ -0,0 +1,196 @@
+import os
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+
+from genny import curator
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("localhost", 0))
+        return sock.getsockname()[1]
+
+
+class WaitForPoplarTests(unittest.TestCase):
+    def setUp(self):
+        # Stands in for the Poplar process; only poll() and returncode are used.
+        self.process = subprocess.Popen([sys.executable, "-c", "import time; time.sleep(60)"])
+        self.port = _free_port()
+
+    def tearDown(self):
+        self.process.kill()
+        self.process.wait()
+
+    def test_waits_until_listening(self):
+        server = socket.socket()
+        server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+
+        def listen_later():
+            time.sleep(0.2)
+            server.bind(("localhost", self.port))
+            server.listen()
+
+        thread = threading.Thread(target=listen_later)
+        thread.start()
+        try:
+            seconds = curator._wait_for_poplar(self.process, port=self.port, timeout=10)
+        finally:
+            thread.join()
+            server.close()
+        self.assertGreaterEqual(seconds, 0.2)
+        self.assertLess(seconds, 5)
+
+    def test_timeout(self):
+        start = time.monotonic()
+        with self.assertRaisesRegex(OSError, "did not start listening"):
+            curator._wait_for_poplar(self.process, port=self.port, timeout=0.3)
+        self.assertLess(time.monotonic() - start, 2)
+
+    def test_process_exits(self):
+        self.process.kill()
+        self.process.wait()
+        with self.assertRaisesRegex(OSError, "exited with code"):
+            curator._wait_for_poplar(self.process, port=self.port, timeout=10)
+
+    def test_port_taken(self):
+        curator._check_port_free(port=self.port)
+        with socket.socket() as server:
+            server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            server.bind(("localhost", self.port))
+            server.listen()
+            with self.assertRaisesRegex(OSError, "already listening"):
+                curator._check_port_free(port=self.port)
+
+            # Someone else answering doesn't make a Poplar that exits meanwhile look ready.
+            exiting = mock.Mock(returncode=1)
+            exiting.poll.side_effect = [None, 1, 1]
+            with self.assertRaisesRegex(OSError, "exited with code 1"):
+                curator._wait_for_poplar(exiting, port=self.port, timeout=10)
+
+
+_FAKE_CURATOR = """#!{python}
+import os
+import signal
+import socket
+import sys
+
+signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+server = socket.socket()
+server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+server.bind(("localhost", int(os.environ["FAKE_POPLAR_PORT"])))
+server.listen()
+while True:
+    server.accept()[0].close()
+"""
+
+
+class PoplarDaemonTests(unittest.TestCase):
+    def setUp(self):
+        self._tmpdir = tempfile.TemporaryDirectory()
+        self.workspace_root = self._tmpdir.name
+        curator_path = os.path.join(self.workspace_root, "bin", "curator")
+        os.makedirs(os.path.dirname(curator_path))
+        with open(curator_path, "w") as f:
+            f.write(_FAKE_CURATOR.format(python=sys.executable))
+        os.chmod(curator_path, 0o755)
+
+        port = _free_port()
+        os.environ["FAKE_POPLAR_PORT"] = str(port)
+        # Also for the PoplarDaemon that poplar_grpc looks for.
+        self._port = mock.patch.object(curator.PoplarDaemon, "port", port)
+        self._port.start()
+        self.daemon = curator.PoplarDaemon(self.workspace_root, self.workspace_root)
+
+    def tearDown(self):
+        self.daemon.stop()
+        self._port.stop()
+        del os.environ["FAKE_POPLAR_PORT"]
+        self._tmpdir.cleanup()
+
+    def test_start_stop(self):
+        self.assertIsNone(self.daemon.pid())
+        pid = self.daemon.start(startup_timeout=10)
+        self.assertEqual(self.daemon.pid(), pid)
+        # Starting again reuses the running daemon.
+        self.assertEqual(self.daemon.start(startup_timeout=10), pid)
+        self.assertEqual(curator.PoplarDaemon(self.workspace_root).pid(), pid)
+
+        self.assertTrue(self.daemon.stop())
+        self.assertIsNone(self.daemon.pid())
+        self.assertFalse(os.path.exists(self.daemon.pid_file))
+        self.assertFalse(self.daemon.stop())
+
+    def test_stale_pid_file(self):
+        # The daemon's pid has been reused by something other than Poplar.
+        other = subprocess.Popen(["sleep", "60"])
+        try:
+            os.makedirs(os.path.dirname(self.daemon.pid_file))
+            with open(self.daemon.pid_file, "w") as f:
+                f.write(str(other.pid))
+            self.assertIsNone(self.daemon.pid())
+            self.assertFalse(os.path.exists(self.daemon.pid_file))
+            self.assertIsNone(other.poll())
+        finally:
+            other.kill()
+            other.wait()
+
+        # A Poplar that stopped listening isn't treated as running either.
+        pid = self.daemon.start(startup_timeout=10)
+        with mock.patch.object(curator.PoplarDaemon, "port", _free_port()):
+            self.assertIsNone(curator.PoplarDaemon(self.workspace_root).pid())
+        self.assertFalse(os.path.exists(self.daemon.pid_file))
+        os.kill(pid, signal.SIGTERM)
+        os.waitpid(pid, 0)
+
+    def test_poplar_grpc_reuses_daemon(self):
+        pid = self.daemon.start(startup_timeout=10)
+        cedar_metrics = os.path.join(self.workspace_root, "build", "WorkloadOutput", "CedarMetrics")
+        metrics_path = os.path.join(cedar_metrics, "MyWorkload")
+        os.makedirs(metrics_path)
+        other_run = os.path.join(cedar_metrics, "OtherWorkload")
+        os.makedirs(other_run)
+
+        with curator.poplar_grpc(
+            cleanup_metrics=True,
+            workspace_root=self.workspace_root,
+            genny_repo_root=self.workspace_root,
+            run_name="MyWorkload",
+        ) as run_metrics_path:
+            self.assertEqual(run_metrics_path, metrics_path)
+            self.assertTrue(os.path.isdir(metrics_path))
+        self.assertEqual(self.daemon.pid(), pid)
+
+        # The previous run's metrics were moved out of CedarMetrics, leaving other runs.
+        self.assertEqual(sorted(os.listdir(cedar_metrics)), ["MyWorkload", "OtherWorkload"])
+        (previous,) = curator.previous_metrics(metrics_path)
+        self.assertEqual(os.path.basename(previous), "MyWorkload")
+        self.assertRegex(os.path.dirname(previous), r"CedarMetrics-.*-[0-9a-f]{8}$")
+        self.assertEqual(curator.previous_metrics(other_run), [])
+
+    def test_poplar_grpc_without_run_name(self):
+        self.daemon.start(startup_timeout=10)
+        cedar_metrics = os.path.join(self.workspace_root, "build", "WorkloadOutput", "CedarMetrics")
+        other_run = os.path.join(cedar_metrics, "OtherWorkload")
+        os.makedirs(other_run)
+        with open(os.path.join(cedar_metrics, "Actor.Op.ftdc"), "w"):
+            pass
+
+        with curator.poplar_grpc(
+            cleanup_metrics=True,
+            workspace_root=self.workspace_root,
+            genny_repo_root=self.workspace_root,
+        ) as run_metrics_path:
+            # The run writes to CedarMetrics itself, as without a daemon.
+            self.assertIsNone(run_metrics_path)
+
+        # Only the files directly in CedarMetrics were moved aside.
+        self.assertEqual(os.listdir(cedar_metrics), ["OtherWorkload"])
+        (previous,) = curator.previous_metrics(cedar_metrics)
+        self.assertEqual(os.listdir(previous), ["Actor.Op.ftdc"])
@@ -0,0 +1,199 @@
+import datetime
+import io
+import os
+import random
+import struct
+import tempfile
+import unittest
+import zlib
+
+import numpy as np
+
+from genny import metrics
+from genny.metrics import ftdc
+
+_EPOCH = datetime.datetime(1970, 1, 1)
+
+
+#
+# A minimal FTDC writer, following the encoding used by mongod and Poplar.
+#
+
+
+def _bson_element(name: str, value) -> bytes:
+    key = name.encode() + b"\x00"
+    if isinstance(value, bool):
+        return b"\x08" + key + (b"\x01" if value else b"\x00")
+    if isinstance(value, int):
+        return b"\x12" + key + struct.pack("<q", value)
+    if isinstance(value, float):
+        return b"\x01" + key + struct.pack("<d", value)
+    if isinstance(value, datetime.datetime):
+        millis = (value - _EPOCH) // datetime.timedelta(milliseconds=1)
+        return b"\x09" + key + struct.pack("<q", millis)
+    if isinstance(value, str):
+        encoded = value.encode() + b"\x00"
+        return b"\x02" + key + struct.pack("<i", len(encoded)) + encoded
+    if isinstance(value, bytes):
+        return b"\x05" + key + struct.pack("<i", len(value)) + b"\x00" + value
+    if isinstance(value, dict):
+        return b"\x03" + key + _bson(value)
+    raise TypeError(value)
+
+
+def _bson(doc: dict) -> bytes:
+    body = b"".join(_bson_element(name, value) for name, value in doc.items())
+    return struct.pack("<i", len(body) + 5) + body + b"\x00"
+
+
+def _varint(value: int) -> bytes:
+    out = bytearray()
+    while True:
+        byte = value & 0x7F
+        value >>= 7
+        if value:
+            out.append(byte | 0x80)
+        else:
+            out.append(byte)
+            return bytes(out)
+
+
+def _flatten(doc: dict, prefix=""):
+    for key, value in doc.items():
+        if isinstance(value, dict):
+            yield from _flatten(value, prefix + key + ".")
+        elif isinstance(value, datetime.datetime):
+            yield prefix + key, (value - _EPOCH) // datetime.timedelta(milliseconds=1)
+        elif isinstance(value, (bool, int, float)):
+            yield prefix + key, int(value)
+
+
+def _chunk_data(samples):
+    columns = [[value for _, value in _flatten(sample)] for sample in samples]
+    n_metrics, n_deltas = len(columns[0]), len(samples) - 1
+    encoded = bytearray()
+    zeros = 0
+    for metric in range(n_metrics):
+        for sample in range(1, len(samples)):
+            delta = (columns[sample][metric] - columns[sample - 1][metric]) & (2 ** 64 - 1)
+            if delta == 0:
+                zeros += 1
+                continue
+            if zeros:
+                encoded += _varint(0) + _varint(zeros - 1)
+                zeros = 0
+            encoded += _varint(delta)
+    if zeros:
+        encoded += _varint(0) + _varint(zeros - 1)
+    payload = _bson(samples[0]) + struct.pack("<II", n_metrics, n_deltas) + bytes(encoded)
+    return struct.pack("<I", len(payload)) + zlib.compress(payload)
+
+
+def _write_ftdc(path: str, chunks) -> None:
+    with open(path, "wb") as f:
+        f.write(_bson({"_id": _EPOCH, "type": 0, "doc": {"name": "TestActor"}}))
+        for samples in chunks:
+            f.write(_bson({"_id": samples[0]["ts"], "type": 1, "data": _chunk_data(samples)}))
+
+
+def _samples(n: int, seed: int, start: int = 0):
+    rng = random.Random(seed)
+    ops = dur = 0
+    out = []
+    for i in range(start, start + n):
+        # Long stretches without any change exercise the zero run-length encoding.
+        if rng.random() < 0.7:
+            ops += 1
+            dur += rng.randint(1, 10 ** 9)
+        out.append(
+            {
+                "ts": _EPOCH + datetime.timedelta(seconds=1600000000, milliseconds=i),
+                "id": 7,
+                "counters": {"n": i, "ops": ops, "errors": 0},
+                "timers": {"dur": dur, "total": -dur},
+                "gauges": {"workers": rng.choice([0, 2 ** 62, -(2 ** 62)]), "failed": i % 5 == 0},
+                "mean": rng.random() * 100,
+                "note": "strings are not metrics",
+            }
+        )
+    return out
+
+
+class FTDCTests(unittest.TestCase):
+    def setUp(self):
+        self._tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self._tmpdir.name, "TestActor.ftdc")
+
+    def tearDown(self):
+        self._tmpdir.cleanup()
+
+    def test_read_columns(self):
+        chunks = [_samples(1000, seed=1), _samples(1, seed=2, start=1000), _samples(77, 3, 1001)]
+        _write_ftdc(self.path, chunks)
+
+        samples = [sample for chunk in chunks for sample in chunk]
+        expected = {}
+        for sample in samples:
+            for name, value in _flatten(sample):
+                expected.setdefault(name, []).append(value)
+
+        columns = metrics.read_columns(self.path)
+        self.assertEqual(list(columns), list(expected))
+        for name, values in expected.items():
+            self.assertEqual(columns[name].dtype, np.int64)
+            np.testing.assert_array_equal(columns[name], np.array(values, dtype=np.int64), name)
+
+        only = metrics.read_columns(self.path, names=["timers.dur"])
+        self.assertEqual(list(only), ["timers.dur"])
+
+    def test_read_chunks(self):
+        _write_ftdc(self.path, [_samples(10, seed=1), _samples(5, seed=2, start=10)])
+        chunks = list(metrics.read_chunks(self.path))
+        self.assertEqual([chunk.n_samples for chunk in chunks], [10, 5])
+        self.assertEqual(
+            chunks[1].start, _EPOCH + datetime.timedelta(seconds=1600000000, milliseconds=10)
+        )
+        self.assertEqual(metrics.read_metadata(self.path), [{"name": "TestActor"}])
+
+    def test_write_csv(self):
+        samples = _samples(3, seed=1)
+        _write_ftdc(self.path, [samples])
+        out = io.StringIO()
+        self.assertEqual(metrics.write_csv(self.path, out), 3)
+
+        lines = out.getvalue().splitlines()
+        self.assertEqual(
+            lines[0],
+            "ts,id,counters.n,counters.ops,counters.errors,timers.dur,timers.total,"
+            "gauges.workers,gauges.failed,mean",
+        )
+        self.assertEqual(
+            lines[1:], [",".join(str(value) for _, value in _flatten(s)) for s in samples]
+        )
+
+    def test_write_csv_matches_curator(self):
+        # data/Poplar.Op.ftdc follows Poplar's layout for genny's events: no metadata
+        # document, an int32 chunk type, and several chunks. data/Poplar.Op.csv is what
+        # `curator ftdc export csv --input Poplar.Op.ftdc` is expected to print for it.
+        data = os.path.join(os.path.dirname(__file__), "data")
+        out = io.StringIO()
+        self.assertEqual(metrics.write_csv(os.path.join(data, "Poplar.Op.ftdc"), out), 40)
+        with open(os.path.join(data, "Poplar.Op.csv")) as f:
+            self.assertEqual(out.getvalue(), f.read())
+
+    def test_expand_zero_runs(self):
+        def expand(varints, n):
+            return ftdc._expand_zero_runs(np.array(varints, dtype=np.uint64), n).tolist()
+
+        # 0 followed by a count of 3 more zeros.
+        self.assertEqual(expand([0, 3, 7], 5), [0, 0, 0, 0, 7])
+        # Counts of 0 look like zero deltas.
+        self.assertEqual(expand([0, 0, 0, 0, 5], 3), [0, 0, 5])
+        self.assertEqual(expand([4, 0, 1], 3), [4, 0, 0])
+        with self.assertRaises(ftdc.FTDCError):
+            expand([1, 2], 3)
+
+    def test_decode_varints(self):
+        values = [0, 1, 127, 128, 300, 2 ** 35 + 5, 2 ** 64 - 1]
+        buf = np.frombuffer(b"".join(_varint(v) for v in values), dtype=np.uint8)
+        self.assertEqual(ftdc._decode_varints(buf).tolist(), values)
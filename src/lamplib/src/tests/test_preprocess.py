@@ -440,6 +440,44 @@ Actors:
 """
         self._assertYaml(yaml_input, expected)
 
+    def test_phase_file_cache(self):
+        cache = preprocess._PhaseFileCache()
+
+        def parse(repeat):
+            yaml_input = f"""SchemaVersion: 2018-07-01
+Phases:
+- LoadConfig:
+    Path: src/testlib/configs/Good.yml
+    Parameters:
+      Repeat: {repeat}
+"""
+            parser = preprocess._WorkloadParser(phase_file_cache=cache)
+            return parser.parse(
+                yaml_input=yaml_input,
+                default_uri=DEFAULT_URI,
+                source=preprocess._WorkloadParser.YamlSource.String,
+                path=os.getcwd(),
+            )
+
+        # Cached documents are copied on read so parameters are substituted per load.
+        self.assertEqual(parse(2)["Phases"], [{"Repeat": 2, "Mode": "NoException"}])
+        self.assertEqual(parse(3)["Phases"], [{"Repeat": 3, "Mode": "NoException"}])
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+    def test_phase_file_cache_invalidation(self):
+        cache = preprocess._PhaseFileCache()
+        with tempfile.TemporaryDirectory() as tmpdirname:
+            path = os.path.join(tmpdirname, "Phase.yml")
+            with open(path, "w") as fp:
+                fp.write("SchemaVersion: 2018-07-01\nRepeat: 1\n")
+            self.assertEqual(cache.load(path)["Repeat"], 1)
+
+            with open(path, "w") as fp:
+                fp.write("SchemaVersion: 2018-07-01\nRepeat: 10\n")
+            self.assertEqual(cache.load(path)["Repeat"], 10)
+            self.assertEqual(cache.load(path)["Repeat"], 10)
+        self.assertEqual((cache.hits, cache.misses), (1, 2))
+
     def test_load_config_override(self):
 
         yaml_input = """
@@ -571,6 +609,178 @@ HighLevelKey:
         output.seek(0)
         self.assertEqual(output.read(), expected)
 
+    def test_preprocess_output_is_plain_yaml(self):
+        yaml_input = """SchemaVersion: 2018-07-01
+Strings: ["yes", "1e3", "10", plain]
+Actors:
+- Name: Actor
+  Type: Fails
+  Phases:
+    OnlyActiveInPhases:
+      Active: [1]
+      NopInPhasesUpTo: 2
+      PhaseConfig:
+        Repeat: 1
+"""
+        with tempfile.TemporaryDirectory() as tmpdirname:
+            workload_path = os.path.join(tmpdirname, "workload.yml")
+            with open(workload_path, "w") as fp:
+                fp.write(yaml_input)
+
+            output = StringIO()
+            preprocess.preprocess(
+                workload_path=workload_path, smoke=False, default_uri="FakeUri", output_file=output,
+            )
+
+        # Nodes shared by the preprocessor are written out in full rather than as aliases.
+        expected = """# This file was generated by running the Genny preprocessor on the workload workload.yml
+Clients:
+  Default:
+    QueryOptions:
+      maxPoolSize: 100
+    URI: FakeUri
+SchemaVersion: '2018-07-01'
+Strings:
+- 'yes'
+- '1e3'
+- '10'
+- plain
+Actors:
+- Name: Actor
+  Type: Fails
+  Phases:
+  - Nop: true
+  - Repeat: 1
+  - Nop: true
+- Name: PhaseTimingRecorder
+  Type: PhaseTimingRecorder
+  Threads: 1
+"""
+        output.seek(0)
+        self.assertEqual(output.read(), expected)
+
+    def test_preprocess_metrics_path(self):
+        def metrics(yaml_input):
+            with tempfile.TemporaryDirectory() as tmpdirname:
+                workload_path = os.path.join(tmpdirname, "workload.yml")
+                with open(workload_path, "w") as fp:
+                    fp.write(yaml_input)
+                output = StringIO()
+                preprocess.preprocess(
+                    workload_path=workload_path,
+                    smoke=False,
+                    default_uri="FakeUri",
+                    output_file=output,
+                    metrics_path="build/metrics/run",
+                )
+            return yaml.safe_load(output.getvalue())["Metrics"]
+
+        self.assertDictEqual(metrics("Actors: []\n"), {"Path": "build/metrics/run"})
+        self.assertDictEqual(
+            metrics("Metrics:\n  Format: csv-ftdc\n"),
+            {"Format": "csv-ftdc", "Path": "build/metrics/run"},
+        )
+        # An explicitly configured path wins.
+        self.assertDictEqual(metrics("Metrics:\n  Path: mine\n"), {"Path": "mine"})
+
+    def test_evaluate_all(self):
+        good = """SchemaVersion: 2018-07-01
+Actors:
+- Name: Actor
+  Type: Fails
+  Phases:
+  - Repeat: 1
+"""
+        bad = """SchemaVersion: 2018-07-01
+Actors:
+- ActorFromTemplate:
+    TemplateName: Missing
+    TemplateParameters: {}
+"""
+        with tempfile.TemporaryDirectory() as tmpdirname:
+            input_dir = os.path.join(tmpdirname, "workloads")
+            output_dir = os.path.join(tmpdirname, "output")
+            for name, conts in [("a/Good.yml", good), ("b/c/Good.yml", good), ("Bad.yml", bad)]:
+                path = os.path.join(input_dir, name)
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                with open(path, "w") as fp:
+                    fp.write(conts)
+
+            results = preprocess.evaluate_all(
+                workloads=input_dir,
+                default_uri="FakeUri",
+                smoke=False,
+                output_dir=output_dir,
+                jobs=2,
+            )
+
+            errors = {os.path.relpath(r.workload_path, input_dir): r.error for r in results}
+            self.assertEqual(errors["a/Good.yml"], None)
+            self.assertEqual(errors["b/c/Good.yml"], None)
+            self.assertIn("ParseException", errors["Bad.yml"])
+
+            self.assertTrue(os.path.isfile(os.path.join(output_dir, "a", "Good.yml")))
+            self.assertTrue(os.path.isfile(os.path.join(output_dir, "b", "c", "Good.yml")))
+            self.assertFalse(os.path.exists(os.path.join(output_dir, "Bad.yml")))
+
+            # An output that can't be opened is reported, not hidden by the cleanup.
+            blocked = os.path.join(output_dir, "Blocked.yml")
+            os.makedirs(blocked)
+            result = preprocess._evaluate_one(
+                (os.path.join(input_dir, "a", "Good.yml"), blocked, "FakeUri", False, None)
+            )
+            self.assertIn("IsADirectoryError", result.error)
+            self.assertTrue(os.path.isdir(blocked))
+
+    def test_preprocess_cached(self):
+        workload = """SchemaVersion: 2018-07-01
+Actors:
+- Name: Actor
+  Type: Fails
+  Phases:
+  - LoadConfig:
+      Path: Phase.yml
+"""
+        with tempfile.TemporaryDirectory() as tmpdirname:
+            workload_path = os.path.join(tmpdirname, "Workload.yml")
+            phase_path = os.path.join(tmpdirname, "Phase.yml")
+            output_path = os.path.join(tmpdirname, "output", "Workload.yml")
+            os.makedirs(os.path.dirname(output_path))
+            with open(workload_path, "w") as fp:
+                fp.write(workload)
+
+            def write_phase(repeat):
+                with open(phase_path, "w") as fp:
+                    fp.write(f"SchemaVersion: 2018-07-01\nRepeat: {repeat}\n")
+
+            def run(default_uri="FakeUri", smoke=False):
+                return preprocess.preprocess_cached(
+                    workload_path=workload_path,
+                    smoke=smoke,
+                    default_uri=default_uri,
+                    output_path=output_path,
+                )
+
+            write_phase(1)
+            self.assertFalse(run())
+            self.assertTrue(run())
+
+            # Changing any input, including files pulled in by LoadConfig, invalidates.
+            write_phase(100)
+            self.assertFalse(run())
+            self.assertTrue(run())
+            with open(output_path) as fp:
+                self.assertIn("Repeat: 100", fp.read())
+
+            self.assertFalse(run(default_uri="OtherUri"))
+            self.assertTrue(run(default_uri="OtherUri"))
+
+            # So does tampering with the output.
+            with open(output_path, "a") as fp:
+                fp.write("Extra: true\n")
+            self.assertFalse(run(default_uri="OtherUri"))
+            self.assertTrue(run(default_uri="OtherUri"))
+
     def test_numexpr_no_dict(self):
         yaml_input = """SchemaVersion: 2018-07-01
 Test: {^NumExpr: {withExpression: "10 - 50"}}
@@ -0,0 +1,46 @@
+import unittest
+
+import numpy as np
+
+from genny.metrics import PERCENTILES, QuantileSketch
+
+
+class QuantileSketchTests(unittest.TestCase):
+    def _check(self, values, relative_error=0.005):
+        sketch = QuantileSketch(relative_error).add(values)
+        sorted_values = np.sort(values)
+        self.assertEqual(sketch.count, len(values))
+        for q in [0, 0.01, 0.25, *PERCENTILES.values(), 1]:
+            # The sketch picks the value at the nearest rank.
+            exact = sorted_values[int(round(q * (len(values) - 1)))]
+            self.assertLessEqual(
+                abs(sketch.quantile(q) - exact), abs(exact) * relative_error + 1e-12, q
+            )
+        return sketch
+
+    def test_lognormal(self):
+        rng = np.random.default_rng(1)
+        sketch = self._check(rng.lognormal(mean=13, sigma=2, size=200000))
+        # Bounded by the range of the values, not their number.
+        self.assertLess(sketch.n_buckets, 2000)
+
+    def test_zeros_and_negatives(self):
+        rng = np.random.default_rng(2)
+        values = np.concatenate([np.zeros(500), rng.normal(0, 1000, 5000), [-3.0, 7.0]])
+        self._check(values)
+
+    def test_merge(self):
+        rng = np.random.default_rng(3)
+        values = rng.exponential(50, 30000)
+        merged = QuantileSketch().add(values[:10000]).merge(QuantileSketch().add(values[10000:]))
+        whole = QuantileSketch().add(values)
+        self.assertEqual(merged.percentiles(), whole.percentiles())
+        with self.assertRaises(ValueError):
+            merged.merge(QuantileSketch(0.01))
+
+    def test_percentiles(self):
+        sketch = QuantileSketch().add(np.arange(1, 1001))
+        self.assertEqual(list(sketch.percentiles()), ["p50", "p90", "p99", "p99.9", "max"])
+        self.assertEqual(sketch.percentiles()["max"], 1000)
+        with self.assertRaises(ValueError):
+            QuantileSketch().quantile(0.5)
@@ -0,0 +1,265 @@
+import contextlib
+import importlib.util
+import io
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import unittest
+from types import SimpleNamespace
+
+import numpy as np
+
+from tests.test_ftdc import _samples, _write_ftdc
+
+_SCRIPT = os.path.join(
+    os.path.dirname(__file__),
+    "..",
+    "..",
+    "..",
+    "workloads",
+    "contrib",
+    "analysis",
+    "test_result_summary.py",
+)
+
+
+def _load_script():
+    spec = importlib.util.spec_from_file_location("test_result_summary", _SCRIPT)
+    module = importlib.util.module_from_spec(spec)
+    # So worker processes can unpickle its functions.
+    sys.modules[spec.name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+summary = _load_script()
+
+
+def _args(**kwargs):
+    defaults = {
+        "verbose": False,
+        "metrics": ["throughput", "timers.dur", "errors"],
+        "hideHistograms": False,
+        "nHistogramBuckets": 15,
+        "useCuratorExport": False,
+        "jobs": 1,
+        "maxSamples": 1000000,
+        "blockMegabytes": 4,
+        "mmapCsv": False,
+    }
+    defaults.update(kwargs)
+    return SimpleNamespace(**defaults)
+
+
+#
+# The pure-python implementation the script used before it was vectorized.
+#
+
+
+def _reference_stats(readings):
+    sorted_res = sorted(readings)
+    return {
+        "count": len(readings),
+        "average": round(statistics.mean(readings), 1),
+        "median": round(statistics.median_grouped(readings), 1),
+        "mode": round(statistics.mode(readings), 1),
+        "stddev": round(statistics.stdev(readings), 1) if len(readings) > 1 else None,
+        "[min, max]": [round(sorted_res[0], 1), round(sorted_res[-1], 1)],
+    }
+
+
+def _reference_histogram(data_points, n_buckets):
+    n_buckets = min(len(data_points), n_buckets)
+    min_v, max_v = data_points[0], data_points[-1]
+    step = (max_v - min_v) / n_buckets
+    split_points = [min_v + step * i for i in range(n_buckets)] + [data_points[-1]]
+    counts = []
+    data_idx = 0
+    for splits_idx in range(1, len(split_points)):
+        starting_idx = data_idx
+        while data_idx < len(data_points) and data_points[data_idx] < split_points[splits_idx]:
+            data_idx += 1
+        n_items = data_idx - starting_idx
+        if splits_idx == len(split_points) - 1:
+            n_items += len(data_points) - data_idx
+        counts.append(n_items)
+    return counts
+
+
+def _readings(n, seed):
+    rng = random.Random(seed)
+    # Lots of duplicates so the mode and grouped median are interesting.
+    return [
+        rng.choice([1.0, 2.5, 3.0]) if rng.random() < 0.5 else round(rng.expovariate(0.1), 3)
+        for _ in range(n)
+    ]
+
+
+def _histogram_counts(data_points, n_buckets):
+    out = io.StringIO()
+    with contextlib.redirect_stdout(out):
+        summary.print_histogram(data_points, n_buckets)
+    return [int(line.rsplit("(", 1)[1].rstrip(")")) for line in out.getvalue().splitlines()]
+
+
+class SummaryScriptTests(unittest.TestCase):
+    def test_stats_match_reference(self):
+        for n, seed in [(1, 0), (2, 1), (7, 2), (1000, 3), (20000, 4)]:
+            readings = _readings(n, seed)
+            results = summary.summarize_diffed_data(
+                _args(), "Actor", {"counters.ops": np.array(readings)}
+            )
+            actual = dict(results["counters.ops"])
+            sorted_raw_data = actual.pop("sorted_raw_data")
+            expected = _reference_stats(readings)
+            self.assertEqual({k: actual[k] for k in expected}, expected, (n, seed))
+            np.testing.assert_array_equal(sorted_raw_data, sorted(readings))
+
+    def test_percentiles(self):
+        readings = np.arange(1, 100001) / 10.0
+        results = summary.summarize_diffed_data(_args(), "Actor", {"counters.ops": readings})
+        actual = results["counters.ops"]
+        for name, q in summary.default_percentiles.items():
+            exact = np.quantile(readings, q)
+            self.assertAlmostEqual(actual[name], exact, delta=exact * 0.005 + 0.05, msg=name)
+
+    def test_json_summary(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            actor_file = os.path.join(tmpdir, "Actor.Insert.ftdc")
+            results = summary.summarize_diffed_data(
+                _args(), "Actor", {"counters.ops": np.array([1.0, 2.0, 2.0, 40.0])}
+            )
+            summary.write_json_summary(_args(), actor_file, results)
+            with open(os.path.join(tmpdir, "Actor.Insert.summary.json")) as f:
+                written = json.load(f)
+        self.assertEqual(list(written), ["counters.ops"])
+        self.assertNotIn("sorted_raw_data", written["counters.ops"])
+        self.assertEqual(written["counters.ops"]["[min, max]"], [1.0, 40.0])
+        self.assertEqual(written["counters.ops"]["p50"], 2.0)
+
+    def test_missing_metric(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            actor_file = os.path.join(tmpdir, "Actor.Insert.ftdc")
+            _write_ftdc(actor_file, [_samples(50, seed=0)])
+            args = _args(metrics=["timers.dur", "timers.nosuch"])
+            with contextlib.redirect_stdout(io.StringIO()):
+                results = summary.summarize_actor(args, actor_file)
+            with open(os.path.join(tmpdir, "Actor.Insert.summary.json")) as f:
+                written = json.load(f)
+        # The actor is skipped, as it was before summaries were written out.
+        self.assertEqual(results, {"timers.nosuch": []})
+        self.assertEqual(written, {})
+
+    def test_mode_ties_pick_first_seen(self):
+        self.assertEqual(summary.mode([3.0, 1.0, 1.0, 3.0, 2.0]), 3.0)
+        self.assertEqual(summary.mode([5.0, 4.0]), 5.0)
+
+    def test_histogram_matches_reference(self):
+        for n, buckets, seed in [(1, 15, 0), (5, 15, 1), (1000, 15, 2), (5000, 7, 3)]:
+            data = sorted(_readings(n, seed))
+            self.assertEqual(
+                _histogram_counts(np.array(data), buckets), _reference_histogram(data, buckets)
+            )
+
+    def test_process_csv(self):
+        rows = [(i, i * 2, (i * i) * 1000000, 0) for i in range(1, 50)]
+        csv = "counters.n,counters.ops,timers.dur,counters.errors\n" + "".join(
+            ",".join(str(v) for v in row) + "\n" for row in rows
+        )
+        with contextlib.redirect_stdout(io.StringIO()):
+            results = summary.process_csv(_args(), "Actor", io.StringIO(csv))
+
+        dur = results["timers.dur (measured in nanoseconds, displayed in milliseconds)"]
+        self.assertEqual(dur["count"], 49)
+        diffs = [float(r[2] - p[2]) / 1e6 for p, r in zip([(0, 0, 0, 0)] + rows, rows)]
+        expected = _reference_stats(diffs)
+        self.assertEqual({k: dur[k] for k in expected}, expected)
+        self.assertEqual(results["throughput"]["ops"], 98.0)
+        self.assertEqual(results["throughput"]["seconds"], 49 * 49 / 1000.0)
+        self.assertNotIn("errors", results)
+
+    def test_running_summary(self):
+        readings = np.array(_readings(5000, 5))
+        whole = summary.RunningSummary(10000).add(readings).summary()
+        running = summary.RunningSummary(10000)
+        for block in np.array_split(readings, 7):
+            running.add(block)
+        self.assertFalse(running.sampled)
+        blocks = running.summary()
+        np.testing.assert_array_equal(blocks.pop("sorted_raw_data"), whole.pop("sorted_raw_data"))
+        self.assertEqual(blocks, whole)
+
+        # Past max_samples only a sample is kept, but the running totals still cover everything.
+        sampled = summary.RunningSummary(1000)
+        for block in np.array_split(readings, 7):
+            sampled.add(block)
+        self.assertTrue(sampled.sampled)
+        self.assertEqual(len(sampled.samples()), 1000)
+        self.assertTrue(set(sampled.samples()) <= set(readings))
+        result = sampled.summary()
+        self.assertEqual(result["sampled"], 1000)
+        for key in ["count", "average", "stddev", "[min, max]", "p50", "p99"]:
+            self.assertEqual(result[key], whole[key], key)
+        self.assertAlmostEqual(result["median"], whole["median"], delta=whole["stddev"] / 5)
+
+    def test_csv_blocks(self):
+        rows = [(i, i * 3, (i * i) * 1000, 0) for i in range(1, 2000)]
+        csv = "counters.n,counters.ops,timers.dur,counters.errors\n" + "".join(
+            ",".join(str(v) for v in row) + "\n" for row in rows
+        )
+        args = _args(blockMegabytes=200 / (1024 * 1024))
+        with tempfile.TemporaryDirectory() as tmpdir:
+            csv_file = os.path.join(tmpdir, "Actor.csv")
+            for text in [csv, csv.rstrip("\n")]:
+                with open(csv_file, "w") as f:
+                    f.write(text)
+                for use_mmap in [False, True]:
+                    with open(csv_file) as f:
+                        f.readline()
+                        tables = list(summary.read_csv_blocks(f, 200, use_mmap))
+                    self.assertGreater(len(tables), 10)
+                    np.testing.assert_array_equal(
+                        np.concatenate(tables), np.array(rows, dtype=float)
+                    )
+
+                results = []
+                with contextlib.redirect_stdout(io.StringIO()):
+                    for reader in [open(csv_file), io.StringIO(text)]:
+                        for use_mmap in [False, True]:
+                            reader.seek(0)
+                            args.mmapCsv = use_mmap
+                            results.append(summary.process_csv(args, "Actor", reader))
+                        reader.close()
+                    with open(csv_file) as whole:
+                        results.append(summary.process_csv(_args(), "Actor", whole))
+                for result in results:
+                    for summaries in result.values():
+                        summaries.pop("sorted_raw_data", None)
+                    self.assertEqual(result, results[0])
+                self.assertEqual(results[0]["throughput"]["ops"], 1999 * 3)
+
+    def test_map_actors(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            names = ["Zeta.Op", "Alpha.Op", "Mid.Insert", "Mid.Find"]
+            files = []
+            for seed, name in enumerate(names):
+                files.append(os.path.join(tmpdir, name + ".ftdc"))
+                _write_ftdc(files[-1], [_samples(200 + seed * 50, seed=seed)])
+
+            args = _args(metrics=["timers.dur", "throughput"], jobs=1)
+            serial = summary.map_actors(args, summary.summarize_actor, files)
+            args.jobs = 3
+            parallel = summary.map_actors(args, summary.summarize_actor, files)
+
+        self.assertEqual(
+            [summary.extract_actor_name(f) for f in summary.sort_by_actor_name(files)],
+            ["Alpha.Op", "Mid.Find", "Mid.Insert", "Zeta.Op"],
+        )
+        self.assertEqual(
+            [r["throughput"]["ops"] for r in parallel], [r["throughput"]["ops"] for r in serial]
+        )
+        dur = "timers.dur (measured in nanoseconds, displayed in milliseconds)"
+        self.assertEqual([r[dur]["count"] for r in parallel], [250, 350, 300, 200])
@@ -0,0 +1,84 @@
+import unittest
+
+import numpy as np
+
+from genny import metrics
+from genny.metrics import Phase
+
+_MS = 1000000  # Nanoseconds per millisecond.
+
+
+def _columns(ts, latencies_ms, ops=None, errors=None):
+    """Cumulative columns as Poplar writes them, from per-event values."""
+    ops = np.ones(len(ts), dtype=np.int64) if ops is None else np.array(ops)
+    errors = np.zeros(len(ts), dtype=np.int64) if errors is None else np.array(errors)
+    return {
+        "ts": np.array(ts, dtype=np.int64),
+        "counters.ops": np.cumsum(ops),
+        "counters.errors": np.cumsum(errors),
+        "timers.dur": np.cumsum(np.array(latencies_ms, dtype=np.int64) * _MS),
+    }
+
+
+class TimelineTests(unittest.TestCase):
+    def test_phases_from_columns(self):
+        recorder = {"ts": np.array([5000, 8000]), "timers.dur": np.array([4000, 6500]) * _MS}
+        self.assertEqual(
+            metrics.phases_from_columns(recorder), [Phase(0, 1000, 5000), Phase(1, 5500, 8000)],
+        )
+
+    def test_windows(self):
+        # Two events in the first second, a stall, then three in the fourth.
+        columns = _columns(
+            ts=[1000, 1999, 3000, 3100, 3999],
+            latencies_ms=[10, 30, 1, 2, 3],
+            ops=[2, 2, 1, 1, 1],
+            errors=[0, 1, 0, 0, 0],
+        )
+        windows = metrics.windows(columns, window_ms=1000)
+        self.assertEqual(windows["start_ms"].tolist(), [1000, 2000, 3000])
+        self.assertEqual(windows["count"].tolist(), [2, 0, 3])
+        self.assertEqual(windows["ops_per_second"].tolist(), [4.0, 0.0, 3.0])
+        self.assertEqual(windows["errors"].tolist(), [1.0, 0.0, 0.0])
+        np.testing.assert_array_equal(windows["p50"], [10.0, np.nan, 2.0])
+        np.testing.assert_array_equal(windows["max"], [30.0, np.nan, 3.0])
+
+        half_seconds = metrics.windows(columns, window_ms=500, start_ms=0)
+        self.assertEqual(len(half_seconds["start_ms"]), 8)
+        self.assertEqual(half_seconds["ops"].tolist(), [0, 0, 2, 2, 0, 0, 2, 1])
+
+    def test_percentiles_match_numpy(self):
+        rng = np.random.default_rng(1)
+        ts = np.sort(rng.integers(0, 10000, 5000))
+        latencies = rng.integers(1, 1000, 5000)
+        windows = metrics.windows(_columns(ts, latencies), window_ms=1000, start_ms=0)
+        for i in range(10):
+            in_window = np.sort(latencies[(ts >= i * 1000) & (ts < (i + 1) * 1000)])
+            for name, q in [("p50", 0.5), ("p90", 0.9), ("p99", 0.99), ("max", 1.0)]:
+                self.assertEqual(
+                    windows[name][i], in_window[int(round(q * (len(in_window) - 1)))], (i, name)
+                )
+
+    def test_phases(self):
+        phases = [Phase(0, 1000, 2500), Phase(1, 3000, 5000)]
+        columns = _columns(ts=[1500, 2500, 4000, 4500, 6000], latencies_ms=[1, 2, 3, 4, 5])
+        windows = metrics.windows(columns, window_ms=1000, start_ms=1000, phases=phases)
+        self.assertEqual(windows["phase"].tolist(), [0, 0, 1, 1, -1, -1])
+        self.assertEqual(metrics.phase_markers(windows["phase"]), "0 1   ")
+
+        summary = metrics.phase_summary(columns, phases)
+        self.assertEqual([p["count"] for p in summary], [2, 2])
+        self.assertEqual([p["ops_per_second"] for p in summary], [2 / 1.5, 1.0])
+        self.assertEqual([p["max"] for p in summary], [2.0, 4.0])
+
+    def test_window_rows(self):
+        windows = metrics.windows(_columns([0, 2000], [1, 2]), window_ms=1000)
+        rows = metrics.window_rows(windows)
+        self.assertEqual(rows[1]["p50"], None)
+        self.assertEqual(rows[2]["start_ms"], 2000)
+        self.assertIsInstance(rows[2]["start_ms"], int)
+
+    def test_sparkline(self):
+        self.assertEqual(metrics.sparkline([0, 7, np.nan, 3.5]), "▁█ ▅")
+        self.assertEqual(metrics.sparkline([1, 1]), "▁▁")
+        self.assertEqual(len(metrics.sparkline(np.arange(1000), width=40)), 40)
@@ -0,0 +1,120 @@
+import os
+import tempfile
+import unittest
+
+from genny.tasks.workload_index import WorkloadIndex
+
+FILES = {
+    "src/workloads/scale/UsesPhase.yml": """
+Actors:
+- Name: A
+  Phases:
+  - LoadConfig:
+      Path: ../../phases/scale/Outer.yml
+""",
+    "src/workloads/scale/UsesTemplate.yml": """
+Actors:
+- ActorFromTemplate:
+    TemplateName: InsertTemplate
+    TemplateParameters: {}
+LoadConfig:
+  Path: ../../phases/scale/Templates.yml
+""",
+    "src/workloads/scale/Standalone.yml": """
+Actors:
+- Name: A
+""",
+    # Nested LoadConfig paths are relative to the workload, not to the phase file.
+    "src/phases/scale/Outer.yml": """
+SchemaVersion: 2018-07-01
+Phases:
+- LoadConfig:
+    Path: {^Parameter: {Name: Inner, Default: ../../phases/scale/Inner.yml}}
+""",
+    "src/phases/scale/Inner.yml": """
+SchemaVersion: 2018-07-01
+Repeat: 1
+""",
+    "src/phases/scale/Templates.yml": """
+SchemaVersion: 2018-07-01
+ActorTemplates:
+- TemplateName: InsertTemplate
+  Config: {}
+""",
+}
+
+
+class WorkloadIndexTests(unittest.TestCase):
+    def setUp(self):
+        self._tmpdir = tempfile.TemporaryDirectory()
+        self.repo_root = self._tmpdir.name
+        self.index_path = os.path.join(self.repo_root, "build", "index.json")
+        for rel_path, conts in FILES.items():
+            self._write(rel_path, conts)
+
+    def tearDown(self):
+        self._tmpdir.cleanup()
+
+    def _write(self, rel_path, conts):
+        path = self._path(rel_path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as f:
+            f.write(conts)
+
+    def _path(self, rel_path):
+        return os.path.join(self.repo_root, rel_path)
+
+    def test_dependencies(self):
+        index = WorkloadIndex(self.repo_root).update()
+        self.assertEqual(
+            index.dependencies(self._path("src/workloads/scale/UsesPhase.yml")),
+            {self._path("src/phases/scale/Outer.yml"), self._path("src/phases/scale/Inner.yml")},
+        )
+        self.assertEqual(
+            index.dependencies(self._path("src/workloads/scale/Standalone.yml")), set()
+        )
+        self.assertEqual(
+            index.templates(self._path("src/workloads/scale/UsesTemplate.yml")), {"InsertTemplate"}
+        )
+
+    def test_dependents(self):
+        index = WorkloadIndex(self.repo_root).update()
+        self.assertEqual(
+            index.dependents([self._path("src/phases/scale/Inner.yml")]),
+            {self._path("src/workloads/scale/UsesPhase.yml")},
+        )
+        self.assertEqual(
+            index.dependents(
+                [
+                    self._path("src/phases/scale/Templates.yml"),
+                    self._path("src/workloads/scale/Standalone.yml"),
+                ]
+            ),
+            {
+                self._path("src/workloads/scale/UsesTemplate.yml"),
+                self._path("src/workloads/scale/Standalone.yml"),
+            },
+        )
+
+    def test_incremental_update(self):
+        WorkloadIndex(self.repo_root, self.index_path).update().save()
+
+        # A new dependency is picked up after reloading the persisted index.
+        self._write(
+            "src/workloads/scale/Standalone.yml",
+            """
+Actors:
+- Name: A
+  Phases:
+  - LoadConfig:
+      Path: ../../phases/scale/Inner.yml
+""",
+        )
+        index = WorkloadIndex(self.repo_root, self.index_path).update()
+        self.assertEqual(
+            index.dependents([self._path("src/phases/scale/Inner.yml")]),
+            {
+                self._path("src/workloads/scale/UsesPhase.yml"),
+                self._path("src/workloads/scale/Standalone.yml"),
+            },
+        )
@@ -0,0 +1,37 @@
+import datetime
+import glob
+import io
+import unittest
+
+import yaml
+
+from genny import yaml_io
+
+
+class TestYamlIo(unittest.TestCase):
+    def test_dates_load_as_dates(self):
+        loaded = yaml_io.load("SchemaVersion: 2018-07-01\n")
+        self.assertEqual(loaded["SchemaVersion"], datetime.date(2018, 7, 1))
+
+    def test_load_from_file_object(self):
+        self.assertEqual(yaml_io.load(io.StringIO("a: [1, b]\n")), {"a": [1, "b"]})
+
+    def test_accepts_what_pyyaml_accepts(self):
+        doc = "Document: {^FastRandomString:{length: 5}}\n"
+        self.assertEqual(yaml_io.load(doc), yaml.safe_load(doc))
+
+    def test_rejects_what_pyyaml_rejects(self):
+        with self.assertRaises(yaml.YAMLError):
+            yaml_io.load("a: [1, 2\n")
+
+    def test_matches_pyyaml_on_workloads(self):
+        paths = glob.glob("src/workloads/**/*.yml", recursive=True)
+        paths += glob.glob("src/phases/**/*.yml", recursive=True)
+        for path in sorted(paths)[::10]:
+            with open(path) as handle:
+                expected = yaml.safe_load(handle)
+            self.assertEqual(yaml_io.load_file(path), expected, path)
+
+    def test_dump_round_trips(self):
+        data = {"SchemaVersion": "2018-07-01", "Actors": [{"Name": "A", "Threads": 1}]}
+        self.assertEqual(yaml_io.load(yaml_io.dump(data, sort_keys=False)), data)
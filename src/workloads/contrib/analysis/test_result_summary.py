@@ -4,13 +4,35 @@
 import os
 import re
 import subprocess
-import statistics
 import argparse
+import io
+import itertools
 import math
+import mmap
 import json
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+try:
+    from genny import metrics as genny_metrics
+except ImportError:
+    # Not run through run-genny: look for lamplib relative to this script.
+    sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                 '..', '..', '..', 'lamplib', 'src'))
+    try:
+        from genny import metrics as genny_metrics
+    except ImportError:
+        # Fall back to exporting with curator.
+        genny_metrics = None
 
 default_metrics_path = 'build/WorkloadOutput/CedarMetrics'
 default_metrics = ['throughput', 'timers.dur']
+# These we can calculate by just looking at the last row to get the totals.
+metrics_handled_later = ["throughput", "errors"]
+# Reported for every metric, estimated in bounded memory when genny.metrics is available.
+default_percentiles = {"p50": 0.5, "p90": 0.9, "p99": 0.99, "p99.9": 0.999}
 
 
 def path_to_string(path_component_array):
@@ -18,10 +40,10 @@ def path_to_string(path_component_array):
 
 
 def find_ftdc_files(metrics_path):
-    ls_results = [path_to_string(metrics_path + [file])
-                  for file in os.listdir(path_to_string(metrics_path))]
-    return [path_str
-            for path_str in ls_results if os.path.isfile(path_str) and path_str.endswith(".ftdc")]
+    # Also look in subdirectories, where runs sharing a Poplar daemon put their metrics.
+    return [os.path.join(dirpath, file)
+            for dirpath, _, files in os.walk(path_to_string(metrics_path))
+            for file in sorted(files) if file.endswith(".ftdc")]
 
 
 def parse_args():
@@ -32,7 +54,9 @@ This script analyzes the genny perf results and prints some summary information
 
 Without this script, you need to use evergreen or a tool like t2 to see what happened. Those tools
 are probably superior for detailed analysis, but this is meant to give quick feedback of whether
-things are working as expected during development or local testing''',
+things are working as expected during development or local testing.
+
+Each actor's summary is also written as JSON to <actor>.summary.json next to its .ftdc file.''',
         epilog='''
 Please feel free to update this script to handle your metris or to adjust the output to something
 you consider more useful.''')
@@ -61,6 +85,49 @@ you consider more useful.''')
         type=int,
         default=15,
         help="How many buckets should we use to print the histograms? Default 15.")
+    parser.add_argument(
+        '--useCuratorExport',
+        action='store_true',
+        help="""Export each .ftdc file to .csv with curator and read that, rather than reading
+        the .ftdc files directly. This is always done if genny's python metrics library
+        (src/lamplib) can't be imported.""")
+    parser.add_argument(
+        '--timeline',
+        action='store_true',
+        help="""Rather than summarizing each actor's whole run, break its throughput and latency
+        down into windows of --windowSeconds and by phase. Written to <actor>.timeline.csv and
+        <actor>.timeline.json next to each .ftdc file, with sparklines printed to the console.
+        Needs genny's python metrics library (src/lamplib).""")
+    parser.add_argument(
+        '-w',
+        '--windowSeconds',
+        type=float,
+        default=1.0,
+        help="Length of each --timeline window in seconds. Default 1.")
+    parser.add_argument(
+        '-j',
+        '--jobs',
+        type=int,
+        default=os.cpu_count() or 1,
+        help="""How many actors to analyze at once, each in its own process. Defaults to the number
+        of CPUs. Results are always printed in actor name order.""")
+    parser.add_argument(
+        '--maxSamples',
+        type=int,
+        default=1000000,
+        help="""How many readings of each metric to keep in memory. Longer runs keep a random
+        sample of this many instead, so their median, mode and histogram are estimates; counts,
+        averages, stddevs, min, max and percentiles still cover every reading. Default 1000000.""")
+    parser.add_argument(
+        '--blockMegabytes',
+        type=float,
+        default=4,
+        help="How much of a .csv file to parse at a time, in megabytes. Default 4.")
+    parser.add_argument(
+        '--mmapCsv',
+        action='store_true',
+        help="""Memory-map .csv files rather than reading them, leaving the OS to page them in.
+        Only applies with --useCuratorExport or without genny's python metrics library.""")
     parser.add_argument(
         '-a',
         '--actorRegex',
@@ -96,6 +163,106 @@ def convert_to_csv(args, actor_file):
     return tmp_file_location
 
 
+class RunningSummary:
+    """
+    Summary statistics of one metric's readings, added a block at a time so that memory doesn't
+    grow with the length of the run.
+
+    count, average, stddev and [min, max] are kept as running totals and are always exact. The
+    readings themselves are kept until there are more than max_samples of them; after that a
+    uniform random sample of max_samples readings is kept instead (reservoir sampling) and the
+    median, mode and histogram are computed from that sample.
+    """
+
+    def __init__(self, max_samples, seed=0):
+        self.max_samples = max_samples
+        self.count = 0
+        self.mean = 0.0
+        # Sum of squared differences from the mean, for the stddev.
+        self.m2 = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+        self.sketch = genny_metrics.QuantileSketch() if genny_metrics is not None else None
+        self._blocks = []
+        self._reservoir = None
+        self._rng = np.random.default_rng(seed)
+
+    @property
+    def sampled(self):
+        return self._reservoir is not None
+
+    def add(self, readings):
+        readings = np.asarray(readings, dtype=float)
+        n = len(readings)
+        if n == 0:
+            return self
+
+        # Combine the block's mean and squared differences with the running ones (Chan et al.).
+        block_mean = float(np.mean(readings))
+        block_m2 = float(np.sum((readings - block_mean) ** 2))
+        total = self.count + n
+        delta = block_mean - self.mean
+        self.mean += delta * n / total
+        self.m2 += block_m2 + delta * delta * self.count * n / total
+        self.min = min(self.min, float(readings.min()))
+        self.max = max(self.max, float(readings.max()))
+        if self.sketch is not None:
+            self.sketch.add(readings)
+
+        if self._reservoir is None and total > self.max_samples:
+            kept = np.concatenate(self._blocks) if self._blocks else np.empty(0)
+            self._blocks = []
+            room = self.max_samples - len(kept)
+            self._reservoir = np.concatenate([kept, readings[:room]])
+            self.count += room
+            readings = readings[room:]
+        if self._reservoir is None:
+            self._blocks.append(readings.copy())
+        elif len(readings):
+            # The i'th reading replaces a random kept one with probability max_samples / (i + 1).
+            seen = self.count + np.arange(len(readings))
+            slots = self._rng.integers(0, seen + 1)
+            replace = slots < self.max_samples
+            self._reservoir[slots[replace]] = readings[replace]
+        self.count = total
+        return self
+
+    def samples(self):
+        """
+        Every reading in the order added or, once there have been more than max_samples, the
+        sample of them.
+        """
+        if self._reservoir is not None:
+            return self._reservoir
+        if len(self._blocks) > 1:
+            self._blocks = [np.concatenate(self._blocks)]
+        return self._blocks[0] if self._blocks else np.empty(0)
+
+    def summary(self):
+        data = self.samples()
+        sorted_res = np.sort(data)
+        if self.sampled:
+            average = self.mean
+            stddev = math.sqrt(self.m2 / (self.count - 1))
+        else:
+            average = float(np.mean(sorted_res))
+            stddev = float(np.std(sorted_res, ddof=1)) if self.count > 1 else None
+        result = {
+            "count": self.count,
+            "average": round(average, 1),
+            "median": round(median_grouped(sorted_res), 1),
+            "mode": round(mode(data), 1),
+            "stddev": round(stddev, 1) if stddev is not None else None,
+            **{name: round(value, 1)
+               for (name, value) in percentiles(sorted_res, self.sketch).items()},
+            "[min, max]": [round(self.min, 1), round(self.max, 1)],
+        }
+        if self.sampled:
+            result["sampled"] = len(data)
+        result["sorted_raw_data"] = sorted_res
+        return result
+
+
 def summarize_diffed_data(args, actor_name, metrics_of_interest):
     """
     Computes statistical measures on data points that have been pre-processed by diffing one
@@ -112,38 +279,78 @@ def summarize_diffed_data(args, actor_name, metrics_of_interest):
         ...
     }
     """
+    return summarize_running(
+        args, actor_name,
+        {metric_name: RunningSummary(args.maxSamples).add(diffed_readings)
+         for (metric_name, diffed_readings) in metrics_of_interest.items()})
+
+
+def summarize_running(args, actor_name, running_summaries):
+    """
+    Like summarize_diffed_data, for readings that have already been added to a RunningSummary
+    per metric.
+    """
     results = {}
-    for (metric_name, diffed_readings) in metrics_of_interest.items():
-        if diffed_readings == []:
+    for (metric_name, running) in running_summaries.items():
+        if running.count == 0:
             print(
                 "No measurements to summarize for %s metric for %s. Skipping" % (metric_name, actor_name))
             continue
 
-        sorted_res = sorted(diffed_readings)
         if is_measured_in_nanoseconds(metric_name):
             metric_name += " (measured in nanoseconds, displayed in milliseconds)"
-        results[metric_name] = {
-            "count": len(diffed_readings),
-            "average": round(statistics.mean(diffed_readings), 1),
-            "median": round(statistics.median_grouped(diffed_readings), 1),
-            "mode": round(statistics.mode(diffed_readings), 1),
-            "stddev": round(statistics.stdev(diffed_readings), 1) if len(diffed_readings) > 1 else None,
-            "[min, max]": [round(sorted_res[0], 1), round(sorted_res[-1], 1)],
-            "sorted_raw_data": sorted_res
-        }
+        results[metric_name] = running.summary()
         if args.verbose:
             print("Summared", metric_name)
             pretty_print_summary(args, results[metric_name], "\t")
     return results
 
 
-def summarize_readings(args, actor_name, metrics_of_interest, header, last_line):
-    results = summarize_diffed_data(args, actor_name, metrics_of_interest)
+def percentiles(data, sketch=None):
+    """
+    Returns the default_percentiles of data, e.g. {"p50": 12.1, "p90": 20.3, ...}. With
+    genny.metrics these come from a log-bucketed sketch accurate to 0.5%, so the memory needed
+    doesn't grow with the number of readings; otherwise they are exact. Pass a sketch that has
+    already seen the readings to use it rather than building one from data.
+    """
+    if sketch is not None or genny_metrics is not None:
+        sketch = sketch or genny_metrics.QuantileSketch().add(data)
+        return {name: sketch.quantile(q) for (name, q) in default_percentiles.items()}
+    return {name: float(np.quantile(data, q)) for (name, q) in default_percentiles.items()}
+
+
+def median_grouped(sorted_data, interval=1):
+    """
+    Same as statistics.median_grouped, for data already sorted in a numpy array.
+    """
+    n = len(sorted_data)
+    x = sorted_data[n // 2]
+    # All values equal to x lie within sorted_data[i:j].
+    i = np.searchsorted(sorted_data, x, side='left')
+    j = np.searchsorted(sorted_data, x, side='right')
+    return float(x - interval / 2.0 + interval * (n / 2 - i) / (j - i))
+
+
+def mode(data):
+    """
+    Same as statistics.mode: the most common value, or the one seen first on ties.
+    """
+    values, first_seen, counts = np.unique(
+        np.asarray(data, dtype=float), return_index=True, return_counts=True)
+    most_common = np.flatnonzero(counts == counts.max())
+    return float(values[most_common[np.argmin(first_seen[most_common])]])
+
+
+def summarize_readings(args, actor_name, running_summaries, header, last_line):
+    results = summarize_running(args, actor_name, running_summaries)
 
     if args.verbose:
         print(
             "Finished summarizing diffed data, computing metrics from the the last row...")
 
+    if last_line is None:
+        return results
+
     if "throughput" in args.metrics:
         if "counters.ops" in header and "timers.dur" in header:
             n_ops = float(last_line[header.index("counters.ops")])
@@ -174,15 +381,15 @@ def is_measured_in_nanoseconds(metric_name):
     return metric_name.startswith("timers.")
 
 
-def process_csv(args, actor_name, csv_reader):
-    header = csv_reader.readline().split(',')
+def check_metrics(args, header):
+    """
+    Returns the name of the first metric we were asked to summarize that isn't in the header,
+    or None if they're all there.
+    """
     if args.verbose:
         print("Analyzing the following metrics", args.metrics)
         print("Available metrics from the header row: ", header)
 
-    # These we can calculate by just looking at the last row to get the totals.
-    metrics_handled_later = ["throughput", "errors"]
-
     for metric_name in args.metrics:
         if metric_name in metrics_handled_later:
             continue
@@ -191,50 +398,133 @@ def process_csv(args, actor_name, csv_reader):
             print("Unable to find metric with the name '%s'. Available metrics: %s" % (
                 metric_name, json.dumps(header)))
             print("Skipping this actor analysis")
-            return {metric_name: []}
+            return metric_name
 
         # Other metrics should be easy to add, but are untested so not included here.
         assert metric_name.endswith(".total") or metric_name.endswith('.dur'), """
         Unexpected metric that I don't know how to summarize: %s. If you know how you'd like
         to summarize this, please add the analysis to this python script!""" % metric_name
+    return None
+
+
+def process_ftdc(args, actor_name, actor_file):
+    """
+    Like process_csv, but reads the actor's .ftdc file directly with genny.metrics, one chunk at
+    a time.
+    """
+    chunks = genny_metrics.read_chunks(actor_file)
+    first = next(chunks, None)
+    header = list(first.metrics) if first is not None else []
+    missing = check_metrics(args, header)
+    if missing is not None:
+        return {missing: []}
+
+    blocks = (chunk.metrics for chunk in itertools.chain([first] if first else [], chunks))
+    return summarize_columns(args, actor_name, header, blocks)
+
+
+def process_csv(args, actor_name, csv_reader):
+    header = csv_reader.readline().strip().split(',')
+    missing = check_metrics(args, header)
+    if missing is not None:
+        return {missing: []}
+
+    # Load the '.csv' data a block of rows at a time, as one array per column, so long runs don't
+    # need their whole file in memory.
+    blocks = ({name: table[:, i] for (i, name) in enumerate(header)}
+              for table in read_csv_blocks(
+                  csv_reader, int(args.blockMegabytes * 1024 * 1024), args.mmapCsv))
+    return summarize_columns(args, actor_name, header, blocks)
+
+
+def read_csv_blocks(csv_reader, block_bytes, use_mmap=False):
+    """
+    Yields the rest of csv_reader as 2D float arrays of about block_bytes of text each.
+    """
+    for text in csv_text_blocks(csv_reader, block_bytes, use_mmap):
+        table = np.loadtxt(io.StringIO(text), delimiter=',', dtype=float, ndmin=2)
+        if len(table):
+            yield table
 
-    # Store (last reading, all readings) for each metric.
-    metrics_of_interest = {
-        m: (0,  []) for m in args.metrics if m not in metrics_handled_later}
-    metric_columns = [(metric, header.index(metric))
-                      for metric in metrics_of_interest]
 
-    # Now scan the '.csv' data, row by row. We have identified which columns we're interested in.
+def csv_text_blocks(csv_reader, block_bytes, use_mmap=False):
+    """
+    Yields the rest of csv_reader in pieces of about block_bytes that end on a line boundary.
+
+    With use_mmap, a csv_reader backed by a real file is memory-mapped instead of read, and each
+    piece's pages are handed back to the OS once it has been parsed.
+    """
+    mapped = None
+    if use_mmap:
+        try:
+            mapped = mmap.mmap(csv_reader.fileno(), 0, access=mmap.ACCESS_READ)
+        except (AttributeError, OSError, ValueError, io.UnsupportedOperation):
+            pass
+
+    if mapped is not None:
+        with mapped:
+            # Skip the header, which has already been read through csv_reader.
+            position = mapped.find(b'\n') + 1 if len(mapped) else 0
+            while 0 < position < len(mapped):
+                end = mapped.rfind(b'\n', position, position + block_bytes) + 1
+                if end <= position:
+                    # A line longer than a block, or the last line without a newline.
+                    end = mapped.find(b'\n', position) + 1 or len(mapped)
+                yield mapped[position:end].decode()
+                if hasattr(mapped, 'madvise'):
+                    # madvise needs a page-aligned start.
+                    start = position - position % mmap.PAGESIZE
+                    mapped.madvise(mmap.MADV_DONTNEED, start, end - start)
+                position = end
+        return
+
+    leftover = ''
+    while True:
+        text = csv_reader.read(block_bytes)
+        if not text:
+            break
+        text = leftover + text
+        end = text.rfind('\n') + 1
+        leftover = text[end:]
+        if end:
+            yield text[:end]
+    if leftover.strip():
+        yield leftover
+
+
+def summarize_columns(args, actor_name, header, blocks):
+    """
+    Summarizes an actor's metrics given as blocks of consecutive rows, each block a mapping from
+    every name in the header to a numpy array of its values.
+    """
     # The metrics we know how to process so far are all stored row-by-row with a running total. So
     # if we're interested in say the average latency for an operation, we'll calculate the latency
     # for _each_ operation by subtracting each reading's previous recording to get the diff
     # associated for just that reading.
-    nRows = 0
+    running_summaries = {metric_name: RunningSummary(args.maxSamples)
+                         for metric_name in args.metrics
+                         if metric_name not in metrics_handled_later}
+    previous = {metric_name: 0.0 for metric_name in running_summaries}
     last_line = None
-    for raw_recording in csv_reader.readlines():
-        nRows += 1
-        recording = raw_recording.split(',')
-        last_line = recording
-        for (metric_name, column_idx) in metric_columns:
-            this_reading = float(recording[column_idx])
-
+    n_rows = 0
+    for columns in blocks:
+        n_block_rows = len(columns[header[0]]) if header else 0
+        if n_block_rows == 0:
+            continue
+        for (metric_name, running) in running_summaries.items():
+            readings = columns[metric_name].astype(float)
             # Convert nanoseconds to milliseconds - nanos have too many digits for humans to easily
             # interpret.
             if is_measured_in_nanoseconds(metric_name):
-                this_reading /= 1000.0 * 1000.0
-
-            (last_reading, all_readings) = metrics_of_interest[metric_name]
-            all_readings.append(this_reading - last_reading)
-            metrics_of_interest[metric_name] = (this_reading, all_readings)
+                readings /= 1000.0 * 1000.0
+            running.add(np.diff(readings, prepend=previous[metric_name]))
+            previous[metric_name] = readings[-1]
+        last_line = [columns[name][-1].item() for name in header]
+        n_rows += n_block_rows
 
     if args.verbose:
-        print("Finished reading %d rows. Now processing data for output" %
-              nRows)
-
-    # strip out the 'last recording' piece of information - not needed anymore.
-    just_data = {m: all_data for (m, (_, all_data))
-                 in metrics_of_interest.items()}
-    return summarize_readings(args, actor_name, just_data, header, last_line)
+        print("Finished reading %d rows. Now processing data for output" % n_rows)
+    return summarize_readings(args, actor_name, running_summaries, header, last_line)
 
 
 def print_histogram_bucket(prefix, global_max, bucket_min, bucket_max, end_bracket, stars, n_items):
@@ -260,25 +550,19 @@ def print_histogram_bucket(prefix, global_max, bucket_min, bucket_max, end_brack
 def print_histogram(data_points, n_buckets, prefix=""):
     n_buckets = min(len(data_points), n_buckets)
     # 'processed' must be sorted.
-    min_v, max_v = data_points[0], data_points[-1]
+    min_v, max_v = float(data_points[0]), float(data_points[-1])
     step = (max_v - min_v) / n_buckets
     split_points = [min_v + step *
-                    i for i in range(n_buckets)] + [data_points[-1]]
+                    i for i in range(n_buckets)] + [max_v]
 
-    data_idx = 0
-    # One more split point than we have buckets. e.g. 11 splits means 10 buckets.
+    # Number of data points below each split point. One more split point than we have buckets. e.g.
+    # 11 splits means 10 buckets.
+    below = np.searchsorted(data_points, split_points, side='left')
+    below[-1] = len(data_points)  # Everything left has to go in the last bucket.
     for splits_idx in range(1, len(split_points)):
         bucket_min = split_points[splits_idx - 1]
         bucket_max = split_points[splits_idx]
-
-        starting_idx = data_idx
-        while data_idx < len(data_points) and data_points[data_idx] < split_points[splits_idx]:
-            data_idx += 1
-        n_items = data_idx - starting_idx
-
-        if splits_idx == len(split_points) - 1:
-            # Everything left has to go in this bucket
-            n_items += (len(data_points) - data_idx)
+        n_items = int(below[splits_idx] - below[splits_idx - 1])
 
         # Some workloads record thousands or more readings - don't want to print that many stars.
         max_stars = 60
@@ -308,6 +592,134 @@ def pretty_print_summary(args, summary, prefix=""):
                         args.nHistogramBuckets, prefix + "\t")
 
 
+def write_json_summary(args, actor_file, metric_summaries):
+    """
+    Writes the summary of one actor next to its .ftdc file, for tools that want the numbers
+    rather than the console output. Metrics the actor didn't have, which check_metrics
+    summarizes as an empty list, are left out.
+    """
+    json_file = replace_suffix(actor_file, ".ftdc", ".summary.json")
+    with open(json_file, 'w') as out:
+        json.dump({metric_name: {key: value for (key, value) in summary.items()
+                                 if key != "sorted_raw_data"}
+                   for (metric_name, summary) in metric_summaries.items()
+                   if isinstance(summary, dict)},
+                  out, indent=4)
+    if args.verbose:
+        print("Wrote summary to", json_file)
+
+
+def write_timeline_csv(windows, csv_file):
+    names = list(windows)
+    with open(csv_file, 'w') as out:
+        out.write(",".join(names) + "\n")
+        for row in genny_metrics.window_rows(windows):
+            out.write(",".join("" if row[name] is None else str(row[name]) for name in names) + "\n")
+
+
+def print_timeline(actor_name, windows, window_seconds):
+    print("%s timeline (%gs windows):" % (actor_name, window_seconds))
+    for (label, values) in [("ops/s", windows["ops_per_second"]), ("p99 ms", windows["p99"])]:
+        finite = values[~np.isnan(values)]
+        if len(finite) == 0:
+            continue
+        print("\t%-7s [%10.1f, %10.1f]: %s" % (
+            label, finite.min(), finite.max(), genny_metrics.sparkline(values)))
+    if (windows["phase"] != -1).any():
+        print("\t%-7s %25s %s" % ("phases", "", genny_metrics.phase_markers(windows["phase"])))
+
+
+def process_timelines(args, ftdc_files, actor_regex):
+    """
+    The --timeline mode: windowed throughput and latency for every actor, labelled with the phases
+    recorded by the PhaseTimingRecorder actor.
+    """
+    phases = []
+    actor_files = []
+    for actor_file in ftdc_files:
+        actor_name = extract_actor_name(actor_file)
+        if actor_name == genny_metrics.PHASE_RECORDER_FILE:
+            phases = genny_metrics.phases_from_columns(genny_metrics.read_columns(actor_file))
+        elif actor_regex.match(actor_name) is not None:
+            actor_files.append(actor_file)
+    if not phases:
+        print("No %s.ftdc found, so windows won't be labelled with phases." %
+              genny_metrics.PHASE_RECORDER_FILE)
+
+    window_ms = max(1, int(round(args.windowSeconds * 1000)))
+    # Line up every actor's windows with the start of the workload.
+    start_ms = phases[0].start_ms if phases else None
+    results = map_actors(args, timeline_actor, actor_files, window_ms, start_ms, phases)
+    for (actor_file, windows) in zip(sort_by_actor_name(actor_files), results):
+        if windows is not None:
+            print_timeline(extract_actor_name(actor_file), windows, window_ms / 1000.0)
+            print("\n")
+
+
+def timeline_actor(args, actor_file, window_ms, start_ms, phases):
+    """
+    Computes and writes the timeline of one actor. Returns its windows, or None if it doesn't have
+    the metrics needed.
+    """
+    actor_name = extract_actor_name(actor_file)
+    columns = genny_metrics.read_columns(actor_file)
+    missing = [name for name in ["ts", "counters.ops", "timers.dur"] if name not in columns]
+    if missing:
+        print("Skipping %s: no %s metrics" % (actor_name, ", ".join(missing)))
+        return None
+
+    windows = genny_metrics.windows(columns, window_ms, start_ms, phases)
+    write_timeline_csv(windows, replace_suffix(actor_file, ".ftdc", ".timeline.csv"))
+    with open(replace_suffix(actor_file, ".ftdc", ".timeline.json"), 'w') as out:
+        json.dump({
+            "window_seconds": window_ms / 1000.0,
+            "phases": genny_metrics.phase_summary(columns, phases),
+            "windows": genny_metrics.window_rows(windows),
+        }, out, indent=4)
+    return windows
+
+
+def summarize_actor(args, actor_file):
+    """
+    Summarizes the metrics of one actor and writes them to its .summary.json.
+    """
+    actor_name = extract_actor_name(actor_file)
+    if args.verbose:
+        print("Analyzing", actor_name, "...")
+
+    if genny_metrics is not None and not args.useCuratorExport:
+        metric_summaries = process_ftdc(args, actor_name, actor_file)
+    else:
+        tmp_file = convert_to_csv(args, actor_file)
+        with open(tmp_file, 'r') as csv_reader:
+            metric_summaries = process_csv(args, actor_name, csv_reader)
+
+    write_json_summary(args, actor_file, metric_summaries)
+    return metric_summaries
+
+
+def sort_by_actor_name(actor_files):
+    return sorted(actor_files, key=extract_actor_name)
+
+
+def map_actors(args, function, actor_files, *function_args):
+    """
+    Calls function(args, actor_file, *function_args) for every actor file, on up to args.jobs
+    processes at once. Returns the results in actor name order however long each one takes.
+    """
+    actor_files = sort_by_actor_name(actor_files)
+    jobs = min(args.jobs, len(actor_files))
+    if jobs <= 1:
+        return [function(args, actor_file, *function_args) for actor_file in actor_files]
+
+    if args.verbose:
+        print("Analyzing %d actors on %d processes" % (len(actor_files), jobs))
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        futures = [pool.submit(function, args, actor_file, *function_args)
+                   for actor_file in actor_files]
+        return [future.result() for future in futures]
+
+
 def extract_actor_name(actor_file):
     return actor_file[actor_file.rfind('/') + 1:actor_file.rfind('.')]
 
@@ -338,7 +750,13 @@ def main():
 
     actor_regex = parse_actor_regex(args)
 
-    global_summaries = {}
+    if args.timeline:
+        if genny_metrics is None:
+            raise AssertionError("--timeline needs genny's python metrics library (src/lamplib)")
+        process_timelines(args, result_ftdc_files, actor_regex)
+        return
+
+    actor_files = []
     for actor_file in result_ftdc_files:
         actor_name = extract_actor_name(actor_file)
         if actor_regex.match(actor_name) is None:
@@ -346,18 +764,12 @@ def main():
                 print("Skipping actor %s since it doesn't match regex" %
                       actor_name)
             continue
+        actor_files.append(actor_file)
 
-        if args.verbose:
-            print("Analyzing", actor_name, "...")
-
-        global_summaries[actor_name] = {}
-
-        tmp_file = convert_to_csv(args, actor_file)
-        with open(tmp_file, 'r') as csv_reader:
-            metric_summaries = process_csv(args, actor_name, csv_reader)
-
-            for (metric_name, summary_data) in metric_summaries.items():
-                global_summaries[actor_name][metric_name] = summary_data
+    global_summaries = {}
+    results = map_actors(args, summarize_actor, actor_files)
+    for (actor_file, metric_summaries) in zip(sort_by_actor_name(actor_files), results):
+        global_summaries[extract_actor_name(actor_file)] = metric_summaries
 
     for (actor_name, metrics) in global_summaries.items():
         print(actor_name, "summary:")